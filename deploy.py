@@ -1,94 +1,177 @@
 #!/usr/bin/env python3
 """
 Deployment script for the modular CFD website.
-Builds from JSON content and deploys to GitHub Pages.
+Builds from JSON content and deploys the changed files to GitHub Pages,
+a local directory or an S3-compatible bucket.
 """
-import os
-import subprocess
-import shutil
+import argparse
+import json
+import sys
 from pathlib import Path
 
-def run_command(cmd, cwd=None):
-    """Run a shell command and return the result."""
+ROOT_DIR = Path(__file__).resolve().parent
+DEV_DIR = ROOT_DIR / "dev"
+DOCS_DIR = ROOT_DIR / "docs"
+CACHE_DIR = DEV_DIR / ".build-cache"
+PROFILE_FILE = CACHE_DIR / "profile.json"
+
+sys.path.insert(0, str(DEV_DIR / "tools"))
+from daemon import build_site
+from publish import DEFAULT_JOBS, DEFAULT_RETRIES, DeployError, Deployer, make_backend
+from validate import DEFAULT_BUDGETS
+
+def run_build(args):
+    """Build dev/ with build.py arguments and return whether it succeeded."""
     try:
-        result = subprocess.run(cmd, shell=True, cwd=cwd, capture_output=True, text=True)
-        if result.returncode != 0:
-            print(f"Error running command: {cmd}")
-            print(f"Error output: {result.stderr}")
-            return False
-        return True
-    except Exception as e:
-        print(f"Exception running command {cmd}: {e}")
+        success, output = build_site(args, DEV_DIR)
+    except OSError as e:
+        print(f"Exception running build.py {' '.join(args)}: {e}")
         return False
+    if not success:
+        print(f"Error running build.py {' '.join(args)}")
+        # Show what the build reported as wrong, not its whole log
+        lines = output.splitlines()
+        problems = [line for line in lines if line.startswith(("❌", "⚠️"))]
+        print('\n'.join(problems or lines[-10:]))
+    return success
 
-def build_website():
-    """Build the website from JSON content."""
+def build_website(page_budgets=()):
+    """Build and validate the website from JSON content, recording a stage profile.
+
+    page_budgets are (name, value) overrides of the validator's page budgets.
+    """
     print("🔨 Building website...")
-    dev_dir = Path("dev")
-    if not dev_dir.exists():
+    if not DEV_DIR.exists():
         print("Error: dev/ directory not found")
         return False
     
-    build_script = dev_dir / "tools" / "build.py"
+    build_script = DEV_DIR / "tools" / "build.py"
     if not build_script.exists():
         print("Error: build script not found at dev/tools/build.py")
         return False
     
-    # Run build from dev directory
-    if not run_command("python tools/build.py", cwd=dev_dir):
+    # Build with the production asset pipeline (through the build daemon,
+    # if one is running); broken references or pages over budget fail the
+    # build, so they never ship
+    budgets = [arg for name, value in page_budgets for arg in ("--budget", f"{name}={value}")]
+    if not run_build(["--fingerprint", "--bundle-css", "--bundle-js", "--service-worker", "--minify-html",
+                      "--validate", *budgets, "--profile", "--profile-json", str(PROFILE_FILE)]):
         return False
     
     print("✅ Website built successfully")
     return True
 
-def deploy_to_github():
-    """Deploy to GitHub Pages."""
-    print("🚀 Deploying to GitHub...")
-    
-    # Check if we're in a git repository
-    if not Path(".git").exists():
-        print("Error: Not in a git repository")
+def parse_stage_budget(value):
+    """Parse a NAME=SECONDS stage budget."""
+    name, sep, seconds = value.partition("=")
+    try:
+        return name, float(seconds)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected NAME=SECONDS, got '{value}'") from None
+
+def parse_page_budget(value):
+    """Parse a NAME=VALUE page budget."""
+    name, _, amount = value.partition("=")
+    if name not in DEFAULT_BUDGETS:
+        raise argparse.ArgumentTypeError(f"unknown budget '{name}'; expected one of {', '.join(DEFAULT_BUDGETS)}")
+    try:
+        return name, int(amount)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected NAME=INTEGER, got '{value}'") from None
+
+def check_build_profile(time_budget=None, stage_budgets=(), show=False):
+    """Print the build profile and check it against time budgets."""
+    try:
+        with open(PROFILE_FILE, 'r') as f:
+            report = json.load(f)
+    except (OSError, ValueError):
+        print(f"Error: build profile not found at {PROFILE_FILE}")
         return False
-    
-    # Add all changes
-    if not run_command("git add ."):
+
+    if show:
+        from profiler import format_table
+        print(format_table(report))
+
+    over = []
+    total = report["total_seconds"]
+    if time_budget is not None and total > time_budget:
+        over.append(f"build took {total:.2f}s, budget {time_budget:.2f}s")
+    stages = {stage["name"]: stage["seconds"] for stage in report["stages"]}
+    for name, budget in stage_budgets:
+        if name not in stages:
+            print(f"⚠️  No build stage named '{name}' to check")
+        elif stages[name] > budget:
+            over.append(f"stage '{name}' took {stages[name]:.2f}s, budget {budget:.2f}s")
+
+    if over:
+        for message in over:
+            print(f"❌ Time budget exceeded: {message}")
         return False
-    
-    # Check if there are changes to commit
-    result = subprocess.run("git diff --cached --quiet", shell=True)
-    if result.returncode == 0:
-        print("No changes to commit")
-        return True
-    
-    # Commit changes
-    commit_msg = "Update website content and rebuild"
-    if not run_command(f'git commit -m "{commit_msg}"'):
+    print(f"⏱️  Build finished in {total:.2f}s")
+    return True
+
+def deploy(target, jobs=DEFAULT_JOBS, retries=DEFAULT_RETRIES, endpoint=None, region=None, dry_run=False):
+    """Upload the files that changed since the target's last deploy."""
+    if target == "git" and not (ROOT_DIR / ".git").exists():
+        print("Error: Not in a git repository")
         return False
-    
-    # Push to GitHub
-    if not run_command("git push"):
+    try:
+        backend = make_backend(target, ROOT_DIR, DOCS_DIR, endpoint=endpoint, region=region)
+        print(f"🚀 Deploying to {backend.describe()}...")
+        return Deployer(DOCS_DIR, backend, CACHE_DIR, jobs=jobs, retries=retries).deploy(dry_run=dry_run)
+    except DeployError as e:
+        print(f"Error: {e}")
         return False
-    
-    print("✅ Deployed to GitHub successfully")
-    return True
 
 def main():
     """Main deployment workflow."""
+    parser = argparse.ArgumentParser(description="Build the website and deploy the changed files.")
+    parser.add_argument("--target", default="git",
+                        help="git (commit and push docs/, the default), s3://BUCKET/PREFIX or a local directory")
+    parser.add_argument("--jobs", "-j", type=int, default=DEFAULT_JOBS,
+                        help=f"parallel uploads (default: {DEFAULT_JOBS})")
+    parser.add_argument("--retries", type=int, default=DEFAULT_RETRIES,
+                        help=f"retries per file on network or I/O errors (default: {DEFAULT_RETRIES})")
+    parser.add_argument("--endpoint", metavar="URL",
+                        help="S3 API endpoint, e.g. a local stand-in (default: $AWS_ENDPOINT_URL or AWS)")
+    parser.add_argument("--region", help="S3 region (default: $AWS_REGION or us-east-1)")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="build and list the files that would be uploaded or removed")
+    parser.add_argument("--profile", action="store_true",
+                        help="print the per-stage build timing table")
+    parser.add_argument("--time-budget", type=float, metavar="SECONDS",
+                        help="abort the deploy if the build takes longer than this")
+    parser.add_argument("--stage-budget", type=parse_stage_budget, action="append", default=[],
+                        metavar="NAME=SECONDS",
+                        help="abort the deploy if a build stage (e.g. render) takes longer; repeatable")
+    parser.add_argument("--page-budget", type=parse_page_budget, action="append", default=[],
+                        metavar="NAME=VALUE",
+                        help="override a page budget (html_bytes, requests or page_bytes); repeatable")
+    args = parser.parse_args()
+
     print("🌐 Starting CFD Website Deployment")
     print("=" * 40)
     
     # Build the website
-    if not build_website():
+    if not build_website(args.page_budget):
         print("❌ Build failed")
         return False
+
+    # Catch build-time regressions before they ship
+    if not check_build_profile(args.time_budget, args.stage_budget, show=args.profile):
+        print("❌ Build too slow; not deploying")
+        return False
     
-    # Deploy to GitHub
-    if not deploy_to_github():
+    # Upload what changed
+    if not deploy(args.target, args.jobs, args.retries, args.endpoint, args.region, args.dry_run):
         print("❌ Deployment failed")
         return False
+    if args.dry_run:
+        return True
     
     print("\n🎉 Deployment completed successfully!")
-    print("Your website should be live at GitHub Pages in a few minutes.")
+    if args.target == "git":
+        print("Your website should be live at GitHub Pages in a few minutes.")
     
     return True
 
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Content-hashed asset fingerprinting for the website builder.
+
+Every CSS, JS and image asset under the output tree is copied to dist/ under a
+name that includes a hash of its contents (styles/main.css becomes
+dist/styles/main.1a2b3c4d5e.css), and asset-manifest.json maps the original
+site-relative paths to the fingerprinted ones. References between assets
+(CSS @import/url(), JS imports) are rewritten before hashing, so a change to
+any dependency changes the name of everything that imports it. Fingerprinted
+files never change content, so they can be served with
+"Cache-Control: immutable".
+"""
+import hashlib
+import json
+import os
+import posixpath
+import re
+import shutil
+from pathlib import Path
+
+from compress import ENCODINGS
+
+ASSET_PATTERNS = ("styles/**/*.css", "scripts/**/*.js", "assets/images/**/*")
+IMAGE_SUFFIXES = {".png", ".jpg", ".jpeg", ".gif", ".webp", ".avif", ".svg", ".ico"}
+DIST_DIR = "dist"
+MANIFEST_NAME = "asset-manifest.json"
+HASH_LENGTH = 10
+
+CSS_REFERENCE = re.compile(
+    r'''(@import\s+(?:url\(\s*)?['"]?|url\(\s*['"]?)([^'")\s;]+)''')
+JS_REFERENCE = re.compile(
+    r'''((?:\bimport|\bexport)\s[^'";]*?\bfrom\s*['"]|\bimport\s*\(?\s*['"])([^'"]+)''')
+HTML_REFERENCE = re.compile(r'''(\s(?:href|src|poster)=")([^"]+)(")''')
+HTML_SRCSET = re.compile(r'''(\ssrcset=")([^"]+)(")''')
+
+
+def is_local_reference(url):
+    """Return True for relative references to files in the site."""
+    return not re.match(r'^([a-z][a-z0-9+.-]*:|/|#)', url, re.IGNORECASE)
+
+
+def split_url(url):
+    """Split a URL into its path and its ?query/#fragment suffix."""
+    match = re.match(r'^([^?#]*)(.*)$', url)
+    return match.group(1), match.group(2)
+
+
+class AssetFingerprinter:
+    """Fingerprints the static assets of an output tree."""
+
+    def __init__(self, output_dir, skip_dirs=()):
+        self.output_dir = Path(output_dir)
+        self.manifest_file = self.output_dir / MANIFEST_NAME
+        # Directories whose files are already named by content hash
+        self.skip_dirs = tuple(skip_dirs)
+        self.manifest = {}
+        self.sources = set()
+        self.stamps = None
+
+    def collect(self):
+        """Find every fingerprintable asset, as site-relative POSIX paths."""
+        assets = set()
+        for pattern in ASSET_PATTERNS:
+            for path in self.output_dir.glob(pattern):
+                if not path.is_file():
+                    continue
+                if pattern.startswith("assets/images") and path.suffix.lower() not in IMAGE_SUFFIXES:
+                    continue
+                assets.add(path.relative_to(self.output_dir).as_posix())
+        return sorted(assets)
+
+    def references(self, asset, text):
+        """Yield (match, site-relative target) for local references in an asset."""
+        pattern = CSS_REFERENCE if asset.endswith(".css") else JS_REFERENCE
+        asset_dir = posixpath.dirname(asset)
+        for match in pattern.finditer(text):
+            path, _ = split_url(match.group(2))
+            if path and is_local_reference(path):
+                yield match, posixpath.normpath(posixpath.join(asset_dir, path))
+
+    def fingerprinted_name(self, asset, data):
+        digest = hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+        stem, ext = posixpath.splitext(asset)
+        return f"{DIST_DIR}/{stem}.{digest}{ext}"
+
+    def process(self, asset, stack=()):
+        """Fingerprint one asset after its dependencies; return its new path."""
+        if asset in self.manifest:
+            return self.manifest[asset]
+        if asset.startswith(self.skip_dirs):
+            self.manifest[asset] = asset
+            return asset
+
+        data = (self.output_dir / asset).read_bytes()
+        if asset.endswith((".css", ".js")):
+            text = data.decode('utf-8')
+            out = []
+            last = 0
+            for match, target in self.references(asset, text):
+                if target in stack:
+                    # A cycle: this side can't wait for the other's hash
+                    print(f"⚠️  {asset} and {target} reference each other; "
+                          f"the fingerprinted {asset} links the unhashed {target}")
+                    linked = target
+                elif target in self.sources:
+                    linked = self.process(target, stack + (asset,))
+                else:
+                    linked = target
+                # The copy lives under dist/, so relative references are
+                # recomputed from there, to the hashed copy or the original
+                path, suffix = split_url(match.group(2))
+                relative = posixpath.relpath(linked, posixpath.dirname(self.fingerprinted_name(asset, b'')))
+                if not relative.startswith('.'):
+                    # ES module specifiers must be explicitly relative
+                    relative = './' + relative
+                out.append(text[last:match.start(2)])
+                out.append(relative + suffix)
+                last = match.end(2)
+            out.append(text[last:])
+            data = ''.join(out).encode('utf-8')
+
+        hashed = self.fingerprinted_name(asset, data)
+        hashed_file = self.output_dir / hashed
+        if not hashed_file.exists():
+            hashed_file.parent.mkdir(parents=True, exist_ok=True)
+            with open(hashed_file, 'wb') as f:
+                f.write(data)
+        self.manifest[asset] = hashed
+        return hashed
+
+    def build(self):
+        """Fingerprint every asset, prune stale copies and write the manifest."""
+        sources = self.collect()
+        stamps = {}
+        for asset in sources:
+            stat = os.stat(self.output_dir / asset)
+            stamps[asset] = (stat.st_mtime_ns, stat.st_size)
+        # Called again on the same tree (a long-lived builder), nothing to redo
+        if stamps == self.stamps and self.manifest_file.exists() and all(
+                (self.output_dir / path).exists() for path in self.manifest.values()):
+            return self.manifest
+
+        self.manifest = {}
+        self.sources = set(sources)
+        for asset in sorted(self.sources):
+            self.process(asset)
+
+        # Remove fingerprinted files from earlier builds
+        keep = {self.output_dir / path for path in self.manifest.values()}
+        dist_dir = self.output_dir / DIST_DIR
+        for dirpath, dirnames, filenames in os.walk(dist_dir, topdown=False):
+            for filename in filenames:
+                path = Path(dirpath) / filename
+                if path not in keep:
+                    path.unlink()
+            if not os.listdir(dirpath):
+                os.rmdir(dirpath)
+
+        text = json.dumps(self.manifest, indent=2, sort_keys=True) + "\n"
+        if not self.manifest_file.exists() or self.manifest_file.read_text() != text:
+            self.manifest_file.write_text(text)
+        self.stamps = stamps
+        return self.manifest
+
+    def remove(self):
+        """Delete the dist/ copies and manifest written by an earlier fingerprinted build."""
+        shutil.rmtree(self.output_dir / DIST_DIR, ignore_errors=True)
+        for suffix in ("", *ENCODINGS):
+            self.manifest_file.with_name(MANIFEST_NAME + suffix).unlink(missing_ok=True)
+        self.manifest = {}
+        self.stamps = None
+
+    def rewrite_url(self, url, page_dir):
+        """Map a URL in a page to its fingerprinted path, if it is an asset."""
+        if not is_local_reference(url):
+            return url
+        path, suffix = split_url(url)
+        site_path = posixpath.normpath(posixpath.join(page_dir, path))
+        hashed = self.manifest.get(site_path)
+        if hashed is None:
+            return url
+        return posixpath.relpath(hashed, page_dir or ".") + suffix
+
+    def rewrite_html(self, filename, html):
+        """Rewrite asset references in a generated page through the manifest."""
+        if not self.manifest:
+            return html
+        page_dir = posixpath.dirname(filename)
+
+        def attribute(match):
+            return match.group(1) + self.rewrite_url(match.group(2), page_dir) + match.group(3)
+
+        def srcset(match):
+            candidates = []
+            for candidate in match.group(2).split(','):
+                # A trailing comma leaves an empty candidate
+                if not candidate.strip():
+                    continue
+                parts = candidate.strip().split(None, 1)
+                parts[0] = self.rewrite_url(parts[0], page_dir)
+                candidates.append(' '.join(parts))
+            return match.group(1) + ', '.join(candidates) + match.group(3)
+
+        return HTML_SRCSET.sub(srcset, HTML_REFERENCE.sub(attribute, html))
@@ -0,0 +1,374 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for the website builder.
+
+Generates synthetic content.json/Markdown corpora at several sizes, then times
+full, incremental and no-op builds of each in a fresh process, recording peak
+memory (max RSS) and output size. With --daemon, builds go to a build daemon
+(daemon.py) instead, which shows what warm, repeated builds cost. Results can
+be saved as a baseline and later runs compared against it, failing when a
+metric regresses past its threshold.
+
+    cd dev && python tools/benchmark.py --sizes small,medium
+    cd dev && python tools/benchmark.py --save-baseline
+    cd dev && python tools/benchmark.py --daemon
+"""
+import argparse
+import copy
+import json
+import os
+import platform
+import random
+import re
+import shutil
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from daemon import START_TIMEOUT, request
+
+TOOLS_DIR = Path(__file__).resolve().parent
+DEV_DIR = TOOLS_DIR.parent
+DOCS_DIR = DEV_DIR.parent / "docs"
+WORK_DIR = DEV_DIR / ".build-cache" / "benchmark"
+BASELINE_FILE = DEV_DIR / "benchmarks" / "baseline.json"
+
+SIZES = {
+    "small": {"papers": 10, "services": 4, "md_paragraphs": 5},
+    "medium": {"papers": 1000, "services": 200, "md_paragraphs": 500},
+    "large": {"papers": 50000, "services": 500, "md_paragraphs": 5000},
+}
+# Allowed slowdown/growth over the baseline before a metric counts as a regression
+THRESHOLDS = {
+    "full_seconds": 0.25,
+    "incremental_seconds": 0.25,
+    "noop_seconds": 0.25,
+    "peak_rss_mb": 0.15,
+    "output_mb": 0.05,
+}
+# Static trees the builder reads from the output directory
+STATIC_DIRS = ["styles", "scripts", "assets"]
+
+
+class Corpus:
+    """A synthetic site tree (dev/ and docs/) generated from the real content."""
+
+    def __init__(self, root, size, seed=0):
+        self.root = Path(root)
+        self.size = size
+        self.params = SIZES[size]
+        self.random = random.Random(seed)
+        self.dev_dir = self.root / "dev"
+        self.docs_dir = self.root / "docs"
+        self.content_file = self.dev_dir / "src" / "data" / "content.json"
+        self.words = []
+
+    def sentence(self, words=14):
+        return ' '.join(self.random.choice(self.words) for _ in range(words)).capitalize() + "."
+
+    def paragraph(self, sentences=5):
+        return ' '.join(self.sentence(self.random.randint(8, 20)) for _ in range(sentences))
+
+    def generate(self):
+        """Write the corpus, replacing any previous one."""
+        if self.root.exists():
+            shutil.rmtree(self.root)
+        (self.dev_dir / "src" / "data" / "content").mkdir(parents=True)
+        self.docs_dir.mkdir(parents=True)
+        shutil.copy2(DEV_DIR / "src" / "data" / "schema.json", self.dev_dir / "src" / "data" / "schema.json")
+        for name in STATIC_DIRS:
+            shutil.copytree(DOCS_DIR / name, self.docs_dir / name,
+                            ignore=shutil.ignore_patterns("bundles", "*.gz", "*.br"))
+        # Reuse the encoded image variants; media encoding isn't measured here
+        images_cache = DEV_DIR / ".build-cache" / "images.json"
+        if images_cache.exists():
+            (self.dev_dir / ".build-cache").mkdir()
+            shutil.copy2(images_cache, self.dev_dir / ".build-cache" / "images.json")
+
+        with open(DEV_DIR / "src" / "data" / "content.json", 'r') as f:
+            source = json.load(f)
+        real_papers = source["research"]["papers"]
+        self.words = sorted({word for paper in real_papers
+                             for word in re.findall(r"[a-z]{3,}", paper["abstract"].lower())})
+        categories = sorted({category for paper in real_papers for category in paper.get("categories", [])})
+
+        content = copy.deepcopy(source)
+        papers = []
+        for i in range(self.params["papers"]):
+            paper = copy.deepcopy(real_papers[i % len(real_papers)])
+            paper["title"] = self.sentence(12)[:-1]
+            paper["doi"] = f"10.5555/bench.{i:06d}"
+            paper["year"] = str(2000 + i % 25)
+            paper["abstract"] = self.paragraph(4)
+            paper["categories"] = self.random.sample(categories, min(3, len(categories)))
+            papers.append(paper)
+        content["research"]["papers"] = papers
+
+        # Keep the real services (their text comes from services.md) and
+        # pad with icon-only ones, which need no media files
+        services = source["services"]["items"][:4]
+        for i in range(len(services), self.params["services"]):
+            services.append({"title": f"Service {i + 1}: {self.sentence(4)[:-1]}",
+                             "description": self.paragraph(2), "icon": "🔬"})
+        content["services"]["items"] = services[:max(self.params["services"], 1)]
+        self.write_json(content)
+
+        content_dir = self.dev_dir / "src" / "data" / "content"
+        for md_file in (DEV_DIR / "src" / "data" / "content").glob("*.md"):
+            text = md_file.read_text(encoding='utf-8').rstrip()
+            extra = [self.paragraph() for _ in range(self.params["md_paragraphs"])]
+            if md_file.name == "about.md":
+                text += "\n\n" + "\n\n".join(extra)
+            else:
+                # Extra sections are parsed but not rendered
+                text += "\n\n" + "\n\n".join(f"# Notes {i + 1}\n{p}" for i, p in enumerate(extra))
+            (content_dir / md_file.name).write_text(text + "\n", encoding='utf-8')
+
+    def write_json(self, content):
+        with open(self.content_file, 'w') as f:
+            json.dump(content, f, indent=2, ensure_ascii=False)
+
+    def edit_one_paper(self, revision):
+        """Change one paper's abstract, as a typical content edit."""
+        with open(self.content_file, 'r') as f:
+            content = json.load(f)
+        paper = content["research"]["papers"][-1]
+        paper["abstract"] = f"Revision {revision}. " + paper["abstract"]
+        self.write_json(content)
+
+    def output_stats(self):
+        """Return (page count, total bytes) of generated HTML."""
+        pages = 0
+        total = 0
+        for dirpath, _, filenames in os.walk(self.docs_dir):
+            for filename in filenames:
+                if filename.endswith(".html"):
+                    pages += 1
+                    total += os.path.getsize(os.path.join(dirpath, filename))
+        return pages, total
+
+
+class DaemonRunner:
+    """A build daemon serving one corpus, started and stopped by the benchmark."""
+
+    def __init__(self, corpus):
+        self.corpus = corpus
+        self.process = subprocess.Popen(
+            [sys.executable, str(TOOLS_DIR / "daemon.py"), "--source-dir", str(corpus.dev_dir), "serve"],
+            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        deadline = time.monotonic() + START_TIMEOUT
+        while request(corpus.dev_dir, {"command": "status"}) is None:
+            if time.monotonic() > deadline or self.process.poll() is not None:
+                raise RuntimeError(f"build daemon didn't start: {self.process.stderr.read().decode()}")
+            time.sleep(0.05)
+
+    def build(self, args):
+        """Run one build through the daemon; return its seconds."""
+        output = []
+        started = time.perf_counter()
+        reply = request(self.corpus.dev_dir, {"args": list(args)}, output.append)
+        seconds = time.perf_counter() - started
+        if not reply or not reply.get("success"):
+            raise RuntimeError(f"build {' '.join(args)} failed: {''.join(output)}")
+        return seconds
+
+    def stop(self):
+        """Stop the daemon; return its peak RSS in MB."""
+        request(self.corpus.dev_dir, {"command": "stop"})
+        _, status, usage = os.wait4(self.process.pid, 0)
+        self.process.returncode = os.waitstatus_to_exitcode(status)
+        self.process.stderr.close()
+        return usage.ru_maxrss / 1024
+
+
+def run_build(corpus, args, daemon=None):
+    """Run one build in a fresh process, or through daemon; return (seconds, peak RSS in MB).
+
+    A daemon's peak RSS is only known once it stops, so it is reported as 0 here.
+    """
+    if daemon:
+        return daemon.build(args), 0
+    started = time.perf_counter()
+    process = subprocess.Popen([sys.executable, str(TOOLS_DIR / "build.py"), *args],
+                               cwd=corpus.dev_dir, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    # wait4 reports the resource usage of this child alone
+    _, status, usage = os.wait4(process.pid, 0)
+    seconds = time.perf_counter() - started
+    process.returncode = os.waitstatus_to_exitcode(status)
+    if process.returncode != 0:
+        raise RuntimeError(f"build {' '.join(args)} failed: {process.stderr.read().decode()}")
+    process.stderr.close()
+    return seconds, usage.ru_maxrss / 1024
+
+
+def median(values):
+    values = sorted(values)
+    middle = len(values) // 2
+    return values[middle] if len(values) % 2 else (values[middle - 1] + values[middle]) / 2
+
+
+def benchmark(size, repeat, jobs, build_args, use_daemon=False):
+    """Benchmark one corpus size; return its metrics."""
+    corpus = Corpus(WORK_DIR / size, size)
+    print(f"🧪 Generating {size} corpus ({SIZES[size]['papers']} papers, "
+          f"{SIZES[size]['services']} services)...")
+    corpus.generate()
+    args = [f"--jobs={jobs}", *build_args]
+    daemon = DaemonRunner(corpus) if use_daemon else None
+
+    full, incremental, noop, memory = [], [], [], []
+    for run in range(repeat):
+        # Full builds start from an empty output tree and no page manifest;
+        # the media caches stay warm
+        for generated in corpus.docs_dir.iterdir():
+            if generated.name in STATIC_DIRS:
+                continue
+            if generated.is_dir():
+                shutil.rmtree(generated)
+            else:
+                generated.unlink()
+        (corpus.dev_dir / ".build-cache" / "manifest.json").unlink(missing_ok=True)
+        seconds, rss = run_build(corpus, args, daemon)
+        full.append(seconds)
+        memory.append(rss)
+
+        corpus.edit_one_paper(run)
+        seconds, rss = run_build(corpus, [*args, "--incremental"], daemon)
+        incremental.append(seconds)
+        memory.append(rss)
+
+        seconds, rss = run_build(corpus, [*args, "--incremental"], daemon)
+        noop.append(seconds)
+        memory.append(rss)
+    if daemon:
+        memory.append(daemon.stop())
+
+    pages, output_bytes = corpus.output_stats()
+    return {
+        "pages": pages,
+        "full_seconds": round(median(full), 4),
+        "incremental_seconds": round(median(incremental), 4),
+        "noop_seconds": round(median(noop), 4),
+        "peak_rss_mb": round(max(memory), 1),
+        "output_mb": round(output_bytes / 1024 / 1024, 3),
+    }
+
+
+def compare(results, baseline, thresholds):
+    """Return the regressions of results against a baseline."""
+    regressions = []
+    for size, metrics in results.items():
+        previous = baseline.get("results", {}).get(size)
+        if not previous:
+            continue
+        for metric, limit in thresholds.items():
+            if metric not in previous or not previous[metric]:
+                continue
+            change = metrics[metric] / previous[metric] - 1
+            if change > limit:
+                regressions.append(f"{size} {metric}: {previous[metric]} → {metrics[metric]} "
+                                   f"(+{change * 100:.0f}%, limit +{limit * 100:.0f}%)")
+    return regressions
+
+
+def format_results(results, baseline=None):
+    metrics = list(THRESHOLDS)
+    lines = [f"{'Size':<8} {'Pages':>7} " + ' '.join(f"{metric:>20}" for metric in metrics)]
+    for size, values in results.items():
+        previous = (baseline or {}).get("results", {}).get(size, {})
+        cells = []
+        for metric in metrics:
+            cell = f"{values[metric]}"
+            if previous.get(metric):
+                cell += f" ({(values[metric] / previous[metric] - 1) * 100:+.0f}%)"
+            cells.append(f"{cell:>20}")
+        lines.append(f"{size:<8} {values['pages']:>7} " + ' '.join(cells))
+    return '\n'.join(lines)
+
+
+def parse_threshold(value):
+    """Parse a METRIC=FRACTION threshold override."""
+    metric, _, fraction = value.partition("=")
+    if metric not in THRESHOLDS:
+        raise argparse.ArgumentTypeError(f"unknown metric '{metric}'; choose from {', '.join(THRESHOLDS)}")
+    try:
+        return metric, float(fraction)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected METRIC=FRACTION, got '{value}'") from None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the website builder on synthetic content.")
+    parser.add_argument("--sizes", default="small,medium",
+                        help=f"comma-separated corpus sizes: {', '.join(SIZES)} (default: small,medium)")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="builds per measurement; the median is reported (default: 3)")
+    parser.add_argument("--jobs", "-j", type=int, default=1, help="--jobs passed to each build")
+    parser.add_argument("--build-arg", action="append", default=[], metavar="ARG",
+                        help="extra build.py argument, e.g. --build-arg=--bundle-css; repeatable")
+    parser.add_argument("--daemon", action="store_true",
+                        help="build through a build daemon per corpus instead of a fresh process per build")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_FILE,
+                        help="baseline results file (default: dev/benchmarks/baseline.json)")
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="store these results as the new baseline")
+    parser.add_argument("--threshold", type=parse_threshold, action="append", default=[],
+                        metavar="METRIC=FRACTION",
+                        help="override an allowed regression, e.g. full_seconds=0.5; repeatable")
+    parser.add_argument("--output", type=Path, help="also write the results as JSON here")
+    args = parser.parse_args()
+
+    sizes = [size.strip() for size in args.sizes.split(",") if size.strip()]
+    unknown = [size for size in sizes if size not in SIZES]
+    if unknown:
+        parser.error(f"unknown size(s): {', '.join(unknown)}")
+    thresholds = {**THRESHOLDS, **dict(args.threshold)}
+
+    results = {size: benchmark(size, args.repeat, args.jobs, args.build_arg, args.daemon) for size in sizes}
+    report = {
+        "config": {"jobs": args.jobs, "repeat": args.repeat, "build_args": args.build_arg, "daemon": args.daemon,
+                   "python": platform.python_version(), "machine": platform.machine(),
+                   "cpus": os.cpu_count()},
+        "results": results,
+    }
+
+    baseline = None
+    if args.baseline.exists():
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+
+    print()
+    print(format_results(results, baseline))
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.save_baseline:
+        # Keep results for sizes this run didn't measure
+        if baseline and baseline.get("config") == report["config"]:
+            report["results"] = {**baseline.get("results", {}), **results}
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"💾 Saved baseline to {args.baseline}")
+        return True
+
+    if baseline is None:
+        print(f"💡 No baseline at {args.baseline}; run with --save-baseline to create one")
+        return True
+    if baseline.get("config") != report["config"]:
+        print("⚠️  Baseline was recorded with a different configuration; comparisons may not be meaningful")
+    regressions = compare(results, baseline, thresholds)
+    if regressions:
+        for regression in regressions:
+            print(f"❌ Regression: {regression}")
+        return False
+    print("✅ No regressions against the baseline")
+    return True
+
+
+if __name__ == "__main__":
+    if not main():
+        exit(1)
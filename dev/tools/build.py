@@ -2,139 +2,85 @@
 """
 Simple website builder that generates HTML from JSON content.
 """
+import argparse
+import cProfile
+import copy
+import hashlib
 import json
 import os
+import pstats
+import re
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from html import escape as escape_html
 from pathlib import Path
 
-class WebsiteBuilder:
-    def __init__(self):
-        self.dev_dir = Path("dev")
-        self.root_dir = Path(".")
-        self.content_dir = Path("src/data/content")
+from assets import AssetFingerprinter
+from compress import Precompressor, brotli
+from cssbundle import BUNDLE_DIR, CSSBundler
+from fonts import FONT_DIR, FontPipeline
+from hints import LoadingHints
+from htmlmin import HTMLMinifier
+from jsbundle import BUNDLE_DIR as JS_BUNDLE_DIR, JSBundler
+from mdrender import MarkdownCache, MarkdownDocument
+from media import ImagePipeline, VideoPipeline
+from offline import ServiceWorkerGenerator
+from profiler import BuildProfiler, format_table, memory_report
+from schema import ContentSchema, SchemaError
+from search import SearchIndexer
+from store import ContentStore
+from stream import load_streaming
+from template import Template
+from validate import DEFAULT_BUDGETS, validate
 
-    def load_md_file(self, filename):
-        """Load content from a markdown file."""
-        md_file = self.content_dir / filename
-        if md_file.exists():
-            with open(md_file, 'r') as f:
-                return f.read().strip()
-        return ""
-
-    def parse_md_sections(self, md_content):
-        """Parse markdown content by headers."""
-        sections = {}
-        current_section = None
-        current_content = []
-
-        for line in md_content.split('\n'):
-            if line.startswith('# '):
-                if current_section:
-                    sections[current_section] = '\n'.join(current_content).strip()
-                current_section = line[2:].strip()
-                current_content = []
-            else:
-                current_content.append(line)
-
-        if current_section:
-            sections[current_section] = '\n'.join(current_content).strip()
-
-        return sections
-
-    def load_content(self):
-        """Load content from JSON file and MD files."""
-        # Load structured data from JSON
-        content_file = Path("src/data/content.json")
-        with open(content_file, 'r') as f:
-            content = json.load(f)
-
-        # Load homepage section
-        homepage_md = self.load_md_file("homepage.md")
-        if homepage_md:
-            homepage_sections = self.parse_md_sections(homepage_md)
-            content["hero"]["title"] = homepage_sections.get("Main Title", "")
-            content["hero"]["subtitle"] = homepage_sections.get("Subtitle", "")
-
-        # Load services section
-        services_md = self.load_md_file("services.md")
-        if services_md:
-            services_sections = self.parse_md_sections(services_md)
-            content["services"]["title"] = services_sections.get("Page Title", "")
-            content["services"]["subtitle"] = services_sections.get("Page Subtitle", "")
-
-            # Load service descriptions
-            if len(content["services"]["items"]) >= 4:
-                content["services"]["items"][0]["description"] = services_sections.get("Service 1: Airway Flow Modeling", "")
-                content["services"]["items"][1]["description"] = services_sections.get("Service 2: Inhaled Drug Delivery Deposition Quantification", "")
-                content["services"]["items"][2]["description"] = services_sections.get("Service 3: Inhaler Device Optimization", "")
-                content["services"]["items"][3]["description"] = services_sections.get("Service 4: 3D Flow Rendering & Visualization", "")
-
-        # Load about section
-        about_md = self.load_md_file("about.md")
-        if about_md:
-            # Split by double newlines to get paragraphs
-            paragraphs = [p.strip() for p in about_md.split('\n\n') if p.strip()]
-            content["about"]["paragraphs"] = paragraphs
-
-        # Load research section
-        research_md = self.load_md_file("research.md")
-        if research_md:
-            research_sections = self.parse_md_sections(research_md)
-            content["research"]["title"] = research_sections.get("Page Title", "")
-            content["research"]["subtitle"] = research_sections.get("Page Subtitle", "")
-
-        # Load contact section
-        contact_md = self.load_md_file("contact.md")
-        if contact_md:
-            contact_sections = self.parse_md_sections(contact_md)
-            content["contact"]["title"] = contact_sections.get("Page Title", "")
-            content["contact"]["subtitle"] = contact_sections.get("Page Subtitle", "")
+# Inputs read by the shared header/footer on every page, besides the schema
+# (which lists the navigation) and the builder templates themselves. Each
+# page's own inputs are listed in src/data/schema.json.
+HEADER_FOOTER_KEYS = ["site", "contact"]
+MANIFEST_VERSION = 2
+# Pages per worker handed to the render pool at a time in streaming builds
+STREAM_BATCH = 64
+# Rendered fragments kept by streaming builds; paper pages each have their
+# own header, so an unbounded cache would grow with the catalogue
+STREAM_FRAGMENT_CACHE = 1024
 
-        return content
-    
-    def generate_navigation(self, current_page="index"):
-        """Generate navigation HTML."""
-        nav_links = {
-            "index": "Home",
-            "services": "Services", 
-            "about": "About",
-            "research": "Research",
-            "contact": "Contact"
-        }
-        
-        nav_html = ""
-        for page, title in nav_links.items():
-            if page == current_page:
-                nav_html += f'<li><a href="{page}.html" class="active">{title}</a></li>'
-            else:
-                if page == "index":
-                    nav_html += f'<li><a href="index.html">{title}</a></li>'
-                else:
-                    nav_html += f'<li><a href="{page}.html">{title}</a></li>'
-        
-        return nav_html
-
-    def generate_header_footer(self, content, current_page="index"):
-        """Generate header and footer HTML."""
-        nav_links = self.generate_navigation(current_page)
-        
-        header = f'''<!DOCTYPE html>
+# Papers per research listing page, unless content.json sets research.page_size
+RESEARCH_PAGE_SIZE = 10
+# Numbered listing links shown either side of the current page, besides the
+# first and last, so each listing page stays small however many there are
+PAGINATION_WINDOW = 2
+PAPERS_DIR = "papers"
+# Listing pages of the papers in one category or year, e.g. research/category-cfd.html
+FACETS_DIR = "research"
+
+# Stylesheets linked from the page header, bundled with --bundle-css
+STYLESHEETS = ["styles/main.css", "styles/components.css", "styles/responsive.css"]
+BUNDLE_REFERENCE = re.compile(rf'(?:{re.escape(BUNDLE_DIR)}/[0-9a-f]+\.css|{re.escape(JS_BUNDLE_DIR)}/[0-9a-f]+\.js)')
+
+# Rendered width of a service card image, for responsive srcset selection
+SERVICE_IMAGE_SIZES = "(max-width: 768px) 100vw, 600px"
+
+NAV_LINK = Template('<li><a href="{href}">{title}</a></li>')
+NAV_LINK_ACTIVE = Template('<li><a href="{href}" class="active">{title}</a></li>')
+
+HEADER = Template('''<!DOCTYPE html>
 <html lang="en">
 <head>
     <meta charset="UTF-8">
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>{current_page.title()} - {content["site"]["title"]}</title>
+    <title>{page_title} - {site_title}</title>
     <link rel="preconnect" href="https://fonts.googleapis.com">
     <link rel="preconnect" href="https://fonts.gstatic.com" crossorigin>
     <link href="https://fonts.googleapis.com/css2?family=DM+Sans:wght@400;500;600;700&family=Outfit:wght@500;600;700&display=swap" rel="stylesheet">
-    <link rel="stylesheet" href="styles/main.css">
-    <link rel="stylesheet" href="styles/components.css">
-    <link rel="stylesheet" href="styles/responsive.css">
+    <link rel="stylesheet" href="{base}styles/main.css">
+    <link rel="stylesheet" href="{base}styles/components.css">
+    <link rel="stylesheet" href="{base}styles/responsive.css">
 </head>
 <body>
     <!-- Header -->
     <header>
         <nav>
-            <div class="logo">{content["site"]["title"]}</div>
+            <div class="logo">{site_title}</div>
             <ul class="nav-links">
                 {nav_links}
             </ul>
@@ -144,55 +90,50 @@ class WebsiteBuilder:
                 <span></span>
             </div>
         </nav>
-    </header>'''
+    </header>''')
 
-        footer = f'''
+FOOTER = Template('''
     <!-- Footer -->
     <footer>
         <div class="container">
             <div class="footer-content">
                 <div class="footer-section">
-                    <h4>{content["site"]["title"]}</h4>
-                    <p>{content["site"]["description"]}</p>
+                    <h4>{site_title}</h4>
+                    <p>{site_description}</p>
                 </div>
                 
                 <div class="footer-section">
                     <h4>Services</h4>
-                    <a href="services.html">Respiratory Tract Modeling</a>
-                    <a href="services.html">Medical Device CFD</a>
-                    <a href="services.html">Biomedical Flow Analysis</a>
+                    <a href="{base}services.html">Respiratory Tract Modeling</a>
+                    <a href="{base}services.html">Medical Device CFD</a>
+                    <a href="{base}services.html">Biomedical Flow Analysis</a>
                 </div>
                 
                 <div class="footer-section">
                     <h4>Contact</h4>
-                    <a href="mailto:{content["contact"]["email"]}">{content["contact"]["email"]}</a>
-                    <a href="tel:{content["contact"]["phone"].replace(' ', '').replace('(', '').replace(')', '').replace('-', '')}">{content["contact"]["phone"]}</a>
+                    <a href="mailto:{email}">{email}</a>
+                    <a href="tel:{phone_link}">{phone}</a>
                 </div>
             </div>
             
             <div class="footer-bottom">
-                <p>&copy; 2025 {content["site"]["title"]}. All rights reserved.</p>
+                <p>&copy; 2025 {site_title}. All rights reserved.</p>
             </div>
         </div>
     </footer>
 
-    <script type="module" src="scripts/main.js"></script>
+    <script type="module" src="{base}scripts/main.js"></script>
 </body>
-</html>'''
-        return header, footer
+</html>''')
 
-    def generate_home_html(self, content):
-        """Generate home page HTML."""
-        header, footer = self.generate_header_footer(content, "index")
-        
-        return header + f'''
+HOME = Template('''
     <!-- Hero Section -->
     <section class="hero hero-page">
         <div class="hero-background"></div>
         <div class="hero-content">
-            <h1>{content["hero"]["title"]}</h1>
-            <p>{content["hero"]["subtitle"]}</p>
-            <a href="contact.html" class="cta-button">{content["hero"]["cta_text"]}</a>
+            <h1>{title}</h1>
+            <p>{subtitle}</p>
+            <a href="contact.html" class="cta-button">{cta_text}</a>
         </div>
     </section>
 
@@ -224,99 +165,82 @@ class WebsiteBuilder:
             </div>
         </div>
     </section>
-''' + footer
+''')
 
-    def generate_services_html(self, content):
-        """Generate services page HTML."""
-        header, footer = self.generate_header_footer(content, "services")
-        
-        html = header + f'''
+SERVICES = Template('''
     <!-- Services Section -->
     <section class="services services-page">
         <div class="container">
-            <h1 class="page-title">{content["services"]["title"]}</h1>
-            <p class="page-subtitle">{content["services"]["subtitle"]}</p>
+            <h1 class="page-title">{title}</h1>
+            <p class="page-subtitle">{subtitle}</p>
             
-            <div class="services-grid">'''
-        
-        # Generate service cards
-        for service in content["services"]["items"]:
-            media_content = ""
-            # Prioritize video over image
-            if service.get("video"):
-                media_content = f'''<div class="service-video">
-                    <video autoplay loop muted playsinline>
-                        <source src="{service["video"]}" type="video/mp4">
-                        Your browser does not support the video tag.
-                    </video>
-                </div>'''
-            elif service.get("image"):
-                media_content = f'<div class="service-image"><img src="{service["image"]}" alt="{service["title"]}"></div>'
-            else:
-                media_content = f'<div class="service-icon">{service["icon"]}</div>'
-
-            service_html = f'''
-                <div class="service-card" data-animate="fade-up">
-                    {media_content}
-                    <h3>{service["title"]}</h3>
-                    <p>{service["description"]}</p>
-                </div>'''
-            html += service_html
-        
-        html += '''
+            <div class="services-grid">{cards}
             </div>
         </div>
     </section>
-''' + footer
-        return html
+''')
 
-    def generate_about_html(self, content):
-        """Generate about page HTML."""
-        header, footer = self.generate_header_footer(content, "about")
-        
-        html = header + f'''
+SERVICE_CARD = Template('''
+                <div class="service-card" data-animate="fade-up">
+                    {media}
+                    <h3>{title}</h3>
+                    {description}
+                </div>''')
+
+SERVICE_VIDEO = Template('''<div class="service-video">
+                    <video preload="none"{poster} loop muted playsinline data-lazy-video>
+                        <source src="{video}" type="video/mp4">
+                        Your browser does not support the video tag.
+                    </video>
+                </div>''')
+
+SERVICE_IMAGE = Template('<div class="service-image">{picture}</div>')
+
+SERVICE_ICON = Template('<div class="service-icon">{icon}</div>')
+
+ABOUT = Template('''
     <!-- About Section -->
     <section class="about about-page">
         <div class="container">
-            <h1 class="page-title">{content["about"]["title"]}</h1>
+            <h1 class="page-title">{title}</h1>
             <div class="about-content">
-                <div class="about-text">'''
-        
-        for paragraph in content["about"]["paragraphs"]:
-            html += f'<p>{paragraph}</p>'
-        
-        html += '''
+                <div class="about-text">{paragraphs}
                 </div>
                 <div>
-                    <div class="stats">'''
-        
-        # Generate stats
-        for stat in content["about"]["stats"]:
-            html += f'''
-                        <div class="stat" data-animate="fade-up">
-                            <div class="stat-number">{stat["number"]}</div>
-                            <div class="stat-label">{stat["label"]}</div>
-                        </div>'''
-        
-        html += '''
+                    <div class="stats">{stats}
                     </div>
                 </div>
             </div>
         </div>
     </section>
-''' + footer
-        return html
+''')
 
-    def generate_contact_html(self, content):
-        """Generate contact page HTML."""
-        header, footer = self.generate_header_footer(content, "contact")
-        
-        return header + f'''
+PARAGRAPH = Template('<p>{text}</p>')
+
+MARKDOWN_PAGE = Template('''
+    <!-- Markdown Page -->
+    <section class="markdown-page">
+        <div class="container">
+            <h1 class="page-title">{title}</h1>
+            <p class="page-subtitle">{subtitle}</p>
+            <div class="markdown-content">{html}
+            </div>
+        </div>
+    </section>
+''')
+
+STAT = Template('''
+                        <div class="stat" data-animate="fade-up">
+                            <div class="stat-number">{number}</div>
+                            <div class="stat-label">{label}</div>
+                        </div>''')
+
+CONTACT = Template('''
     <!-- Contact Section -->
     <section class="contact contact-page">
         <div class="container">
-            <h1 class="page-title">{content["contact"]["title"]}</h1>
-            <p class="page-subtitle">{content["contact"]["subtitle"]}</p>
+            <h1 class="page-title">{title}</h1>
+            <p class="page-subtitle">{subtitle}</p>
             
             <div class="contact-content">
                 <form class="contact-form">
@@ -348,108 +272,1385 @@ class WebsiteBuilder:
                     
                     <div class="contact-item">
                         <span class="contact-item-icon">📧</span>
-                        <span>{content["contact"]["email"]}</span>
+                        <span>{email}</span>
                     </div>
                     
                     <div class="contact-item">
                         <span class="contact-item-icon">📞</span>
-                        <span>{content["contact"]["phone"]}</span>
+                        <span>{phone}</span>
                     </div>
                     
                     <div class="contact-item">
                         <span class="contact-item-icon">📍</span>
-                        <span>{content["contact"]["address"]}</span>
+                        <span>{address}</span>
                     </div>
                     
                     <div class="contact-item">
                         <span class="contact-item-icon">🕒</span>
-                        <span>{content["contact"]["hours"]}</span>
+                        <span>{hours}</span>
                     </div>
                 </div>
             </div>
         </div>
     </section>
-''' + footer
-    
-    def generate_research_html(self, content):
-        """Generate research page HTML."""
-        header, footer = self.generate_header_footer(content, "research")
-        
-        html = header + f'''
+''')
+
+RESEARCH = Template('''
     <!-- Research Section -->
     <section class="research research-page">
         <div class="container">
-            <h1 class="page-title">{content["research"]["title"]}</h1>
-            <p class="page-subtitle">{content["research"]["subtitle"]}</p>
-            
-            <div class="research-grid">'''
-        
-        # Generate research papers
-        for paper in content["research"]["papers"]:
-            categories_html = ""
-            for category in paper["categories"]:
-                categories_html += f'<span class="category-tag">{category}</span>'
-            
-            paper_html = f'''
+            <h1 class="page-title">{title}</h1>
+            <p class="page-subtitle">{subtitle}</p>{back}
+{search}
+            <div class="research-grid">{papers}
+            </div>{pagination}
+        </div>
+    </section>
+''')
+
+SEARCH_FORM = Template('''
+            <form class="paper-search" role="search" data-index="{index}" hidden>
+                <input type="search" class="paper-search-input" placeholder="Search papers by title, author, journal or topic" aria-label="Search research papers" autocomplete="off">
+                <div class="paper-filters">{filters}
+                </div>
+                <p class="search-status" aria-live="polite"></p>
+            </form>
+            <ol class="search-results" hidden></ol>
+            <button type="button" class="search-more" hidden>Show more</button>
+''')
+
+FACET_FILTER = Template('''
+                    <select class="paper-filter" data-facet="{facet}" aria-label="Filter by {facet}">
+                        <option value="">All {label}</option>{options}
+                    </select>''')
+
+FACET_OPTION = Template('''
+                        <option value="{value}"{selected}>{value} ({count})</option>''')
+
+FACET_SUBTITLE = Template('{label}: {value} · {count} {papers}')
+
+BACK_LINK = Template('''
+            <a href="{url}" class="back-link">← All publications</a>''')
+
+PAPER_SUMMARY = Template('''
                 <div class="research-paper" data-animate="fade-up">
                     <div class="paper-header">
-                        <h3 class="paper-title">{paper["title"]}</h3>
-                        <div class="paper-authors">{paper["authors"]}</div>
+                        <h3 class="paper-title"><a href="{url}">{title}</a></h3>
+                        <div class="paper-authors">{authors}</div>
                         <div class="paper-meta">
-                            <span class="journal">{paper["journal"]}</span> • 
-                            <span class="year">{paper["year"]}</span>
+                            <span class="journal">{journal}</span> • 
+                            {year}
                         </div>
-                        <div class="paper-categories">{categories_html}</div>
-                    </div>
-                    <div class="paper-abstract">
-                        <p>{paper["abstract"]}</p>
+                        <div class="paper-categories">{categories}</div>
                     </div>
                     <div class="paper-links">
-                        <a href="https://doi.org/{paper["doi"]}" class="doi-link" target="_blank">DOI: {paper["doi"]}</a>'''
-            
-            if paper["pdf_link"]:
-                paper_html += f'<a href="{paper["pdf_link"]}" class="pdf-link" target="_blank">📄 PDF</a>'
-            
-            paper_html += '''
+                        <a href="{url}" class="details-link">Abstract &amp; details →</a>
+                        <a href="https://doi.org/{doi}" class="doi-link" target="_blank">DOI: {doi}</a>{pdf}
                     </div>
-                </div>'''
-            html += paper_html
-        
-        html += '''
-            </div>
+                </div>''')
+
+PAPER_DETAIL = Template('''
+    <!-- Paper Section -->
+    <section class="research research-page">
+        <div class="container">
+            <article class="research-paper paper-detail">
+                <a href="{back_url}" class="back-link">← All publications</a>
+                <div class="paper-header">
+                    <h1 class="paper-title">{title}</h1>
+                    <div class="paper-authors">{authors}</div>
+                    <div class="paper-meta">
+                        <span class="journal">{journal}</span> • 
+                        {year}
+                    </div>
+                    <div class="paper-categories">{categories}</div>
+                </div>
+                <div class="paper-abstract">
+                    <h2>Abstract</h2>
+                    <p>{abstract}</p>
+                </div>
+                <div class="paper-links">
+                    <a href="https://doi.org/{doi}" class="doi-link" target="_blank">DOI: {doi}</a>{pdf}
+                </div>
+            </article>
         </div>
     </section>
-''' + footer
+''')
+
+PAGINATION = Template('''
+            <nav class="pagination" aria-label="Publication pages">{links}
+            </nav>''')
+
+PAGINATION_LINK = Template('''
+                <a href="{url}" class="{css_class}">{label}</a>''')
+
+PAGINATION_CURRENT = Template('''
+                <span class="pagination-current" aria-current="page">{label}</span>''')
+
+PAGINATION_GAP = '''
+                <span class="pagination-gap" aria-hidden="true">…</span>'''
+
+CATEGORY_TAG = Template('<span class="category-tag">{category}</span>')
+CATEGORY_LINK = Template('<a href="{url}" class="category-tag">{category}</a>')
+YEAR = Template('<span class="year">{year}</span>')
+YEAR_LINK = Template('<a href="{url}" class="year">{year}</a>')
+
+PDF_LINK = Template('<a href="{pdf_link}" class="pdf-link" target="_blank">📄 PDF</a>')
+
+
+def slugify(text):
+    """Turn text into a lowercase, hyphen-separated URL slug."""
+    return re.sub(r'[^a-z0-9]+', '-', text.lower()).strip('-')
+
+
+def is_relative_url(url):
+    """Return True for URLs that resolve against the current page."""
+    return not re.match(r'^([a-z][a-z0-9+.-]*:|/|#)', url, re.IGNORECASE)
+
+
+def hash_bytes(data):
+    """Return the hex SHA-256 digest of some bytes."""
+    return hashlib.sha256(data).hexdigest()
+
+
+def hash_json(value):
+    """Return a stable hash of a JSON-serialisable value."""
+    return hash_bytes(json.dumps(value, sort_keys=True, ensure_ascii=False).encode('utf-8'))
+
+
+def file_stamp(path):
+    """Return a file's (mtime, size), or None if it doesn't exist."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def tools_hash():
+    """Hash the builder source, which holds all page templates."""
+    tools_dir = Path(__file__).resolve().parent
+    return hash_bytes(b''.join(p.read_bytes() for p in sorted(tools_dir.glob("*.py"))))
+
+
+class WebsiteBuilder:
+    def __init__(self, incremental=False, jobs=1, strict_media=False, fingerprint=False, bundle_css=False,
+                 bundle_js=False, precompress=False, profile=False, validate=False, budgets=None, stream=False,
+                 store=False, source_dir=".", output_dir=None, keep_warm=False, service_worker=False,
+                 minify_html=False):
+        # source_dir is the dev/ tree; the site is generated into output_dir,
+        # by default the docs/ tree next to it
+        self.source_dir = Path(source_dir)
+        self.content_dir = self.source_dir / "src/data/content"
+        self.content_file = self.source_dir / "src/data/content.json"
+        self.schema_file = self.source_dir / "src/data/schema.json"
+        self.output_dir = Path(output_dir or os.path.normpath(self.source_dir / "../docs"))
+        self.cache_dir = self.source_dir / ".build-cache"
+        self.manifest_file = self.cache_dir / "manifest.json"
+        self.incremental = incremental
+        self.jobs = jobs
+        self.fragment_cache = {}
+        self.strict_media = strict_media
+        self.images = ImagePipeline(self.output_dir, self.cache_dir)
+        self.videos = VideoPipeline(self.output_dir, self.source_dir / "src/media/videos", self.cache_dir)
+        self.fonts = FontPipeline(self.output_dir, self.source_dir / "src/fonts", self.cache_dir)
+        self.hints = LoadingHints(self.fonts)
+        self.fingerprint = fingerprint
+        self.assets = AssetFingerprinter(self.output_dir, skip_dirs=(
+            self.images.generated_dir + "/", FONT_DIR + "/", BUNDLE_DIR + "/", JS_BUNDLE_DIR + "/"))
+        self.bundle_css = bundle_css
+        self.css = CSSBundler(self.output_dir)
+        self.bundle_js = bundle_js
+        self.js = JSBundler(self.output_dir)
+        self.precompress = precompress
+        self.compressor = Precompressor(self.output_dir, self.cache_dir, jobs=max(jobs, 1))
+        self.markdown = MarkdownCache(self.cache_dir)
+        self.search = SearchIndexer(self.output_dir, self.cache_dir)
+        self.service_worker = service_worker
+        self.offline = ServiceWorkerGenerator(self.output_dir)
+        self.minify_html = minify_html
+        self.minifier = HTMLMinifier()
+        self.validate = validate
+        self.budgets = budgets or {}
+        self.stream = stream
+        self.store = ContentStore(self.cache_dir / "content.db") if store else None
+        self.profiler = BuildProfiler(enabled=profile)
+        self.profile_file = self.cache_dir / "profile.json"
+        self.schema = None
+        self.facet_slugs = {}
+        self.content_key = None
+        # Loaded content, targets and hashes kept between builds of a
+        # long-lived builder (see daemon.py), reused while their inputs match
+        self.warm = {} if keep_warm else None
+
+    def load_md_file(self, filename):
+        """Load a parsed markdown file, or None if it is missing or empty."""
+        md_file = self.content_dir / filename
+        with self.profiler.stage(f"markdown/load_md_file:{filename}") as stage:
+            if md_file.exists():
+                stage.bytes = md_file.stat().st_size
+                if self.store:
+                    document = MarkdownDocument(self.store.sections(filename))
+                else:
+                    document = self.markdown.document(md_file)
+                if any(section["text"] for section in document.sections.values()):
+                    return document
+        return None
+
+    def load_json(self):
+        """Load structured data from the JSON file."""
+        with self.profiler.stage("load_json") as stage:
+            if self.stream:
+                # Papers are spooled to disk one at a time and read back on demand
+                seen = set()
+                content = load_streaming(self.content_file, self.schema.collections["papers"]["path"],
+                                         self.cache_dir / "papers.jsonl",
+                                         lambda paper: self.assign_paper_slug(paper, seen))
+            elif self.store:
+                content = self.load_store()
+            else:
+                with open(self.content_file, 'r') as f:
+                    content = json.load(f)
+                self.assign_paper_slugs(content)
+            stage.bytes = self.content_file.stat().st_size
+            self.assign_facets(content)
+        return content
+
+    def load_store(self):
+        """Import what changed in content.json and the Markdown files into the store; return its content."""
+        seen = set()
+        facets = {facet: spec["field"]
+                  for facet, spec in self.schema.collections.get("papers", {}).get("facets", {}).items()}
+        self.store.import_content(self.content_file, facets, lambda paper: self.assign_paper_slug(paper, seen))
+        for md_name in self.schema.sources:
+            md_file = self.content_dir / md_name
+            if md_file.exists():
+                entry = self.markdown.entry(md_file)
+                self.store.import_markdown(md_name, entry["hash"], entry["sections"])
+            else:
+                self.store.forget_markdown(md_name)
+        self.store.commit()
+        return self.store.content()
+
+    def load_schema(self):
+        """Load and compile the content schema, validating it if it changed."""
+        with self.profiler.stage("schema"):
+            generators = {name for name in dir(self) if name.startswith("generate_") and name.endswith("_html")}
+            self.schema = ContentSchema(self.schema_file, self.cache_dir, generators)
+        return self.schema
+
+    def merge_md_file(self, md_name, content):
+        """Merge one Markdown file into content, as the schema binds it."""
+        document = self.load_md_file(md_name)
+        if document:
+            md_hash = self.markdown.hash(self.content_dir / md_name)
+            self.schema.bind(md_name, document, md_hash, content)
+
+    def load_content(self, md_files=None):
+        """Load content from JSON file and MD files.
+
+        md_files limits which Markdown files are merged; by default all are.
+        """
+        with self.profiler.stage("load_content"):
+            schema = self.schema or self.load_schema()
+            content = self.load_json()
+            schema.validate_content(content)
+            for md_name in (schema.sources if md_files is None else md_files):
+                self.merge_md_file(md_name, content)
+        return content
+
+    def generate_navigation(self, current_page="index", base=""):
+        """Generate navigation HTML."""
+        return ''.join([
+            (NAV_LINK_ACTIVE if page == current_page else NAV_LINK).render(href=f"{base}{page}.html", title=title)
+            for page, title in self.schema.nav_links.items()
+        ])
+
+    def generate_header_footer(self, content, current_page="index", base="", page_title=None):
+        """Generate header and footer HTML.
+
+        base is the relative path from the page back to the site root, for
+        pages in subdirectories. Both fragments are rendered once per distinct
+        input and reused, so the footer (identical on every top-level page) is
+        only rendered once per build.
+        """
+        site = content["site"]
+        contact = content["contact"]
+        page_title = page_title or current_page.title()
+        header_key = ("header", current_page, base, page_title, site["title"])
+        footer_key = ("footer", base, site["title"], site["description"], contact["email"], contact["phone"])
+        if self.stream and len(self.fragment_cache) >= STREAM_FRAGMENT_CACHE:
+            self.fragment_cache.clear()
+
+        if header_key not in self.fragment_cache:
+            self.fragment_cache[header_key] = HEADER.render(
+                base=base,
+                page_title=page_title,
+                site_title=site["title"],
+                nav_links=self.generate_navigation(current_page, base)
+            )
+        if footer_key not in self.fragment_cache:
+            phone_link = contact["phone"].replace(' ', '').replace('(', '').replace(')', '').replace('-', '')
+            self.fragment_cache[footer_key] = FOOTER.render(
+                base=base,
+                site_title=site["title"],
+                site_description=site["description"],
+                email=contact["email"],
+                phone=contact["phone"],
+                phone_link=phone_link
+            )
+        return self.fragment_cache[header_key], self.fragment_cache[footer_key]
+
+    def generate_home_html(self, content):
+        """Generate home page HTML."""
+        header, footer = self.generate_header_footer(content, "index")
+        hero = content["hero"]
+        return ''.join([
+            header,
+            HOME.render(title=hero["title"], subtitle=hero["subtitle"], cta_text=hero["cta_text"]),
+            footer
+        ])
+
+    def generate_service_media(self, service):
+        """Generate the media block of a service card."""
+        # Prioritize video over image, unless the video file is missing
+        video = self.videos.get(service["video"]) if service.get("video") else None
+        if video:
+            poster = video["poster"]
+            if poster is None and service.get("image"):
+                poster = self.images.poster_url(service["image"])
+            return SERVICE_VIDEO.render(video=video["path"], poster=f' poster="{poster}"' if poster else "")
+        if service.get("image"):
+            picture = self.images.picture_html(service["image"], service["title"], SERVICE_IMAGE_SIZES)
+            return SERVICE_IMAGE.render(picture=picture)
+        return SERVICE_ICON.render(icon=service["icon"])
+
+    def collect_videos(self, content):
+        """List the site-relative videos the service cards reference."""
+        return [service["video"] for service in content["services"]["items"] if service.get("video")]
+
+    def collect_images(self, content):
+        """List the site-relative images the service cards render.
+
+        Images are shown when a service has no usable video, and double as the
+        poster of videos without an extracted poster frame.
+        """
+        images = []
+        for service in content["services"]["items"]:
+            if not service.get("image"):
+                continue
+            video = self.videos.get(service["video"]) if service.get("video") else None
+            if video is None or video["poster"] is None:
+                images.append(service["image"])
+        return images
+
+    def collect_text(self, content):
+        """Gather the text pages can show: content, Markdown, templates and scripts."""
+        parts = []
+
+        def walk(value):
+            if isinstance(value, str):
+                parts.append(value)
+            elif isinstance(value, dict):
+                for item in value.values():
+                    walk(item)
+            elif isinstance(value, list):
+                for item in value:
+                    walk(item)
+
+        walk(content)
+        sources = [*self.content_dir.glob("*.md"), Path(__file__),
+                   *(self.output_dir / "scripts").rglob("*.js")]
+        parts += [path.read_text(encoding='utf-8') for path in sources]
+        return ''.join(parts)
+
+    def check_media(self, content):
+        """Report referenced media files that don't exist in the output tree.
+
+        Returns the list of missing site-relative paths.
+        """
+        missing = []
+        for service in content["services"]["items"]:
+            for key in ("video", "image"):
+                path = service.get(key)
+                if not path:
+                    continue
+                found = self.videos.get(path) is not None if key == "video" else (self.output_dir / path).exists()
+                if not found:
+                    missing.append(path)
+                    fallback = " (falling back to image)" if key == "video" and service.get("image") else ""
+                    print(f"⚠️  Missing media for service \"{service['title']}\": {path}{fallback}")
+        return missing
+
+    def generate_services_html(self, content):
+        """Generate services page HTML."""
+        header, footer = self.generate_header_footer(content, "services")
+        services = content["services"]
+        cards = SERVICE_CARD.render_each(
+            {
+                "media": self.generate_service_media(service),
+                "title": service["title"],
+                "description": service.get("description_html") or PARAGRAPH.render(text=service["description"])
+            }
+            for service in services["items"]
+        )
+        return ''.join([
+            header,
+            SERVICES.render(title=services["title"], subtitle=services["subtitle"], cards=cards),
+            footer
+        ])
+
+    def generate_about_html(self, content):
+        """Generate about page HTML."""
+        header, footer = self.generate_header_footer(content, "about")
+        about = content["about"]
+        return ''.join([
+            header,
+            ABOUT.render(
+                title=about["title"],
+                paragraphs=about.get("html") or PARAGRAPH.render_each({"text": p} for p in about["paragraphs"]),
+                stats=STAT.render_each(about["stats"])
+            ),
+            footer
+        ])
+
+    def generate_contact_html(self, content):
+        """Generate contact page HTML."""
+        header, footer = self.generate_header_footer(content, "contact")
+        contact = content["contact"]
+        return ''.join([
+            header,
+            CONTACT.render(
+                title=contact["title"],
+                subtitle=contact["subtitle"],
+                email=contact["email"],
+                phone=contact["phone"],
+                address=contact["address"],
+                hours=contact["hours"]
+            ),
+            footer
+        ])
+
+    def generate_markdown_page_html(self, content, page):
+        """Generate a page made only of its Markdown file."""
+        header, footer = self.generate_header_footer(content, page, page_title=self.schema.nav_links.get(page))
+        markdown = content.get(page, {})
+        return ''.join([
+            header,
+            MARKDOWN_PAGE.render(
+                title=markdown.get("title", ""),
+                subtitle=markdown.get("subtitle", ""),
+                html=markdown.get("html", "")
+            ),
+            footer
+        ])
+
+    def assign_paper_slugs(self, content):
+        """Give every research paper a unique, stable "slug".
+
+        An explicit slug in content.json wins; otherwise the DOI is used, as it
+        never changes when a title is corrected, falling back to the title.
+        """
+        seen = set()
+        for paper in content["research"]["papers"]:
+            self.assign_paper_slug(paper, seen)
+
+    def assign_paper_slug(self, paper, seen):
+        """Give one paper a slug not in seen; add it to seen and return it."""
+        base_slug = slugify(paper.get("slug") or paper.get("doi") or paper["title"]) or "paper"
+        slug = base_slug
+        n = 2
+        while slug in seen:
+            slug = f"{base_slug}-{n}"
+            n += 1
+        seen.add(slug)
+        paper["slug"] = slug
+        return slug
+
+    def assign_facets(self, content):
+        """Index the papers by each facet the schema declares (category, year).
+
+        Sets research["facets"] to {facet: [{"value", "slug", "ids"}, ...]},
+        where ids are the ascending indexes of the papers with that value.
+        Years are listed newest first, other values by paper count.
+        """
+        papers = content["research"]["papers"]
+        facets = {}
+        self.facet_slugs = {}
+        for facet, spec in self.schema.collections.get("papers", {}).get("facets", {}).items():
+            if self.store:
+                # One indexed query instead of a scan of every paper
+                ids = self.store.facet_ids(facet)
+            else:
+                ids = {}
+                for index, paper in enumerate(papers):
+                    values = paper.get(spec["field"], [])
+                    for value in dict.fromkeys(values if isinstance(values, list) else [values]):
+                        ids.setdefault(str(value), []).append(index)
+            if all(value.isdigit() for value in ids):
+                order = sorted(ids, key=int, reverse=True)
+            else:
+                order = sorted(ids, key=lambda value: (-len(ids[value]), value.casefold()))
+
+            entries = []
+            seen = set()
+            for value in order:
+                base_slug = slugify(value) or facet
+                slug = base_slug
+                n = 2
+                # "-page-N" is how later listing pages are named
+                while slug in seen or re.search(r'-page-\d+$', slug):
+                    slug = f"{base_slug}-{n}"
+                    n += 1
+                seen.add(slug)
+                self.facet_slugs[(facet, value)] = slug
+                entries.append({"value": value, "slug": slug, "ids": ids[value]})
+            facets[facet] = entries
+        content["research"]["facets"] = facets
+
+    def research_page_size(self, content):
+        """Return the number of papers per research listing page."""
+        return max(1, int(content["research"].get("page_size", RESEARCH_PAGE_SIZE)))
+
+    def research_page_count(self, content):
+        """Return the number of research listing pages."""
+        papers = content["research"]["papers"]
+        return max(1, -(-len(papers) // self.research_page_size(content)))
+
+    def research_page_url(self, page_number, base=""):
+        """Return the URL of a research listing page."""
+        return f"{base}research.html" if page_number == 1 else f"{base}research-{page_number}.html"
+
+    def facet_page_url(self, facet, value, page_number=1, base=""):
+        """Return the URL of a facet value's listing page, or None if it has none."""
+        slug = self.facet_slugs.get((facet, str(value)))
+        if slug is None:
+            return None
+        page = "" if page_number == 1 else f"-page-{page_number}"
+        return f"{base}{FACETS_DIR}/{facet}-{slug}{page}.html"
+
+    def generate_facet_links(self, paper, base=""):
+        """Render a paper's categories and year, linked to their facet pages."""
+        categories = []
+        for category in paper["categories"]:
+            url = self.facet_page_url("category", category, base=base)
+            categories.append(CATEGORY_LINK.render(url=url, category=category) if url
+                              else CATEGORY_TAG.render(category=category))
+        url = self.facet_page_url("year", paper["year"], base=base)
+        year = YEAR_LINK.render(url=url, year=paper["year"]) if url else YEAR.render(year=paper["year"])
+        return ''.join(categories), year
+
+    def generate_search_form(self, content, base="", selected=None):
+        """Render the search box and facet filters of a listing page.
+
+        selected is the (facet, value) a facet listing page preselects.
+        """
+        key = ("search", base, selected)
+        if key not in self.fragment_cache:
+            filters = []
+            for facet, entries in content["research"]["facets"].items():
+                spec = self.schema.collections["papers"]["facets"][facet]
+                options = FACET_OPTION.render_each({
+                    "value": escape_html(entry["value"]),
+                    "selected": " selected" if selected == (facet, entry["value"]) else "",
+                    "count": len(entry["ids"]),
+                } for entry in entries)
+                filters.append(FACET_FILTER.render(facet=facet, label=spec["label"].lower(), options=options))
+            self.fragment_cache[key] = SEARCH_FORM.render(index=f"{base}search/index.json", filters=''.join(filters))
+        return self.fragment_cache[key]
+
+    def paper_page_url(self, paper, base=""):
+        """Return the URL of a paper's detail page."""
+        return f"{base}{PAPERS_DIR}/{paper['slug']}.html"
+
+    def generate_paper_links(self, paper, base=""):
+        """Generate the optional PDF link of a paper."""
+        if not paper["pdf_link"]:
+            return ""
+        pdf_link = paper["pdf_link"]
+        if is_relative_url(pdf_link):
+            pdf_link = base + pdf_link
+        return PDF_LINK.render(pdf_link=pdf_link)
+
+    def generate_paper_html(self, paper, base=""):
+        """Generate the summary card for one research paper."""
+        categories, year = self.generate_facet_links(paper, base)
+        return PAPER_SUMMARY.render(
+            url=self.paper_page_url(paper, base),
+            title=paper["title"],
+            authors=paper["authors"],
+            journal=paper["journal"],
+            year=year,
+            categories=categories,
+            doi=paper["doi"],
+            pdf=self.generate_paper_links(paper, base)
+        )
+
+    def generate_pagination(self, page_number, page_count, page_url=None):
+        """Generate previous/next and numbered links between listing pages.
+
+        page_url maps a page number to its URL; research listing pages by default.
+        """
+        if page_count <= 1:
+            return ""
+        page_url = page_url or self.research_page_url
+        links = []
+        if page_number > 1:
+            links.append(PAGINATION_LINK.render(
+                url=page_url(page_number - 1), css_class="pagination-prev", label="← Previous"))
+        shown = {1, page_count, *range(page_number - PAGINATION_WINDOW, page_number + PAGINATION_WINDOW + 1)}
+        # A gap of a single page shows that page instead of an ellipsis
+        for n in sorted(shown):
+            if n + 2 in shown and n + 1 not in shown:
+                shown.add(n + 1)
+        previous = 0
+        for n in sorted(n for n in shown if 1 <= n <= page_count):
+            if n > previous + 1:
+                links.append(PAGINATION_GAP)
+            previous = n
+            if n == page_number:
+                links.append(PAGINATION_CURRENT.render(label=n))
+            else:
+                links.append(PAGINATION_LINK.render(
+                    url=page_url(n), css_class="pagination-page", label=n))
+        if page_number < page_count:
+            links.append(PAGINATION_LINK.render(
+                url=page_url(page_number + 1), css_class="pagination-next", label="Next →"))
+        return PAGINATION.render(links=''.join(links))
+
+    def generate_research_html(self, content, page_number=1):
+        """Generate one research listing page HTML."""
+        research = content["research"]
+        page_size = self.research_page_size(content)
+        page_count = self.research_page_count(content)
+        page_title = "Research" if page_number == 1 else f"Research (Page {page_number})"
+        header, footer = self.generate_header_footer(content, "research", page_title=page_title)
+
+        start = (page_number - 1) * page_size
+        papers = ''.join([self.generate_paper_html(paper) for paper in research["papers"][start:start + page_size]])
+        return ''.join([
+            header,
+            RESEARCH.render(
+                title=research["title"],
+                subtitle=research["subtitle"],
+                back="",
+                search=self.generate_search_form(content),
+                papers=papers,
+                pagination=self.generate_pagination(page_number, page_count)
+            ),
+            footer
+        ])
+
+    def facet_page_count(self, content, entry):
+        """Return the number of listing pages of one facet value."""
+        return max(1, -(-len(entry["ids"]) // self.research_page_size(content)))
+
+    def generate_facet_html(self, content, facet, position, page_number=1):
+        """Generate one listing page of the papers with a facet value, e.g. category CFD."""
+        research = content["research"]
+        entry = research["facets"][facet][position]
+        value = entry["value"]
+        base = "../"
+        page_size = self.research_page_size(content)
+        page_count = self.facet_page_count(content, entry)
+        page_title = f"Research: {value}" if page_number == 1 else f"Research: {value} (Page {page_number})"
+        header, footer = self.generate_header_footer(content, "research", base=base, page_title=page_title)
+
+        start = (page_number - 1) * page_size
+        papers = ''.join([self.generate_paper_html(research["papers"][index], base)
+                          for index in entry["ids"][start:start + page_size]])
+        count = len(entry["ids"])
+        return ''.join([
+            header,
+            RESEARCH.render(
+                title=research["title"],
+                subtitle=FACET_SUBTITLE.render(label=facet.title(), value=value, count=count,
+                                               papers="paper" if count == 1 else "papers"),
+                back=BACK_LINK.render(url=self.research_page_url(1, base)),
+                search=self.generate_search_form(content, base, (facet, value)),
+                papers=papers,
+                pagination=self.generate_pagination(
+                    page_number, page_count, lambda n: self.facet_page_url(facet, value, n, base))
+            ),
+            footer
+        ])
+
+    def generate_paper_page_html(self, content, index):
+        """Generate the detail page of one research paper."""
+        paper = content["research"]["papers"][index]
+        base = "../"
+        header, footer = self.generate_header_footer(content, "research", base=base, page_title=paper["title"])
+        page_number = index // self.research_page_size(content) + 1
+        categories, year = self.generate_facet_links(paper, base)
+        return ''.join([
+            header,
+            PAPER_DETAIL.render(
+                back_url=self.research_page_url(page_number, base),
+                title=paper["title"],
+                authors=paper["authors"],
+                journal=paper["journal"],
+                year=year,
+                categories=categories,
+                abstract=paper["abstract"],
+                doi=paper["doi"],
+                pdf=self.generate_paper_links(paper, base)
+            ),
+            footer
+        ])
+
+    def pass_inputs(self):
+        """Hash the inputs of the enabled output passes, which every page reads."""
+        inputs = {}
+        if self.fonts.hash:
+            inputs["fonts"] = self.fonts.hash
+        if self.fingerprint:
+            inputs["assets"] = hash_json(self.assets.manifest)
+        if self.bundle_css:
+            inputs["css"] = hash_json([self.css.source_hash, sorted(self.css.runtime_tokens)])
+        if self.bundle_js:
+            inputs["js"] = self.js.source_hash
+        if self.service_worker:
+            inputs["service_worker"] = True
+        if self.minify_html:
+            inputs["minify_html"] = True
+        return inputs
+
+    def build_targets(self, data):
+        """List every output file with its render task and input hashes.
+
+        data is the raw JSON content, before Markdown files are merged in.
+        Each target maps an output filename to {"task": (generator method
+        name, extra args), "inputs": {input name: hash}}. Tasks are
+        independent and can run in any process that holds the loaded content.
+        Streaming builds record one digest of the inputs instead, to keep
+        tens of thousands of targets small.
+        """
+        template = self.template_hash()
+        shared = self.pass_inputs()
+        key_hashes = {}
+        md_hashes = {}
+        for md_name in self.schema.sources:
+            md_file = self.content_dir / md_name
+            md_hashes[md_name] = self.markdown.hash(md_file) if md_file.exists() else ""
+
+        def inputs_for(keys=(), md=()):
+            hashes = {"template": template, "schema": self.schema.hash, **shared}
+            for key in HEADER_FOOTER_KEYS + list(keys):
+                if key not in key_hashes:
+                    key_hashes[key] = hash_json(data[key]) if key in data else ""
+                hashes[f"json:{key}"] = key_hashes[key]
+            for md_name in md:
+                hashes[f"md:{md_name}"] = md_hashes[md_name]
+            return hashes
+
+        targets = {}
+
+        def add(filename, task, inputs):
+            targets[filename] = {"task": task, "inputs": hash_json(inputs) if self.stream else inputs}
+
+        # Media markup depends on which videos exist, and images are named
+        # after their source bytes
+        media = hash_json({
+            "videos": {video: self.videos.get(video) for video in self.collect_videos(data)},
+            "images": {
+                src: self.images.source_hash(src) if (self.output_dir / src).exists() else ""
+                for src in self.collect_images(data)
+            }
+        })
+        # Targets only change with the content and the hashes above
+        key = self.content_key and [self.content_key, template, shared, md_hashes, media]
+        kept = self.warm_get("targets", key)
+        if kept is not None:
+            return kept
+
+        for page, spec in self.schema.pages.items():
+            # Paginated pages are listed with their paper pages below
+            if spec.get("paginate"):
+                continue
+            inputs = inputs_for(*self.schema.page_inputs(page))
+            if page == "services":
+                inputs["media"] = media
+            add(f"{page}.html", self.schema.page_task(page), inputs)
+
+        # Research listing pages only read their own slice of papers
+        research = data["research"]
+        papers = research["papers"]
+        page_size = self.research_page_size(data)
+        page_count = self.research_page_count(data)
+        research_meta = hash_json({k: v for k, v in research.items() if k != "papers"})
+        for page_number in range(1, page_count + 1):
+            start = (page_number - 1) * page_size
+            inputs = inputs_for(md=self.schema.page_inputs("research")[1])
+            inputs["json:research"] = research_meta
+            inputs["papers"] = hash_json([page_count, papers[start:start + page_size]])
+            add(self.research_page_url(page_number), ("generate_research_html", (page_number,)), inputs)
+
+        # Facet listing pages read the slice of papers with their value
+        for facet, entries in research["facets"].items():
+            for position, entry in enumerate(entries):
+                page_count = self.facet_page_count(data, entry)
+                for page_number in range(1, page_count + 1):
+                    start = (page_number - 1) * page_size
+                    inputs = inputs_for(md=self.schema.page_inputs("research")[1])
+                    inputs["json:research"] = research_meta
+                    inputs["papers"] = hash_json([page_count, [papers[index] for index in entry["ids"][start:start + page_size]]])
+                    add(self.facet_page_url(facet, entry["value"], page_number),
+                        ("generate_facet_html", (facet, position, page_number)), inputs)
+
+        # Each paper detail page only reads its own paper and its facet links
+        for index, paper in enumerate(papers):
+            inputs = inputs_for()
+            inputs["paper"] = hash_json([index // page_size, paper, self.generate_facet_links(paper)])
+            add(self.paper_page_url(paper), ("generate_paper_page_html", (index,)), inputs)
+        self.warm_put("targets", key, targets)
+        return targets
+
+    def render_task(self, content, task):
+        """Run one render task and return (output filename, html)."""
+        filename, method, args = task
+        with self.profiler.stage(f"render/{method}:{filename}") as stage:
+            html = getattr(self, method)(content, *args)
+            stage.bytes = len(html)
+        with self.profiler.stage("render/postprocess") as stage:
+            html = self.postprocess(filename, html)
+            stage.bytes = len(html)
+        return filename, html
+
+    def postprocess(self, filename, html):
+        """Apply the output passes to a rendered page."""
+        html = self.hints.rewrite_html(filename, html)
+        if self.bundle_css:
+            html = self.css.rewrite_html(filename, html)
+        if self.bundle_js:
+            html = self.js.rewrite_html(filename, html)
+        if self.fingerprint:
+            html = self.assets.rewrite_html(filename, html)
+        if self.service_worker:
+            html = self.offline.register_html(filename, html)
         return html
 
+    def render_all(self, content, tasks):
+        """Render every task, in a process pool when jobs > 1.
+
+        Results come back in task order, so output is identical to a serial
+        build.
+        """
+        if self.jobs <= 1 or len(tasks) <= 1:
+            return [self.render_task(content, task) for task in tasks]
+        # Content is handed to each worker once, through the initializer
+        with ProcessPoolExecutor(max_workers=self.jobs, initializer=_init_render_worker,
+                                 initargs=(self, content)) as pool:
+            chunksize = max(1, len(tasks) // (self.jobs * 4))
+            results = list(pool.map(_render_in_worker, tasks, chunksize=chunksize))
+        # Workers time their own stages; fold them into this build's profile
+        for _, records in results:
+            self.profiler.merge(records)
+        return [result for result, _ in results]
+
+    def render_stream(self, content, tasks):
+        """Yield (output filename, html) for each task, in task order.
+
+        With jobs > 1, tasks go to a process pool a batch at a time, so at
+        most a batch of rendered pages waits to be consumed.
+        """
+        if self.jobs <= 1 or len(tasks) <= 1:
+            for task in tasks:
+                yield self.render_task(content, task)
+            return
+        batch_size = self.jobs * STREAM_BATCH
+        with ProcessPoolExecutor(max_workers=self.jobs, initializer=_init_render_worker,
+                                 initargs=(self, content)) as pool:
+            for start in range(0, len(tasks), batch_size):
+                batch = tasks[start:start + batch_size]
+                chunksize = max(1, len(batch) // (self.jobs * 4))
+                for result, records in pool.map(_render_in_worker, batch, chunksize=chunksize):
+                    self.profiler.merge(records)
+                    yield result
+
+    def render_and_write(self, content, tasks, stage):
+        """Render tasks and write each page as it arrives, for streaming builds.
+
+        Returns the files whose contents changed and the bundles each page links.
+        """
+        output_files = []
+        bundles = {}
+        for output_dir in {(self.output_dir / filename).parent for filename, *_ in tasks}:
+            output_dir.mkdir(parents=True, exist_ok=True)
+        for filename, page_html in self.render_stream(content, tasks):
+            page_html = self.minify_page(filename, page_html)
+            stage.bytes += len(page_html)
+            output_file = self.output_dir / filename
+            if self.write_if_changed(output_file, page_html):
+                output_files.append(output_file)
+            bundles[filename] = sorted(set(BUNDLE_REFERENCE.findall(page_html)))
+        return output_files, bundles
+
+    def write_all(self, rendered):
+        """Write rendered pages, concurrently when jobs > 1.
+
+        Returns the files whose contents changed.
+        """
+        output_files = [self.output_dir / filename for filename, _ in rendered]
+        html = [self.minify_page(filename, page_html) for filename, page_html in rendered]
+        for output_dir in {f.parent for f in output_files}:
+            output_dir.mkdir(parents=True, exist_ok=True)
+        if self.jobs <= 1:
+            written = [self.write_if_changed(f, h) for f, h in zip(output_files, html)]
+        else:
+            with ThreadPoolExecutor(max_workers=self.jobs) as pool:
+                written = list(pool.map(self.write_if_changed, output_files, html))
+        return [f for f, changed in zip(output_files, written) if changed]
+
+    def minify_page(self, filename, html):
+        """Minify a page on its way to disk, when enabled."""
+        if not self.minify_html:
+            return html
+        with self.profiler.stage(f"write/minify_html:{filename}") as stage:
+            stage.bytes = len(html)
+            return self.minifier.minify(filename, html)
+
+    def template_hash(self):
+        """Hash the builder source, which holds all page templates."""
+        # A long-lived builder runs the code it was loaded with
+        if self.warm is None:
+            return tools_hash()
+        if "template" not in self.warm:
+            self.warm["template"] = tools_hash()
+        return self.warm["template"]
+
+    def warm_get(self, name, key):
+        """A value an earlier build of this builder kept under the same key, or None."""
+        if self.warm is None or key is None or name not in self.warm:
+            return None
+        kept_key, value = self.warm[name]
+        return value if kept_key == key else None
+
+    def warm_put(self, name, key, value):
+        """Keep a value for later builds of a long-lived builder."""
+        if self.warm is not None and key is not None:
+            self.warm[name] = (key, value)
+
+    def __getstate__(self):
+        # Render workers get the content separately; don't pickle it twice
+        state = self.__dict__.copy()
+        state["warm"] = None
+        return state
+
+    def load_manifest(self):
+        """Load the hash manifest recorded by the previous build."""
+        stamp = file_stamp(self.manifest_file)
+        pages = self.warm_get("manifest", stamp)
+        if pages is not None:
+            return pages
+        try:
+            with open(self.manifest_file, 'r') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if manifest.get("version") != MANIFEST_VERSION:
+            return {}
+        pages = manifest.get("pages", {})
+        self.warm_put("manifest", stamp, pages)
+        return pages
+
+    def save_manifest(self, pages, previous=None):
+        """Persist the per-file input hashes for the next build, unless they are unchanged."""
+        if pages == previous and self.manifest_file.exists():
+            return
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        with open(self.manifest_file, 'w') as f:
+            json.dump({"version": MANIFEST_VERSION, "pages": pages}, f, indent=2, sort_keys=True)
+        self.warm_put("manifest", file_stamp(self.manifest_file), pages)
+
+    def remove_orphans(self, previous, targets):
+        """Delete generated files that are no longer build targets.
+
+        Only files recorded in the previous manifest are touched, e.g. paper
+        pages for removed papers or listing pages past the new page count.
+        """
+        removed = []
+        for filename in previous:
+            if filename not in targets:
+                output_file = self.output_dir / filename
+                if output_file.exists():
+                    output_file.unlink()
+                    removed.append(output_file)
+        return removed
+
+    def write_if_changed(self, output_file, text):
+        """Write text to output_file unless it already holds those bytes.
+
+        Returns True when the file was written.
+        """
+        data = text.encode('utf-8')
+        with self.profiler.stage(f"write/write_if_changed:{output_file.relative_to(self.output_dir).as_posix()}") as stage:
+            stage.bytes = len(data)
+            try:
+                if output_file.read_bytes() == data:
+                    return False
+            except OSError:
+                pass
+            with open(output_file, 'wb') as f:
+                f.write(data)
+        return True
+
     def build(self):
         """Build the website."""
         print("🔨 Building multi-page website from JSON content...")
-        
-        # Load content
-        content = self.load_content()
-        
-        # Generate all pages
-        pages = {
-            "index": self.generate_home_html(content),
-            "services": self.generate_services_html(content),
-            "about": self.generate_about_html(content), 
-            "research": self.generate_research_html(content),
-            "contact": self.generate_contact_html(content)
-        }
-        
-        # Write all pages to parent directory
-        output_files = []
-        for page_name, page_html in pages.items():
-            output_file = Path(f"../docs/{page_name}.html")
-            with open(output_file, 'w') as f:
-                f.write(page_html)
-            output_files.append(output_file)
-            
+        self.profiler.begin()
+        self.fragment_cache.clear()
+        self.minifier.reset()
+
+        # The store revision this build's changes are reported against
+        built_revision = int(self.store.meta("built", "0")) if self.store else 0
+
+        # Compile the schema and check content.json against it
+        try:
+            self.load_schema()
+            # content.json as loaded, slugged and validated by an earlier
+            # build of a long-lived builder, while it and the schema are unchanged
+            self.content_key = None
+            if not (self.stream or self.store):
+                self.content_key = [file_stamp(self.content_file), self.schema.hash]
+            warm = self.warm_get("content", self.content_key)
+            if warm:
+                data, self.facet_slugs = warm
+            else:
+                data = self.load_json()
+                self.schema.validate_content(data)
+                self.warm_put("content", self.content_key, (data, self.facet_slugs))
+        except SchemaError as e:
+            print(f"❌ Build failed: {self.schema_file} or content.json is invalid:")
+            for problem in e.problems:
+                print(f"   - {problem}")
+            return False
+
+        # Transcode changed videos and verify referenced media exists
+        with self.profiler.stage("videos"):
+            self.videos.prepare(self.collect_videos(data))
+        with self.profiler.stage("check_media"):
+            missing_media = self.check_media(data)
+        if missing_media and self.strict_media:
+            print(f"❌ Build failed: {len(missing_media)} referenced media file(s) missing")
+            return False
+
+        # Encode image variants before rendering, so workers only look them up
+        with self.profiler.stage("images"):
+            self.images.prepare(self.collect_images(data))
+
+        # Subset self-hosted fonts to the characters the site uses
+        with self.profiler.stage("fonts"):
+            # Without source fonts there is no character set to gather
+            self.fonts.prepare(self.collect_text(data) if self.fonts.sources() else "")
+
+        # Fingerprint static assets; every page links to them
+        if self.fingerprint:
+            with self.profiler.stage("fingerprint"):
+                self.assets.build()
+            print(f"🔖 Fingerprinted {len(self.assets.manifest)} assets into {self.assets.manifest_file}")
+        else:
+            self.assets.remove()
+
+        # Parse the stylesheets once; pages inline and link pruned copies
+        if self.bundle_css:
+            with self.profiler.stage("bundle_css"):
+                self.css.load(STYLESHEETS)
+
+        # Resolve the script module graph once; pages link tree-shaken bundles
+        if self.bundle_js:
+            with self.profiler.stage("bundle_js"):
+                self.js.load()
+
+        with self.profiler.stage("targets"):
+            targets = self.build_targets(data)
+        previous = self.load_manifest()
+        stale = [
+            filename for filename, target in targets.items()
+            if not self.incremental
+            or previous.get(filename, {}).get("inputs") != target["inputs"]
+            or not (self.output_dir / filename).exists()
+        ]
+
+        # Only merge the Markdown files the stale pages read; streaming
+        # builds keep only a digest of each page's inputs, so merge them all
+        if self.stream:
+            md_files = set(self.schema.sources)
+        else:
+            md_files = {name[3:] for filename in stale for name in targets[filename]["inputs"]
+                        if name.startswith("md:")}
+        content = data
+        if self.warm is not None and md_files & set(self.schema.sources):
+            # Merge into a copy; the warm content stays as content.json has it
+            content = copy.deepcopy(data)
+        with self.profiler.stage("markdown"):
+            try:
+                for md_name in self.schema.sources:
+                    if md_name in md_files:
+                        self.merge_md_file(md_name, content)
+            except SchemaError as e:
+                print(f"❌ Build failed: Markdown doesn't match {self.schema_file}:")
+                for problem in e.problems:
+                    print(f"   - {problem}")
+                return False
+
+        # Generate the stale pages
+        tasks = [(filename, *targets[filename]["task"]) for filename in stale]
+        if self.stream:
+            # Each page is written as soon as it is rendered, so memory holds
+            # a bounded batch of pages however many there are
+            with self.profiler.stage("render") as stage:
+                output_files, bundles = self.render_and_write(content, tasks, stage)
+            with self.profiler.stage("write"):
+                removed = self.remove_orphans(previous, targets)
+        else:
+            with self.profiler.stage("render") as stage:
+                rendered = self.render_all(content, tasks)
+                stage.bytes = sum(len(page_html) for _, page_html in rendered)
+
+            # Write pages to parent directory, skipping unchanged files
+            with self.profiler.stage("write"):
+                output_files = self.write_all(rendered)
+                removed = self.remove_orphans(previous, targets)
+            bundles = {filename: sorted(set(BUNDLE_REFERENCE.findall(page_html))) for filename, page_html in rendered}
+
+        # Index the papers for the research page search box
+        with self.profiler.stage("search"):
+            papers = content["research"]["papers"]
+            facets = {facet: {entry["value"]: entry["ids"] for entry in entries}
+                      for facet, entries in data["research"]["facets"].items()}
+            # A long-lived builder knows the index is current while neither
+            # the content nor the index has changed since it built it
+            def index_key():
+                return self.content_key and [
+                    self.content_key, file_stamp(self.search.cache_file), file_stamp(self.search.index_file)]
+
+            if self.warm_get("search", index_key()):
+                search_files = None
+            else:
+                search_files = self.search.build(papers, self.paper_page_url, facets)
+                self.warm_put("search", index_key(), True)
+
+        # Record the CSS and JS bundles each page links, and prune unused ones
+        for filename in targets:
+            if filename not in bundles:
+                bundles[filename] = previous.get(filename, {}).get("bundles", [])
+        linked = {bundle for page_bundles in bundles.values() for bundle in page_bundles}
+        self.css.prune(linked)
+        self.js.prune(linked)
+
+        # Precache the nav pages and the shell they load, as finally written
+        precached = None
+        if self.service_worker:
+            with self.profiler.stage("service_worker") as stage:
+                precached = self.offline.generate([f"{page}.html" for page in self.schema.nav_links])
+                stage.bytes = precached[1]
+        else:
+            self.offline.remove()
+
+        with self.profiler.stage("manifest"):
+            self.markdown.save()
+            self.schema.save()
+            if self.store:
+                store_changes = self.store.changes_since(built_revision)
+                self.store.set_meta("built", str(self.store.revision))
+                self.store.commit()
+            self.save_manifest({
+                filename: {"inputs": target["inputs"], "bundles": bundles[filename]}
+                for filename, target in targets.items()
+            }, previous)
+
+        # Compress text assets last, once every output file is final
+        if self.precompress:
+            with self.profiler.stage("precompress") as stage:
+                totals = self.compressor.run()
+                stage.bytes = sum(original for original, _ in totals.values())
+            for suffix, (original, compressed) in sorted(totals.items()):
+                print(f"🗜️  Compressed {original / 1024:.1f} KB of changed text assets to "
+                      f"{compressed / 1024:.1f} KB ({suffix})")
+            if not brotli:
+                print("💡 Install the brotli package to also write .br files")
+
+        # Check every page's links and budgets; only pages written since the last check are parsed
+        if self.validate:
+            with self.profiler.stage("validate"):
+                valid = validate(self.output_dir, self.cache_dir, self.budgets, self.jobs if self.jobs > 1 else None)
+            if not valid:
+                print("❌ Build failed: the generated pages have broken references or exceed their budgets")
+                return False
+
         print(f"✅ Multi-page website built successfully!")
-        print(f"📁 Generated pages: {', '.join([str(f) for f in output_files])}")
-        print(f"🌐 Test locally: python -m http.server 8000")
+        if self.incremental:
+            skipped = len(targets) - len(stale)
+            print(f"♻️  Regenerated {len(stale)} page(s), {skipped} unchanged since last build")
+        if self.store:
+            labels = {"documents": "document(s)", "papers": "paper(s)", "markdown": "Markdown file(s)"}
+            changed = ', '.join(f"{len(store_changes[kind])} {label}" for kind, label in labels.items()
+                                if store_changes[kind])
+            removed_rows = f", {len(store_changes['removed'])} removed" if store_changes["removed"] else ""
+            print(f"🗄️  Content store at revision {self.store.revision}: "
+                  f"{changed or 'nothing'} changed{removed_rows} since the last build")
+        if output_files:
+            shown = ', '.join([str(f) for f in output_files[:10]])
+            more = f" and {len(output_files) - 10} more" if len(output_files) > 10 else ""
+            print(f"📁 Written pages: {shown}{more}")
+        else:
+            print("📁 No page output changed")
+        if self.minifier.savings:
+            pages, original, minified = self.minifier.totals()
+            largest = ', '.join(f"{filename} -{page['saved_bytes'] / 1024:.1f} KB"
+                                for filename, page in list(self.minifier.report().items())[:3])
+            print(f"🪶 Minified {pages} page(s) from {original / 1024:.1f} KB to {minified / 1024:.1f} KB "
+                  f"(-{(original - minified) / max(original, 1) * 100:.1f}%); most saved: {largest}")
+        if removed:
+            print(f"🗑️  Removed stale pages: {', '.join([str(f) for f in removed])}")
+        if search_files is not None:
+            print(f"🔎 Search index: {len(papers)} papers in {search_files} files under {self.search.search_dir}")
+        if precached is not None:
+            print(f"📴 Service worker {self.offline.sw_file} precaches {precached[0]} files "
+                  f"({precached[1] / 1024:.1f} KB)")
+        print(f"🌐 Test locally: python local_test.py")
+        return True
+
+    def report_profile(self, json_file=None):
+        """Print the stage timing table and save it as JSON."""
+        self.profiler.extra["jobs"] = self.jobs
+        self.profiler.extra.pop("html_minify", None)
+        if self.minifier.savings:
+            self.profiler.extra["html_minify"] = self.minifier.report()
+        report = self.profiler.report()
+        json_file = Path(json_file) if json_file else self.profile_file
+        self.profiler.save(json_file, report)
+        print(f"⏱️  Build profile (saved to {json_file}):")
+        print(format_table(report))
+        return report
+
+
+# Per-process state for parallel rendering, set once by the pool initializer
+_worker_builder = None
+_worker_content = None
+
+
+def _init_render_worker(builder, content):
+    global _worker_builder, _worker_content
+    _worker_builder = builder
+    _worker_content = content
+    # The pickled profiler carries the parent's records; start afresh
+    builder.profiler.drain()
+
+
+def _render_in_worker(task):
+    result = _worker_builder.render_task(_worker_content, task)
+    return result, _worker_builder.profiler.drain()
+
+
+def parse_budget(value):
+    """Parse a NAME=VALUE page budget, e.g. requests=30."""
+    name, _, amount = value.partition("=")
+    if name not in DEFAULT_BUDGETS:
+        raise argparse.ArgumentTypeError(f"unknown budget '{name}'; expected one of {', '.join(DEFAULT_BUDGETS)}")
+    try:
+        return name, int(amount)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected NAME=INTEGER, got '{value}'") from None
+
+
+def make_parser():
+    parser = argparse.ArgumentParser(description="Build the website from JSON and Markdown content.")
+    parser.add_argument("--source-dir", default=".", metavar="PATH",
+                        help="the dev/ tree to build from (default: the current directory)")
+    parser.add_argument("--output-dir", metavar="PATH",
+                        help="where to generate the site (default: docs/ next to the source tree)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="only regenerate pages whose inputs changed since the last build")
+    parser.add_argument("--jobs", "-j", type=int, default=1,
+                        help="render and write pages across N worker processes (default: 1)")
+    parser.add_argument("--strict-media", action="store_true",
+                        help="fail the build when a referenced video or image file is missing")
+    parser.add_argument("--fingerprint", action="store_true",
+                        help="link content-hashed copies of CSS/JS/images listed in asset-manifest.json")
+    parser.add_argument("--bundle-css", action="store_true",
+                        help="inline per-page critical CSS and load a pruned, minified bundle asynchronously")
+    parser.add_argument("--bundle-js", action="store_true",
+                        help="link one tree-shaken, minified script bundle per page instead of the module graph")
+    parser.add_argument("--precompress", action="store_true",
+                        help="write .gz (and .br, with the brotli package) siblings of every text asset")
+    parser.add_argument("--profile", action="store_true",
+                        help="print per-stage timings and sizes and save them as JSON")
+    parser.add_argument("--profile-json", metavar="PATH",
+                        help="where --profile saves its JSON report (default: .build-cache/profile.json)")
+    parser.add_argument("--cprofile", metavar="PATH",
+                        help="also record a cProfile of the build process to PATH (pstats format)")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="also trace allocations with tracemalloc and report the peak and top sites")
+    parser.add_argument("--validate", action="store_true",
+                        help="check every page for broken references and size/request budgets; fail if any")
+    parser.add_argument("--budget", type=parse_budget, action="append", default=[], metavar="NAME=VALUE",
+                        help="override a --validate page budget: "
+                             + ", ".join(f"{name} (default {value})" for name, value in DEFAULT_BUDGETS.items()))
+    content_mode = parser.add_mutually_exclusive_group()
+    content_mode.add_argument("--stream", action="store_true",
+                              help="read papers from content.json incrementally and write pages as they render, "
+                                   "keeping memory flat for very large catalogues")
+    content_mode.add_argument("--store", action="store_true",
+                              help="import content.json and Markdown into .build-cache/content.db and build from "
+                                   "its indexed tables")
+    parser.add_argument("--service-worker", action="store_true",
+                        help="register a generated sw.js that precaches the nav pages and their CSS/JS/fonts")
+    parser.add_argument("--minify-html", action="store_true",
+                        help="strip comments and insignificant whitespace from pages as they are written, "
+                             "reporting the bytes saved per page")
+    return parser
+
+
+def builder_options(args):
+    """WebsiteBuilder keyword arguments for parsed command-line arguments."""
+    return dict(
+        incremental=args.incremental,
+        jobs=args.jobs,
+        strict_media=args.strict_media,
+        fingerprint=args.fingerprint,
+        bundle_css=args.bundle_css,
+        bundle_js=args.bundle_js,
+        precompress=args.precompress,
+        profile=args.profile or bool(args.profile_json) or args.trace_memory,
+        validate=args.validate or bool(args.budget),
+        budgets=dict(args.budget),
+        stream=args.stream,
+        store=args.store,
+        source_dir=args.source_dir,
+        output_dir=args.output_dir,
+        service_worker=args.service_worker,
+        minify_html=args.minify_html
+    )
+
+
+def run(builder, args):
+    """Build once with the profiling the arguments ask for; return whether the build succeeded."""
+    profile = builder.profiler.enabled
+    builder.profiler.extra.pop("memory", None)
+    if args.trace_memory:
+        tracemalloc.start()
+    profiler = cProfile.Profile() if args.cprofile else None
+    if profiler:
+        profiler.enable()
+    success = builder.build()
+    if profiler:
+        profiler.disable()
+        profiler.dump_stats(args.cprofile)
+        print(f"🧮 cProfile saved to {args.cprofile}; top functions by cumulative time:")
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(15)
+    if args.trace_memory:
+        builder.profiler.extra["memory"] = memory_report()
+        tracemalloc.stop()
+    if profile:
+        builder.report_profile(args.profile_json)
+    return success
+
+
+def main():
+    args = make_parser().parse_args()
+    if not run(WebsiteBuilder(**builder_options(args)), args):
+        exit(1)
+
 
 if __name__ == "__main__":
-    builder = WebsiteBuilder()
-    builder.build()
\ No newline at end of file
+    main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Precompressed gzip and Brotli siblings for the website builder.
+
+Every text asset in the output tree gets a .gz (and, when the brotli module is
+installed, a .br) file next to it, so a static server can send the smallest
+encoding a browser accepts without compressing on each request. Compression
+runs in a thread pool (zlib and brotli release the GIL) and is skipped for
+files whose content hash matches the last run.
+"""
+import gzip
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+TEXT_SUFFIXES = {".html", ".css", ".js", ".json", ".map", ".svg", ".xml", ".txt"}
+ENCODINGS = {".gz": "gzip", ".br": "br"}
+
+
+def compress(data, suffix):
+    """Compress bytes for an encoding suffix, deterministically."""
+    if suffix == ".gz":
+        return gzip.compress(data, compresslevel=9, mtime=0)
+    return brotli.compress(data, quality=11)
+
+
+class Precompressor:
+    """Keeps .gz/.br siblings of the output tree's text files up to date."""
+
+    def __init__(self, output_dir, cache_dir, jobs=None):
+        self.output_dir = Path(output_dir)
+        self.cache_file = Path(cache_dir) / "compress.json"
+        self.jobs = jobs or os.cpu_count() or 1
+        self.suffixes = [".gz", ".br"] if brotli else [".gz"]
+        self.cache = {}
+
+    def load_cache(self):
+        try:
+            with open(self.cache_file, 'r') as f:
+                self.cache = json.load(f)
+        except (OSError, ValueError):
+            self.cache = {}
+
+    def save_cache(self):
+        self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.cache_file, 'w') as f:
+            json.dump(self.cache, f, indent=2, sort_keys=True)
+
+    def collect(self):
+        """Find every compressible file, as site-relative POSIX paths."""
+        files = []
+        for dirpath, _, filenames in os.walk(self.output_dir):
+            for filename in filenames:
+                if os.path.splitext(filename)[1] in TEXT_SUFFIXES:
+                    path = Path(dirpath) / filename
+                    files.append(path.relative_to(self.output_dir).as_posix())
+        return sorted(files)
+
+    def process(self, path):
+        """Write the compressed siblings of one file; return (path, hash, sizes)."""
+        source = self.output_dir / path
+        data = source.read_bytes()
+        digest = hashlib.sha256(data).hexdigest()
+        sizes = {}
+        fresh = self.cache.get(path) == digest
+        for suffix in self.suffixes:
+            variant = source.with_name(source.name + suffix)
+            if fresh and variant.exists():
+                continue
+            compressed = compress(data, suffix)
+            # Servers fall back to the original when no smaller variant exists
+            if len(compressed) >= len(data):
+                if variant.exists():
+                    variant.unlink()
+                continue
+            with open(variant, 'wb') as f:
+                f.write(compressed)
+            sizes[suffix] = (len(data), len(compressed))
+        return path, digest, sizes
+
+    def prune(self, sources):
+        """Delete compressed files whose original no longer exists."""
+        removed = 0
+        for dirpath, _, filenames in os.walk(self.output_dir):
+            for filename in filenames:
+                stem, suffix = os.path.splitext(filename)
+                if suffix in ENCODINGS and os.path.splitext(stem)[1] in TEXT_SUFFIXES:
+                    path = Path(dirpath) / filename
+                    if path.with_name(stem).relative_to(self.output_dir).as_posix() not in sources:
+                        path.unlink()
+                        removed += 1
+        return removed
+
+    def run(self):
+        """Compress new and changed files; return {suffix: (original, compressed)} byte totals."""
+        self.load_cache()
+        sources = self.collect()
+        totals = {}
+        with ThreadPoolExecutor(max_workers=self.jobs) as pool:
+            results = list(pool.map(self.process, sources))
+        self.cache = {}
+        for path, digest, sizes in results:
+            self.cache[path] = digest
+            for suffix, (original, compressed) in sizes.items():
+                before, after = totals.get(suffix, (0, 0))
+                totals[suffix] = (before + original, after + compressed)
+        self.prune(set(sources))
+        self.save_cache()
+        return totals
@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""
+CSS bundling, minification and critical-CSS inlining for the website builder.
+
+The stylesheets linked from the page header are resolved through their
+@import graph, each file included once, and parsed into a minified rule tree.
+For every page, rules whose selectors can't match the page's markup are
+pruned. The rules used by the markup above the fold are inlined in <head>, and
+the page's pruned stylesheet is loaded without blocking rendering. Pruned
+stylesheets are named by content hash under styles/bundles/, so pages with
+the same markup vocabulary (e.g. every paper page) share one file.
+"""
+import hashlib
+import os
+import posixpath
+import re
+from pathlib import Path
+
+from assets import CSS_REFERENCE, is_local_reference, split_url
+
+BUNDLE_DIR = "styles/bundles"
+# Markup after <body> treated as above the fold when picking critical rules
+CRITICAL_MARKUP_CHARS = 6000
+# Classes added at runtime by docs/scripts are found by scanning for these
+JS_CLASS_CALL = re.compile(r'''classList\.(?:add|toggle|replace)\(\s*['"]([\w-]+)['"]''')
+
+STRING = re.compile(r'''("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')''')
+COMMENT = re.compile(r'/\*.*?\*/', re.DOTALL)
+IMPORT = re.compile(r'''@import\s+(?:url\(\s*)?['"]?([^'")\s;]+)['"]?\s*\)?[^;]*;''')
+STYLESHEET_LINK = re.compile(r'''[ \t]*<link rel="stylesheet" href="([^"]*styles/[^"]+\.css)">\n?''')
+HTML_TAG = re.compile(r'<([a-zA-Z][a-zA-Z0-9-]*)(\s[^>]*)?>')
+HTML_ATTR = re.compile(r'''([a-zA-Z_:][-a-zA-Z0-9_:.]*)(?:\s*=\s*("[^"]*"|'[^']*'|[^\s>]+))?''')
+SELECTOR_PSEUDO = re.compile(r'::?[a-zA-Z-]+(?:\([^)]*\))?')
+SELECTOR_TOKEN = re.compile(r'([#.][\w-]+)|\[([\w-]+)[^\]]*\]|(?:^|(?<=[\s>+~]))([a-zA-Z][\w-]*)')
+# Block at-rules whose children are ordinary rules that can be pruned
+NESTED_AT_RULES = ("@media", "@supports", "@layer", "@container")
+
+
+def split_strings(text):
+    """Split text into alternating (outside, string literal) parts."""
+    return STRING.split(text)
+
+
+def rebase_urls(css, from_dir, to_dir):
+    """Rewrite relative url()s in css written in from_dir to resolve from to_dir."""
+    def rebase(match):
+        path, suffix = split_url(match.group(2))
+        if not match.group(1).startswith("url") or not path or not is_local_reference(path):
+            return match.group(0)
+        target = posixpath.normpath(posixpath.join(from_dir, path))
+        return match.group(1) + posixpath.relpath(target, to_dir or ".") + suffix
+    return CSS_REFERENCE.sub(rebase, css)
+
+
+def minify_text(text):
+    """Collapse whitespace outside string literals and trim it around punctuation."""
+    parts = split_strings(text)
+    for i in range(0, len(parts), 2):
+        part = re.sub(r'\s+', ' ', parts[i])
+        parts[i] = re.sub(r'\s*([{};,>])\s*', r'\1', part)
+    return ''.join(parts).strip()
+
+
+def minify_declarations(body):
+    """Minify a declaration block, without its braces."""
+    parts = split_strings(body)
+    for i in range(0, len(parts), 2):
+        part = re.sub(r'\s+', ' ', parts[i])
+        part = re.sub(r'\s*([;,])\s*', r'\1', part)
+        parts[i] = re.sub(r'^\s*([-\w]+)\s*:\s*|;\s*([-\w]+)\s*:\s*',
+                          lambda m: f"{m.group(1)}:" if m.group(1) else f";{m.group(2)}:", part)
+    return ''.join(parts).strip().rstrip(';')
+
+
+def selector_requirements(selector):
+    """Return the set of tokens each alternative of a selector list needs.
+
+    Tokens are ".class", "#id", "[attribute]" and lowercase tag names. An
+    alternative matches a page when every token appears somewhere in it; this
+    ignores combinators and pseudo-classes, so it never prunes a used rule.
+    """
+    alternatives = []
+    depth = 0
+    current = []
+    for char in selector:
+        if char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        if char == ',' and depth == 0:
+            alternatives.append(''.join(current))
+            current = []
+        else:
+            current.append(char)
+    alternatives.append(''.join(current))
+
+    requirements = []
+    for alternative in alternatives:
+        stripped = SELECTOR_PSEUDO.sub('', alternative).strip()
+        tokens = set()
+        for cls_or_id, attribute, tag in SELECTOR_TOKEN.findall(stripped):
+            if cls_or_id:
+                tokens.add(cls_or_id)
+            elif attribute:
+                tokens.add(f"[{attribute}]")
+            elif tag:
+                tokens.add(tag.lower())
+        requirements.append(frozenset(tokens))
+    return requirements
+
+
+def markup_tokens(html):
+    """Collect the tag, class, id and attribute tokens used by some markup."""
+    tokens = set()
+    for match in HTML_TAG.finditer(html):
+        tokens.add(match.group(1).lower())
+        for name, value in HTML_ATTR.findall(match.group(2) or ''):
+            name = name.lower()
+            tokens.add(f"[{name}]")
+            value = value.strip('"\'')
+            if name == "class":
+                tokens.update(f".{cls}" for cls in value.split())
+            elif name == "id":
+                tokens.add(f"#{value}")
+    return tokens
+
+
+class CSSBundler:
+    """Builds per-page pruned stylesheets and critical CSS."""
+
+    def __init__(self, output_dir, script_dir="scripts"):
+        self.output_dir = Path(output_dir)
+        self.script_dir = script_dir
+        self.rules = None
+        self.runtime_tokens = set()
+        self.source_hash = ""
+
+    def resolve(self, entries):
+        """Concatenate entry stylesheets through their @import graph, once each."""
+        seen = set()
+        out = []
+
+        def include(path):
+            if path in seen:
+                return
+            seen.add(path)
+            text = COMMENT.sub('', (self.output_dir / path).read_text(encoding='utf-8'))
+            # The bundle lives in BUNDLE_DIR, not next to this file
+            source_dir = posixpath.dirname(path)
+            last = 0
+            for match in IMPORT.finditer(text):
+                out.append(rebase_urls(text[last:match.start()], source_dir, BUNDLE_DIR))
+                include(posixpath.normpath(posixpath.join(source_dir, match.group(1))))
+                last = match.end()
+            out.append(rebase_urls(text[last:], source_dir, BUNDLE_DIR))
+
+        for entry in entries:
+            include(entry)
+        return '\n'.join(out)
+
+    def parse(self, text, i=0):
+        """Parse CSS into a list of nodes, returning (nodes, end index).
+
+        Nodes are ("rule", requirements, css), ("block", prelude, children)
+        for prunable at-rules, and ("raw", None, css) for everything else.
+        """
+        nodes = []
+        length = len(text)
+        while i < length:
+            while i < length and text[i].isspace():
+                i += 1
+            if i >= length:
+                break
+            if text[i] == '}':
+                return nodes, i + 1
+
+            start = i
+            while i < length and text[i] not in '{;':
+                if text[i] in '"\'':
+                    i = STRING.match(text, i).end()
+                else:
+                    i += 1
+            prelude = text[start:i].strip()
+            if i >= length or text[i] == ';':
+                if prelude:
+                    nodes.append(("raw", None, minify_text(prelude) + ";"))
+                i += 1
+                continue
+
+            i += 1
+            if prelude.startswith(NESTED_AT_RULES):
+                children, i = self.parse(text, i)
+                nodes.append(("block", minify_text(prelude), children))
+                continue
+
+            body_start = i
+            depth = 1
+            while i < length and depth:
+                if text[i] in '"\'':
+                    i = STRING.match(text, i).end()
+                    continue
+                if text[i] == '{':
+                    depth += 1
+                elif text[i] == '}':
+                    depth -= 1
+                i += 1
+            body = text[body_start:i - 1]
+            if prelude.startswith('@'):
+                nodes.append(("raw", None, minify_text(f"{prelude}{{{body}}}")))
+            else:
+                selector = minify_text(prelude)
+                nodes.append(("rule", selector_requirements(selector),
+                              f"{selector}{{{minify_declarations(body)}}}"))
+        return nodes, i
+
+    def load(self, entries):
+        """Read and parse the entry stylesheets and the runtime class safelist."""
+        text = self.resolve(entries)
+        self.source_hash = hashlib.sha256(text.encode('utf-8')).hexdigest()
+        self.rules, _ = self.parse(text)
+        self.runtime_tokens = set()
+        for path in sorted((self.output_dir / self.script_dir).rglob("*.js")):
+            self.runtime_tokens.update(f".{cls}" for cls in JS_CLASS_CALL.findall(path.read_text(encoding='utf-8')))
+
+    def render(self, nodes, tokens):
+        """Serialise the nodes that can match a page with the given tokens."""
+        out = []
+        for kind, data, css in nodes:
+            if kind == "rule":
+                if any(requirement <= tokens for requirement in data):
+                    out.append(css)
+            elif kind == "block":
+                inner = self.render(css, tokens)
+                if inner:
+                    out.append(f"{data}{{{inner}}}")
+            else:
+                out.append(css)
+        return ''.join(out)
+
+    def write_bundle(self, css):
+        """Write a pruned stylesheet under its content hash; return its path."""
+        name = hashlib.sha256(css.encode('utf-8')).hexdigest()[:16]
+        path = f"{BUNDLE_DIR}/{name}.css"
+        bundle_file = self.output_dir / path
+        if not bundle_file.exists():
+            bundle_file.parent.mkdir(parents=True, exist_ok=True)
+            # Parallel workers may write the same bundle; replace atomically
+            temp_file = bundle_file.with_name(f".{name}.{os.getpid()}.tmp")
+            temp_file.write_text(css, encoding='utf-8')
+            os.replace(temp_file, bundle_file)
+        return path
+
+    def rewrite_html(self, filename, html):
+        """Replace a page's stylesheet links with critical CSS and an async bundle."""
+        links = list(STYLESHEET_LINK.finditer(html))
+        if not links or self.rules is None:
+            return html
+
+        body = html.find("<body")
+        page_tokens = markup_tokens(html[body:]) | self.runtime_tokens | {"html", "body"}
+        fold_tokens = markup_tokens(html[body:body + CRITICAL_MARKUP_CHARS]) | self.runtime_tokens | {"html", "body"}
+        # The rules were rebased for BUNDLE_DIR; inline ones resolve from the page
+        critical = rebase_urls(self.render(self.rules, fold_tokens), BUNDLE_DIR, posixpath.dirname(filename))
+        bundle = posixpath.relpath(self.write_bundle(self.render(self.rules, page_tokens)),
+                                   posixpath.dirname(filename) or ".")
+
+        indent = re.match(r'[ \t]*', links[0].group(0)).group(0)
+        replacement = (
+            f'{indent}<style>{critical}</style>\n'
+            f'{indent}<link rel="preload" href="{bundle}" as="style" onload="this.onload=null;this.rel=\'stylesheet\'">\n'
+            f'{indent}<noscript><link rel="stylesheet" href="{bundle}"></noscript>\n'
+        )
+        return html[:links[0].start()] + replacement + html[links[-1].end():]
+
+    def prune(self, keep):
+        """Delete bundles not in keep (a set of site-relative paths)."""
+        bundle_dir = self.output_dir / BUNDLE_DIR
+        if not bundle_dir.exists():
+            return
+        for path in bundle_dir.iterdir():
+            if f"{BUNDLE_DIR}/{path.name}" not in keep:
+                path.unlink()
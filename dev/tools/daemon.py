@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+"""
+Long-lived build server for the website builder.
+
+Every `python tools/build.py` pays for interpreter start-up, imports and
+cold caches before it builds anything. `python tools/daemon.py start` keeps
+one builder process running for a dev/ tree instead. It takes build
+requests over a Unix socket in .build-cache/ and keeps a warm WebsiteBuilder
+per set of build options: the loaded content.json, the page targets and
+their input hashes, the page manifest, parsed Markdown and fingerprinted
+assets are reused for as long as their files are unchanged, so repeated
+builds from scripts and editors return in milliseconds.
+
+Requests are built one at a time, with the same arguments as build.py,
+relative to the dev/ tree. build_site() builds through the daemon when one
+is running and in a fresh build.py process otherwise; local_test.py,
+deploy.py and benchmark.py all build through it. The daemon exits after
+IDLE_TIMEOUT seconds without a request, on `stop`, and as soon as the
+builder's own source changes, so it never builds with stale code.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import traceback
+from pathlib import Path
+
+TOOLS_DIR = Path(__file__).resolve().parent
+SOCKET_NAME = "build.sock"
+LOG_NAME = "daemon.log"
+IDLE_TIMEOUT = 30 * 60
+# Option sets kept warm at once; each holds the site's content
+MAX_BUILDERS = 4
+START_TIMEOUT = 10
+
+
+def cache_dir(source_dir):
+    return Path(source_dir).resolve() / ".build-cache"
+
+
+def send(conn, message):
+    conn.sendall(json.dumps(message, ensure_ascii=False).encode('utf-8') + b'\n')
+
+
+class ClientStream(io.TextIOBase):
+    """A text stream that forwards what the build prints to the client as it happens."""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.closed_by_client = False
+
+    def writable(self):
+        return True
+
+    def write(self, text):
+        if text and not self.closed_by_client:
+            try:
+                send(self.conn, {"output": text})
+            except OSError:
+                # The client went away; finish the build regardless
+                self.closed_by_client = True
+        return len(text)
+
+
+class BuildServer:
+    """Serves build requests for one source tree from warm builders."""
+
+    def __init__(self, source_dir, idle_timeout=IDLE_TIMEOUT):
+        self.source_dir = Path(source_dir).resolve()
+        self.socket_file = cache_dir(self.source_dir) / SOCKET_NAME
+        self.idle_timeout = idle_timeout
+        self.builders = {}         # option key -> WebsiteBuilder, least recently used first
+        self.builds = 0
+        self.started = time.time()
+        self.code_hash = None
+
+    def serve(self):
+        """Accept requests until stopped, idle or out of date."""
+        # Only the server imports the builder; clients stay quick to start
+        global build
+        import build
+
+        # Builders use the same relative paths, and so the same cache keys,
+        # as build.py run from the dev/ tree
+        os.chdir(self.source_dir)
+        self.code_hash = build.tools_hash()
+        if request(self.source_dir, {"command": "status"}) is not None:
+            print(f"Error: a build daemon is already serving {self.source_dir}")
+            return False
+        self.socket_file.parent.mkdir(parents=True, exist_ok=True)
+        self.socket_file.unlink(missing_ok=True)
+
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            server.bind(str(self.socket_file))
+            os.chmod(self.socket_file, 0o600)
+            server.listen()
+            server.settimeout(self.idle_timeout)
+            print(f"🛰️  Build daemon {os.getpid()} serving {self.source_dir} on {self.socket_file}", flush=True)
+            while True:
+                try:
+                    conn, _ = server.accept()
+                except socket.timeout:
+                    print(f"💤 No builds for {self.idle_timeout}s; stopping", flush=True)
+                    break
+                with conn:
+                    conn.settimeout(None)
+                    if not self.handle(conn):
+                        break
+        finally:
+            server.close()
+            self.socket_file.unlink(missing_ok=True)
+        return True
+
+    def handle(self, conn):
+        """Answer one request; return False when the server should stop."""
+        try:
+            line = conn.makefile('rb').readline()
+            message = json.loads(line)
+        except (OSError, ValueError):
+            return True
+        command = message.get("command", "build")
+        if command == "stop":
+            send(conn, {"success": True})
+            return False
+        if command == "status":
+            send(conn, {"success": True, "status": {
+                "pid": os.getpid(), "source_dir": str(self.source_dir), "builds": self.builds,
+                "uptime_seconds": round(time.time() - self.started, 1), "warm_builders": len(self.builders)}})
+            return True
+        if build.tools_hash() != self.code_hash:
+            print("♻️  Builder source changed; stopping", flush=True)
+            send(conn, {"restart": True})
+            return False
+
+        started = time.perf_counter()
+        stream = ClientStream(conn)
+        with contextlib.redirect_stdout(stream), contextlib.redirect_stderr(stream):
+            success = self.build(message.get("args", []))
+        self.builds += 1
+        seconds = time.perf_counter() - started
+        print(f"🔨 Build {self.builds} {'succeeded' if success else 'failed'} in {seconds * 1000:.0f} ms: "
+              f"{' '.join(message.get('args', []))}", flush=True)
+        with contextlib.suppress(OSError):
+            send(conn, {"success": success, "seconds": round(seconds, 4)})
+        return True
+
+    def build(self, argv):
+        """Build once with build.py arguments, on the warm builder for their options."""
+        try:
+            args = build.make_parser().parse_args(argv)
+        except SystemExit:
+            # argparse has printed the problem
+            return False
+        if Path(args.source_dir).resolve() != self.source_dir:
+            print(f"Error: this daemon builds {self.source_dir}, not {args.source_dir}")
+            return False
+        args.source_dir = "."
+
+        options = build.builder_options(args)
+        key = json.dumps(options, sort_keys=True)
+        builder = self.builders.pop(key, None) or build.WebsiteBuilder(**options, keep_warm=True)
+        self.builders[key] = builder
+        while len(self.builders) > MAX_BUILDERS:
+            del self.builders[next(iter(self.builders))]
+        try:
+            return build.run(builder, args)
+        except Exception:
+            # Start the next build of these options from scratch
+            self.builders.pop(key, None)
+            traceback.print_exc()
+            return False
+
+
+def request(source_dir, message, on_output=None):
+    """Send one request to the daemon for source_dir.
+
+    Output the build prints is passed to on_output as it arrives. Returns
+    the daemon's final reply, or None when no daemon is running (or it
+    stopped without answering).
+    """
+    if not hasattr(socket, "AF_UNIX"):
+        return None
+    socket_file = cache_dir(source_dir) / SOCKET_NAME
+    if not socket_file.exists():
+        return None
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    with client:
+        try:
+            client.connect(str(socket_file))
+            send(client, message)
+            for line in client.makefile('rb'):
+                reply = json.loads(line)
+                if "output" not in reply:
+                    return reply
+                if on_output:
+                    on_output(reply["output"])
+        except (OSError, ValueError):
+            return None
+    return None
+
+
+def build_site(args=(), source_dir=".", echo=False):
+    """Build the site in source_dir with build.py arguments.
+
+    Uses the build daemon when one is running for source_dir, otherwise a
+    fresh build.py process. Returns (success, output); with echo, output is
+    also printed as the build runs.
+    """
+    chunks = []
+
+    def on_output(text):
+        chunks.append(text)
+        if echo:
+            sys.stdout.write(text)
+            sys.stdout.flush()
+
+    reply = request(source_dir, {"args": list(args)}, on_output)
+    if reply is not None and "success" in reply:
+        return reply["success"], ''.join(chunks)
+    if reply is not None:
+        on_output("♻️  The builder's source changed, so the build daemon stopped; "
+                  "building in a fresh process\n")
+
+    process = subprocess.Popen([sys.executable, str(TOOLS_DIR / "build.py"), *args], cwd=source_dir,
+                               stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, encoding='utf-8')
+    with process.stdout:
+        for line in process.stdout:
+            on_output(line)
+    return process.wait() == 0, ''.join(chunks)
+
+
+def start(source_dir, idle_timeout=IDLE_TIMEOUT):
+    """Start a daemon for source_dir in the background; return its pid, or None if it didn't come up."""
+    log_file = cache_dir(source_dir) / LOG_NAME
+    log_file.parent.mkdir(parents=True, exist_ok=True)
+    with open(log_file, 'a') as log:
+        process = subprocess.Popen(
+            [sys.executable, str(Path(__file__).resolve()), "--source-dir", str(Path(source_dir).resolve()),
+             "serve", "--idle-timeout", str(idle_timeout)],
+            stdin=subprocess.DEVNULL, stdout=log, stderr=subprocess.STDOUT, start_new_session=True)
+    deadline = time.monotonic() + START_TIMEOUT
+    while time.monotonic() < deadline and process.poll() is None:
+        reply = request(source_dir, {"command": "status"})
+        if reply is not None:
+            return reply["status"]["pid"]
+        time.sleep(0.05)
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Keep a warm website builder running and build through it.")
+    parser.add_argument("--source-dir", default=".", metavar="PATH",
+                        help="the dev/ tree the daemon builds (default: the current directory)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    for name in ("start", "serve"):
+        command = commands.add_parser(name, help="start the daemon in the background" if name == "start"
+                                      else "run the daemon in the foreground")
+        command.add_argument("--idle-timeout", type=int, default=IDLE_TIMEOUT, metavar="SECONDS",
+                             help=f"stop after this long without a build (default: {IDLE_TIMEOUT})")
+    commands.add_parser("stop", help="stop the running daemon")
+    commands.add_parser("status", help="show whether a daemon is running")
+    commands.add_parser("build", help="build through the daemon, or in a fresh process without one; "
+                                      "takes build.py's arguments")
+    args, build_args = parser.parse_known_args()
+    if build_args and args.command != "build":
+        parser.error(f"unrecognized arguments: {' '.join(build_args)}")
+
+    if args.command in ("start", "serve") and not hasattr(socket, "AF_UNIX"):
+        print("Error: the build daemon needs Unix domain sockets, which this platform lacks")
+        return False
+    if args.command == "serve":
+        return BuildServer(args.source_dir, args.idle_timeout).serve()
+    if args.command == "start":
+        reply = request(args.source_dir, {"command": "status"})
+        if reply is not None:
+            print(f"🛰️  Build daemon already running (pid {reply['status']['pid']})")
+            return True
+        pid = start(args.source_dir, args.idle_timeout)
+        if pid is None:
+            print(f"Error: the build daemon didn't start; see {cache_dir(args.source_dir) / LOG_NAME}")
+            return False
+        print(f"🛰️  Build daemon started (pid {pid}); build with: python tools/daemon.py build [options]")
+        return True
+    if args.command == "stop":
+        if request(args.source_dir, {"command": "stop"}) is None:
+            print("💤 No build daemon running")
+        else:
+            print("🛑 Build daemon stopped")
+        return True
+    if args.command == "status":
+        reply = request(args.source_dir, {"command": "status"})
+        if reply is None:
+            print("💤 No build daemon running")
+        else:
+            status = reply["status"]
+            print(f"🛰️  Build daemon {status['pid']} serving {status['source_dir']}: {status['builds']} build(s) "
+                  f"in {status['uptime_seconds']:.0f}s, {status['warm_builders']} warm builder(s)")
+        return True
+
+    success, _ = build_site(build_args, args.source_dir, echo=True)
+    return success
+
+
+if __name__ == "__main__":
+    if not main():
+        exit(1)
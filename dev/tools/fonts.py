@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Self-hosted, subset web fonts for the website builder.
+
+Font files placed in src/fonts/ (e.g. the DM Sans and Outfit TTFs from
+Google Fonts, static or variable) are subset to the characters the site's
+content, templates and scripts use, and written to assets/fonts/ as
+content-hashed WOFF2 files (WOFF without the brotli module). Pages then get
+@font-face rules with font-display: swap and preloads of the faces the
+first screen uses, in place of the render-blocking Google Fonts stylesheet.
+Subsetting needs fontTools; without it, or without source fonts, pages keep
+the Google Fonts stylesheet. Subsets are cached by source font and
+character set, so unchanged fonts are never re-subset.
+"""
+import hashlib
+import io
+import json
+import re
+from pathlib import Path
+
+try:
+    from fontTools import subset as font_subset
+    from fontTools.ttLib import TTFont
+except ImportError:
+    font_subset = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+FONTS_CACHE_VERSION = 1
+FONT_DIR = "assets/fonts"
+SOURCE_SUFFIXES = {".ttf", ".otf", ".woff", ".woff2"}
+# Always kept, for text typed into the search box or added at runtime
+BASE_CHARS = frozenset(chr(c) for c in range(0x20, 0x7f)) | frozenset("–—‘’“”…•·→←©")
+# Per family, the first weight with a face is preloaded: body text, then headings
+PRELOAD_WEIGHTS = (400, 600)
+
+
+def slugify(text):
+    return re.sub(r'[^a-z0-9]+', '-', text.lower()).strip('-')
+
+
+class FontPipeline:
+    """Subsets the fonts in a source directory and describes their @font-face rules."""
+
+    def __init__(self, output_dir, source_dir, cache_dir):
+        self.output_dir = Path(output_dir)
+        self.source_dir = Path(source_dir)
+        self.font_dir = self.output_dir / FONT_DIR
+        self.cache_file = Path(cache_dir) / "fonts.json"
+        self.flavor = "woff2" if brotli else "woff"
+        self.faces = []
+        self.hash = None
+
+    def sources(self):
+        if not self.source_dir.is_dir():
+            return []
+        return sorted(p for p in self.source_dir.iterdir() if p.suffix.lower() in SOURCE_SUFFIXES)
+
+    def prepare(self, text):
+        """Subset every source font to the characters of text.
+
+        Leaves self.faces empty when there is nothing to self-host.
+        """
+        self.faces = []
+        self.hash = None
+        sources = self.sources()
+        if not sources:
+            self.prune(set())
+            return
+        if font_subset is None:
+            print(f"💡 Install the fonttools package to self-host the fonts in {self.source_dir}")
+            return
+
+        chars = ''.join(sorted(set(text) | BASE_CHARS))
+        try:
+            with open(self.cache_file, 'r') as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            cache = {}
+        if cache.get("version") != FONTS_CACHE_VERSION:
+            cache = {}
+        fonts = cache.get("fonts", {})
+
+        for source in sources:
+            key = hashlib.sha256(b'\0'.join([
+                self.flavor.encode('ascii'), chars.encode('utf-8'), source.read_bytes()])).hexdigest()
+            face = fonts.get(source.name)
+            if not (face and face["key"] == key and (self.font_dir / face["file"]).exists()):
+                face = fonts[source.name] = self.subset(source, chars, key)
+            self.faces.append(face)
+
+        # Drop subsets of removed fonts and of earlier character sets
+        keep = {face["file"] for face in self.faces}
+        self.prune(keep)
+        self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.cache_file, 'w') as f:
+            json.dump({"version": FONTS_CACHE_VERSION,
+                       "fonts": {name: face for name, face in fonts.items() if face["file"] in keep}}, f, indent=2)
+        self.hash = hashlib.sha256(json.dumps(self.faces, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def prune(self, keep):
+        """Remove generated subsets not in keep."""
+        if self.font_dir.is_dir():
+            for path in self.font_dir.iterdir():
+                if path.name not in keep:
+                    path.unlink()
+
+    def subset(self, source, chars, key):
+        """Write the subset of one font; return its face description."""
+        font = TTFont(source)
+        names = font["name"]
+        family = str(names.getDebugName(16) or names.getDebugName(1))
+        if "fvar" in font:
+            axis = next((a for a in font["fvar"].axes if a.axisTag == "wght"), None)
+            weight = f"{axis.minValue:g} {axis.maxValue:g}" if axis else "400"
+        else:
+            weight = str(font["OS/2"].usWeightClass)
+        style = "italic" if font["OS/2"].fsSelection & 1 else "normal"
+
+        options = font_subset.Options()
+        options.flavor = self.flavor
+        options.layout_features = ["*"]
+        # FontForge's timestamp table, which fontTools can't subset
+        options.drop_tables += ["FFTM"]
+        subsetter = font_subset.Subsetter(options)
+        subsetter.populate(text=chars)
+        subsetter.subset(font)
+        buffer = io.BytesIO()
+        font_subset.save_font(font, buffer, options)
+        data = buffer.getvalue()
+
+        italic = "-italic" if style == "italic" else ""
+        name = f"{slugify(family)}-{weight.replace(' ', '-')}{italic}.{hashlib.sha256(data).hexdigest()[:10]}.{self.flavor}"
+        self.font_dir.mkdir(parents=True, exist_ok=True)
+        with open(self.font_dir / name, 'wb') as f:
+            f.write(data)
+        print(f"🔤 Subset {source.name} to {len(chars)} characters: {len(data) / 1024:.1f} KB")
+        return {"key": key, "file": name, "family": family, "weight": weight, "style": style}
+
+    def face_css(self, base=""):
+        """@font-face rules for the self-hosted faces, relative to base."""
+        return ''.join(
+            f"@font-face{{font-family:'{face['family']}';font-style:{face['style']};font-weight:{face['weight']};"
+            f"font-display:swap;src:url({base}{FONT_DIR}/{face['file']}) format('{self.flavor}')}}"
+            for face in self.faces
+        )
+
+    def preloads(self, base=""):
+        """URLs of the faces to preload: per family, the regular text weight, else the heading weight."""
+        urls = []
+        for family in dict.fromkeys(face["family"] for face in self.faces):
+            faces = [face for face in self.faces if face["family"] == family and face["style"] == "normal"]
+            for weight in PRELOAD_WEIGHTS:
+                face = next((f for f in faces if covers(f["weight"], weight)), None)
+                if face:
+                    urls.append(f"{base}{FONT_DIR}/{face['file']}")
+                    break
+        return urls
+
+
+def covers(weight_range, weight):
+    """Whether a CSS font-weight value such as "400" or "100 900" includes weight."""
+    bounds = [float(value) for value in weight_range.split()]
+    return bounds[0] <= weight <= bounds[-1]
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Loading hints for the website builder's rendered pages.
+
+A post-processing pass over each page's HTML:
+- images after the first get loading="lazy" and decoding="async"; the
+  first, the likely largest contentful paint, is fetched with high priority;
+- videos that would autoplay are deferred: no autoplay, preload="none" and
+  data-lazy-video, so scripts/modules/lazy-video.js plays them once visible;
+- the Google Fonts stylesheet no longer blocks rendering or, when fonts.py
+  self-hosts subset fonts, is replaced by inline @font-face rules and
+  preloads of the faces the first screen uses;
+- pages prefetch their likely next navigation: the next listing page, or
+  the next entry of the nav bar.
+"""
+import posixpath
+import re
+
+# Images up to this count are assumed to be above the fold
+ABOVE_FOLD_IMAGES = 1
+
+IMG_TAG = re.compile(r'<img\b[^>]*>')
+VIDEO_TAG = re.compile(r'<video\b[^>]*>')
+AUTOPLAY = re.compile(r'\s+autoplay(?:=(?:"[^"]*"|\S+))?(?=[\s>/])')
+PRELOAD_ATTR = re.compile(r'\s+preload="[^"]*"')
+GOOGLE_FONTS_LINK = re.compile(r'''([ \t]*)<link href="(https://fonts\.googleapis\.com/[^"]+)" rel="stylesheet">\n?''')
+FONT_PRECONNECT = re.compile(r'''[ \t]*<link rel="preconnect" href="https://fonts\.(?:googleapis|gstatic)\.com"[^>]*>\n?''')
+NAV_LINKS = re.compile(r'<ul class="nav-links">(.*?)</ul>', re.DOTALL)
+NAV_LINK = re.compile(r'<a href="([^"]*)"([^>]*)>')
+NEXT_PAGE = re.compile(r'<a href="([^"]*)" class="pagination-next"')
+
+
+def has_attr(tag, name):
+    return re.search(rf'\s{name}(?=[\s=>/])', tag) is not None
+
+
+def add_attrs(tag, attrs):
+    """Add attributes the tag doesn't already have."""
+    extra = ''.join(f' {name}="{value}"' for name, value in attrs if not has_attr(tag, name))
+    end = len(tag) - 2 if tag.endswith('/>') else len(tag) - 1
+    return tag[:end].rstrip() + extra + tag[end:]
+
+
+def head_insert(html, markup):
+    """Insert lines of markup at the end of <head>, indented like its other children."""
+    head_end = html.find("</head>")
+    if head_end < 0 or not markup:
+        return html
+    line_start = html.rfind("\n", 0, head_end) + 1
+    indent = re.match(r'[ \t]*', html[line_start:head_end]).group(0) + "    "
+    return html[:line_start] + ''.join(f"{indent}{line}\n" for line in markup) + html[line_start:]
+
+
+class LoadingHints:
+    """Rewrites pages to load their images, videos, fonts and next page well."""
+
+    def __init__(self, fonts=None):
+        # A fonts.FontPipeline; self-hosting is used once it has faces
+        self.fonts = fonts
+
+    def lazy_images(self, html):
+        body = max(html.find("<body"), 0)
+        count = 0
+
+        def rewrite(match):
+            nonlocal count
+            count += 1
+            if count <= ABOVE_FOLD_IMAGES:
+                return add_attrs(match.group(0), [("fetchpriority", "high")])
+            return add_attrs(match.group(0), [("loading", "lazy"), ("decoding", "async")])
+
+        return html[:body] + IMG_TAG.sub(rewrite, html[body:])
+
+    def defer_videos(self, html):
+        def rewrite(match):
+            tag = match.group(0)
+            if has_attr(tag, "data-lazy-video"):
+                return tag
+            tag = PRELOAD_ATTR.sub('', AUTOPLAY.sub('', tag))
+            return add_attrs(tag, [("preload", "none"), ("data-lazy-video", "")]).replace('data-lazy-video=""', 'data-lazy-video')
+
+        return VIDEO_TAG.sub(rewrite, html)
+
+    def load_fonts(self, filename, html):
+        match = GOOGLE_FONTS_LINK.search(html)
+        if not match:
+            return html
+        indent, href = match.groups()
+        if self.fonts and self.fonts.faces:
+            base = "../" * filename.count("/")
+            html = html[:match.start()] + html[match.end():]
+            html = FONT_PRECONNECT.sub('', html)
+            font_type = f"font/{self.fonts.flavor}"
+            return head_insert(html, [
+                *(f'<link rel="preload" href="{url}" as="font" type="{font_type}" crossorigin>'
+                  for url in self.fonts.preloads(base)),
+                f'<style>{self.fonts.face_css(base)}</style>',
+            ])
+        # Still from Google, but without holding up the first paint
+        replacement = (
+            f'{indent}<link rel="preload" href="{href}" as="style" onload="this.onload=null;this.rel=\'stylesheet\'">\n'
+            f'{indent}<noscript><link rel="stylesheet" href="{href}"></noscript>\n'
+        )
+        return html[:match.start()] + replacement + html[match.end():]
+
+    def next_navigation(self, filename, html):
+        """The page a visitor most likely opens next, as a URL relative to this page."""
+        match = NEXT_PAGE.search(html)
+        if match:
+            return match.group(1)
+        nav = NAV_LINKS.search(html)
+        if not nav:
+            return None
+        links = NAV_LINK.findall(nav.group(1))
+        for i, (href, attrs) in enumerate(links[:-1]):
+            # Only the nav page itself, not pages that merely highlight it
+            if 'class="active"' in attrs and posixpath.normpath(
+                    posixpath.join(posixpath.dirname(filename), href)) == filename:
+                return links[i + 1][0]
+        return None
+
+    def rewrite_html(self, filename, html):
+        """Apply every loading hint to one rendered page."""
+        html = self.load_fonts(filename, self.defer_videos(self.lazy_images(html)))
+        next_url = self.next_navigation(filename, html)
+        if next_url:
+            html = head_insert(html, [f'<link rel="prefetch" href="{next_url}">'])
+        return html
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+HTML minification for the website builder's pages.
+
+One regex pass over each page's tags and text, with no DOM tree:
+- comments are dropped (conditional comments are kept);
+- whitespace runs in text collapse to one space, and disappear next to
+  block-level tags, where browsers never render them. Inline tags keep
+  one space around them, so words never run together;
+- tags lose the whitespace between attributes, repeated attributes (browsers
+  use the first) and repeated class names, and boolean attributes written
+  as hidden="" or hidden="hidden" become plain hidden;
+- <pre>, <textarea>, <script> and <style> content is copied untouched.
+Collapsing the template indentation also makes the repeated service and
+paper card wrappers byte-identical, which the .gz/.br siblings compress to
+back-references.
+"""
+import re
+from functools import lru_cache
+
+TOKEN = re.compile(r'''
+    (?P<comment><!--.*?-->)
+    | (?P<raw_open><(?P<raw_name>pre|textarea|script|style)\b[^>]*>)(?P<raw_body>.*?)(?P<raw_close></(?P=raw_name)\s*>)
+    | (?P<tag></?!?[a-zA-Z][^>]*>)
+    | (?P<text>[^<]+|<)
+''', re.DOTALL | re.IGNORECASE | re.VERBOSE)
+TAG_NAME = re.compile(r'</?!?([a-zA-Z][\w:-]*)')
+START_TAG = re.compile(
+    r'''<([a-zA-Z][\w:-]*)((?:\s+[^\s"'>/=]+(?:\s*=\s*(?:"[^"]*"|'[^']*'|[^\s"'=<>`]+))?)*)\s*(/?)>''')
+END_TAG = re.compile(r'</([a-zA-Z][\w:-]*)\s*>')
+ATTRIBUTE = re.compile(r'''([^\s"'>/=]+)(?:\s*=\s*("[^"]*"|'[^']*'|[^\s"'=<>`]+))?''')
+WHITESPACE = re.compile(r'\s+')
+# Template markup repeats the same tags on every page and card
+TAG_CACHE_SIZE = 4096
+
+# Whitespace around these renders as a space; around any other tag it doesn't
+INLINE_TAGS = {
+    "a", "abbr", "audio", "b", "bdi", "bdo", "button", "canvas", "cite", "code", "data", "del", "dfn", "em",
+    "i", "iframe", "img", "input", "ins", "kbd", "label", "mark", "math", "meter", "object", "output",
+    "picture", "progress", "q", "ruby", "s", "samp", "select", "small", "span", "strong", "sub", "sup",
+    "svg", "textarea", "time", "u", "var", "video", "wbr",
+}
+BOOLEAN_ATTRIBUTES = {
+    "allowfullscreen", "async", "autofocus", "autoplay", "checked", "controls", "default", "defer",
+    "disabled", "formnovalidate", "hidden", "inert", "ismap", "loop", "multiple", "muted", "nomodule",
+    "novalidate", "open", "playsinline", "readonly", "required", "reversed", "selected",
+}
+
+
+@lru_cache(maxsize=TAG_CACHE_SIZE)
+def minify_tag(tag):
+    """Return (minified tag, whether it is block-level) for one start or end tag.
+
+    Tags this can't parse are returned as they are.
+    """
+    block = TAG_NAME.match(tag).group(1).lower() not in INLINE_TAGS
+    match = END_TAG.fullmatch(tag)
+    if match:
+        return f"</{match.group(1)}>", block
+    match = START_TAG.fullmatch(tag)
+    if not match:
+        return tag, block
+    parts = [match.group(1)]
+    seen = set()
+    for name, value in ATTRIBUTE.findall(match.group(2)):
+        key = name.lower()
+        if key in seen:
+            continue
+        seen.add(key)
+        unquoted = value[1:-1] if value[:1] in ('"', "'") else value
+        if key in BOOLEAN_ATTRIBUTES and unquoted.lower() in ("", key):
+            parts.append(name)
+        elif key == "class" and value:
+            quote = value[0] if value[0] in ('"', "'") else '"'
+            parts.append(f"{name}={quote}{' '.join(dict.fromkeys(unquoted.split()))}{quote}")
+        else:
+            parts.append(f"{name}={value}" if value else name)
+    if not match.group(3):
+        return f"<{' '.join(parts)}>", block
+    # An unquoted value would take the slash in as part of it
+    last = parts[-1]
+    space = " " if len(parts) > 1 and "=" in last and last[-1] not in ('"', "'") else ""
+    return f"<{' '.join(parts)}{space}/>", block
+
+
+def minify_html(html):
+    """Return html minified."""
+    out = []
+    # Whitespace here would follow a block-level tag (or start the page)
+    trim = True
+    for match in TOKEN.finditer(html):
+        kind = match.lastgroup
+        if kind == "text":
+            text = match.group()
+            text = " " if text.isspace() else WHITESPACE.sub(" ", text)
+            if text[0] == " " and (trim or (out and out[-1].endswith(" "))):
+                text = text[1:]
+            if text:
+                out.append(text)
+                trim = False
+        elif kind == "comment":
+            comment = match.group()
+            if comment.startswith("<!--[if") or comment.endswith("<![endif]-->"):
+                out.append(comment)
+        else:
+            raw = kind == "raw_close"
+            tag, block = minify_tag(match.group("raw_open") if raw else match.group())
+            if block and out and out[-1].endswith(" "):
+                out[-1] = out[-1][:-1]
+            out.append(tag)
+            if raw:
+                out.append(match.group("raw_body") + minify_tag(match.group("raw_close"))[0])
+            trim = block
+    return ''.join(out)
+
+
+class HTMLMinifier:
+    """Minifies pages as they are written and tallies the bytes saved per page."""
+
+    def __init__(self):
+        self.savings = {}          # filename -> (original bytes, minified bytes)
+
+    def reset(self):
+        self.savings = {}
+
+    def minify(self, filename, html):
+        minified = minify_html(html)
+        self.savings[filename] = (len(html.encode('utf-8')), len(minified.encode('utf-8')))
+        return minified
+
+    def totals(self):
+        """Return (pages, original bytes, minified bytes) for the pages minified since the last reset."""
+        return (len(self.savings), sum(original for original, _ in self.savings.values()),
+                sum(minified for _, minified in self.savings.values()))
+
+    def report(self):
+        """Per-page savings, largest first, for the profile report."""
+        return {filename: {"bytes": original, "minified_bytes": minified, "saved_bytes": original - minified}
+                for filename, (original, minified) in sorted(
+                    self.savings.items(), key=lambda item: item[1][1] - item[1][0])}
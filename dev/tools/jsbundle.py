@@ -0,0 +1,402 @@
+#!/usr/bin/env python3
+"""
+ES module bundling and minification for the website builder.
+
+The static import graph of scripts/main.js is resolved and each module is
+inlined once, dependencies first, into a single minified script with a
+source map, so a page makes one request instead of a chain of imports. Per
+page, modules whose DOM queries can't match the page's markup (e.g. the stat
+counters on pages without .stat-number) are left out together with the
+statements that construct them. Bundles are named by content hash under
+scripts/bundles/ and announced early with a modulepreload hint.
+"""
+import bisect
+import hashlib
+import json
+import os
+import posixpath
+import re
+from pathlib import Path
+
+from cssbundle import markup_tokens, selector_requirements
+
+BUNDLE_DIR = "scripts/bundles"
+ENTRY = "scripts/main.js"
+
+IMPORT = re.compile(
+    r'''^[ \t]*import\s+(?:\{([^}]*)\}\s*from\s*)?(['"])([^'"]+)\2[ \t]*;?''', re.MULTILINE)
+UNSUPPORTED_IMPORT = re.compile(r'''^[ \t]*import\b(?!\s*(?:\{[^}]*\}\s*from\s*)?['"])''', re.MULTILINE)
+EXPORT = re.compile(r'^([ \t]*)export\s+(?=(?:async\s+)?(?:class|function|const|let|var)\b)', re.MULTILINE)
+UNSUPPORTED_EXPORT = re.compile(r'^[ \t]*export\s+(?!(?:async\s+)?(?:class|function|const|let|var)\b)', re.MULTILINE)
+DECLARATION = re.compile(r'^(?:async\s+)?(?:class|function\*?|const|let|var)\s+([\w$]+)', re.MULTILINE)
+DOM_QUERY = re.compile(r'''querySelector(?:All)?\(\s*(['"])((?:(?!\1).)+)\1\s*\)''')
+SCRIPT_TAG = re.compile(r'''<script type="module" src="([^"]*)''' + re.escape(ENTRY) + r'''"></script>''')
+
+CODE_TOKEN = re.compile(r'\s+|[\w$]+|.', re.DOTALL)
+# A "/" after one of these starts a regular expression, not a division
+REGEX_PREFIX = set('(,=:[!&|?{};+-*%<>~^')
+REGEX_KEYWORDS = {"return", "typeof", "case", "do", "else", "in", "of", "void",
+                  "yield", "await", "delete", "throw", "new", "instanceof"}
+VLQ_CHARS = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/"
+
+
+def is_word_char(char):
+    return char.isalnum() or char in "_$"
+
+
+def split_source(source):
+    """Split JavaScript into ("code" | "literal" | "comment", start, end) parts.
+
+    Literals are strings, template literals and regular expressions; they are
+    copied to the output untouched.
+    """
+    parts = []
+    length = len(source)
+    start = i = 0
+    last_word = ""
+    last_char = ""
+    while i < length:
+        char = source[i]
+        kind = None
+        if char in "\"'`":
+            j = i + 1
+            while j < length and source[j] != char:
+                j += 2 if source[j] == "\\" else 1
+            kind, end = "literal", j + 1
+        elif source.startswith("//", i):
+            end = source.find("\n", i)
+            kind, end = "comment", length if end == -1 else end
+        elif source.startswith("/*", i):
+            kind, end = "comment", source.index("*/", i + 2) + 2
+        elif char == "/" and (last_char in REGEX_PREFIX or last_char == "" or last_word in REGEX_KEYWORDS):
+            j = i + 1
+            in_class = False
+            while j < length and (in_class or source[j] != "/"):
+                if source[j] == "\\":
+                    j += 1
+                elif source[j] == "[":
+                    in_class = True
+                elif source[j] == "]":
+                    in_class = False
+                j += 1
+            j += 1
+            while j < length and source[j].isalpha():
+                j += 1
+            kind, end = "literal", j
+        else:
+            if not char.isspace():
+                if is_word_char(char):
+                    last_word = last_word + char if i and is_word_char(source[i - 1]) else char
+                else:
+                    last_word = ""
+                last_char = char
+            i += 1
+            continue
+
+        if start < i:
+            parts.append(("code", start, i))
+        parts.append((kind, i, end))
+        if kind == "literal":
+            last_char, last_word = "a", ""
+        start = i = end
+    if start < length:
+        parts.append(("code", start, length))
+    return parts
+
+
+def needs_space(before, after):
+    """Whether whitespace between two characters is significant."""
+    if is_word_char(before) and is_word_char(after):
+        return True
+    # Keep "a + +b" and "a - -b" apart
+    return before == after and before in "+-"
+
+
+def vlq(value):
+    """Encode one integer as a base64 VLQ, as used in source maps."""
+    value = (-value << 1) | 1 if value < 0 else value << 1
+    out = []
+    while True:
+        digit = value & 31
+        value >>= 5
+        out.append(VLQ_CHARS[digit | (32 if value else 0)])
+        if not value:
+            return ''.join(out)
+
+
+class Module:
+    """One ES module of the script graph."""
+
+    def __init__(self, path, source):
+        self.path = path
+        self.source = source
+        self.imports = []          # (site-relative path, [(imported, local), ...])
+        self.selectors = []        # literal querySelector(All) arguments
+        self.declarations = []     # top-level names
+        self.body = source
+
+
+class JSBundler:
+    """Builds per-page tree-shaken script bundles and their source maps."""
+
+    def __init__(self, output_dir, entry=ENTRY):
+        self.output_dir = Path(output_dir)
+        self.entry = entry
+        self.modules = {}
+        self.order = []
+        self.source_hash = ""
+        self.bundles = {}
+
+    def read_module(self, path):
+        source = (self.output_dir / path).read_text(encoding='utf-8')
+        module = Module(path, source)
+
+        for pattern in (UNSUPPORTED_IMPORT, UNSUPPORTED_EXPORT):
+            match = pattern.search(source)
+            if match:
+                line = source.count("\n", 0, match.start()) + 1
+                raise ValueError(f"{path}:{line}: unsupported module syntax for bundling")
+
+        def strip_import(match):
+            specifier = match.group(3)
+            if not specifier.startswith("."):
+                raise ValueError(f"{path}: bare import '{specifier}' can't be bundled")
+            bindings = []
+            for name in (match.group(1) or "").split(","):
+                name = name.strip()
+                if name:
+                    imported, _, local = name.partition(" as ")
+                    bindings.append((imported.strip(), (local or imported).strip()))
+            target = posixpath.normpath(posixpath.join(posixpath.dirname(path), specifier))
+            module.imports.append((target, bindings))
+            # Keep line numbers stable for the source map
+            return "\n" * match.group(0).count("\n")
+
+        body = IMPORT.sub(strip_import, source)
+        module.body = EXPORT.sub(r'\1', body)
+        module.declarations = DECLARATION.findall(module.body)
+        module.selectors = [match.group(2) for match in DOM_QUERY.finditer(source)]
+        return module
+
+    def load(self):
+        """Read the module graph reachable from the entry script."""
+        self.modules = {}
+        self.order = []
+        self.bundles = {}
+
+        def visit(path, stack):
+            if path in stack:
+                raise ValueError(f"Circular import: {' -> '.join(stack + (path,))}")
+            if path in self.modules:
+                return
+            module = self.read_module(path)
+            self.modules[path] = module
+            for target, _ in module.imports:
+                visit(target, stack + (path,))
+            self.order.append(path)
+
+        visit(self.entry, ())
+
+        owners = {}
+        for path in self.order:
+            for name in self.modules[path].declarations:
+                if name in owners:
+                    raise ValueError(f"'{name}' is declared in both {owners[name]} and {path}; "
+                                     "bundled modules share one scope")
+                owners[name] = path
+        self.source_hash = hashlib.sha256(json.dumps(
+            [[path, self.modules[path].source] for path in self.order]).encode('utf-8')).hexdigest()
+
+    def module_matches(self, module, tokens):
+        """Whether a module's DOM queries can find anything in a page."""
+        if not module.selectors:
+            return True
+        return any(requirement <= tokens
+                   for selector in module.selectors
+                   for requirement in selector_requirements(selector))
+
+    def shake(self, tokens):
+        """Return {path: body} for the modules a page needs, in bundle order."""
+        dropped = {path for path, module in self.modules.items()
+                   if path != self.entry and not self.module_matches(module, tokens)}
+        while True:
+            bodies = {}
+            for path in self.order:
+                if path in dropped:
+                    continue
+                body = self.modules[path].body
+                for target, bindings in self.modules[path].imports:
+                    if target in dropped:
+                        for _, local in bindings:
+                            # Statements that only construct the dropped export
+                            body = re.sub(rf'^[ \t]*new\s+{re.escape(local)}\s*\([^()]*\)\s*;?[ \t]*$',
+                                          '', body, flags=re.MULTILINE)
+                bodies[path] = body
+
+            # Keep dropped modules that are still referenced some other way
+            needed = set()
+            for path, body in bodies.items():
+                for target, bindings in self.modules[path].imports:
+                    if target in dropped and any(re.search(rf'(?<![\w$.]){re.escape(local)}(?![\w$])', body)
+                                                 for _, local in bindings):
+                        needed.add(target)
+            if not needed:
+                break
+            dropped -= needed
+
+        # Modules only imported by dropped modules aren't needed either
+        reachable = set()
+
+        def reach(path):
+            if path in reachable or path in dropped:
+                return
+            reachable.add(path)
+            for target, _ in self.modules[path].imports:
+                reach(target)
+
+        reach(self.entry)
+        return {path: body for path, body in bodies.items() if path in reachable}
+
+    def minify(self, source_index, body, out, mappings):
+        """Append minified code to out, recording a mapping per source line.
+
+        Line breaks are kept wherever automatic semicolon insertion could
+        depend on them, so the minified code parses the same way.
+        """
+        line_starts = [0] + [match.end() for match in re.finditer("\n", body)]
+        pending_space = False
+        pending_newline = False
+        mapped_line = -1
+
+        def emit(text, offset):
+            nonlocal pending_space, pending_newline, mapped_line
+            last = out[-1][-1] if out and out[-1] else "\n"
+            if pending_newline and last != "\n" and last not in "{;," and text[0] != "}":
+                out.append("\n")
+                last = "\n"
+            elif pending_space and needs_space(last, text[0]):
+                out.append(" ")
+            pending_space = pending_newline = False
+
+            line = bisect.bisect_right(line_starts, offset) - 1
+            if line != mapped_line:
+                mapped_line = line
+                mappings.append((source_index, line, offset - line_starts[line], len(out)))
+            out.append(text)
+
+        for kind, start, end in split_source(body):
+            if kind == "comment":
+                pending_space = True
+                pending_newline = pending_newline or "\n" in body[start:end]
+            elif kind == "literal":
+                emit(body[start:end], start)
+            else:
+                for match in CODE_TOKEN.finditer(body, start, end):
+                    token = match.group(0)
+                    if token.isspace():
+                        pending_space = True
+                        pending_newline = pending_newline or "\n" in token
+                    else:
+                        emit(token, match.start())
+
+    def render(self, bodies):
+        """Minify and concatenate module bodies; return (code, source map)."""
+        out = []
+        mappings = []
+        sources = list(bodies)
+        for index, (path, body) in enumerate(bodies.items()):
+            if out:
+                out.append("\n")
+            # Renamed imports become aliases of the dependency's declaration
+            for target, bindings in self.modules[path].imports:
+                for imported, local in bindings:
+                    if imported != local and target in bodies:
+                        out.append(f"const {local}={imported};\n")
+            self.minify(index, body, out, mappings)
+        code = ''.join(out)
+
+        # Turn token positions in out into generated line/column segments
+        positions = {}
+        line = column = 0
+        for i, piece in enumerate(out):
+            positions[i] = (line, column)
+            newlines = piece.count("\n")
+            if newlines:
+                line += newlines
+                column = len(piece) - piece.rindex("\n") - 1
+            else:
+                column += len(piece)
+
+        lines = [[] for _ in range(line + 1)]
+        for source_index, source_line, source_column, piece in mappings:
+            generated_line, generated_column = positions[piece]
+            lines[generated_line].append((generated_column, source_index, source_line, source_column))
+
+        encoded = []
+        previous_source = previous_line = previous_column = 0
+        for segments in lines:
+            previous_generated = 0
+            parts = []
+            for generated_column, source_index, source_line, source_column in segments:
+                parts.append(vlq(generated_column - previous_generated) + vlq(source_index - previous_source)
+                             + vlq(source_line - previous_line) + vlq(source_column - previous_column))
+                previous_generated = generated_column
+                previous_source, previous_line, previous_column = source_index, source_line, source_column
+            encoded.append(','.join(parts))
+
+        source_map = {
+            "version": 3,
+            "sources": [posixpath.relpath(path, BUNDLE_DIR) for path in sources],
+            "names": [],
+            "mappings": ';'.join(encoded),
+        }
+        return code, source_map
+
+    def write_file(self, path, text):
+        output_file = self.output_dir / path
+        if output_file.exists():
+            return
+        output_file.parent.mkdir(parents=True, exist_ok=True)
+        # Parallel workers may write the same bundle; replace atomically
+        temp_file = output_file.with_name(f".{output_file.name}.{os.getpid()}.tmp")
+        temp_file.write_text(text, encoding='utf-8')
+        os.replace(temp_file, output_file)
+
+    def bundle(self, tokens):
+        """Write the bundle for a page's markup tokens; return its path."""
+        bodies = self.shake(tokens)
+        key = tuple(bodies)
+        if key not in self.bundles:
+            code, source_map = self.render(bodies)
+            name = hashlib.sha256(code.encode('utf-8')).hexdigest()[:16]
+            path = f"{BUNDLE_DIR}/{name}.js"
+            source_map["file"] = f"{name}.js"
+            self.write_file(path + ".map", json.dumps(source_map, separators=(',', ':')))
+            self.write_file(path, f"{code}\n//# sourceMappingURL={name}.js.map\n")
+            self.bundles[key] = path
+        return self.bundles[key]
+
+    def rewrite_html(self, filename, html):
+        """Point a page's module script at its bundle and preload it."""
+        match = SCRIPT_TAG.search(html)
+        if not match or not self.modules:
+            return html
+
+        body = html.find("<body")
+        bundle = posixpath.relpath(self.bundle(markup_tokens(html[body:])), posixpath.dirname(filename) or ".")
+        html = html[:match.start()] + f'<script type="module" src="{bundle}"></script>' + html[match.end():]
+
+        head_end = html.find("</head>")
+        line_start = html.rfind("\n", 0, head_end) + 1
+        indent = re.match(r'[ \t]*', html[line_start:head_end]).group(0) + "    "
+        return html[:line_start] + f'{indent}<link rel="modulepreload" href="{bundle}">\n' + html[line_start:]
+
+    def prune(self, keep):
+        """Delete bundles and source maps not in keep (site-relative paths)."""
+        bundle_dir = self.output_dir / BUNDLE_DIR
+        if not bundle_dir.exists():
+            return
+        for path in bundle_dir.iterdir():
+            bundle = f"{BUNDLE_DIR}/{path.name}"
+            if bundle not in keep and bundle.removesuffix(".map") not in keep:
+                path.unlink()
@@ -0,0 +1,350 @@
+#!/usr/bin/env python3
+"""
+Streaming Markdown rendering for the website builder.
+
+Files are read line by line and rendered straight to HTML blocks, split into
+sections at each top-level "# Heading" (the section names the builder looks
+up, such as "Page Title"). Deeper headings, paragraphs, nested lists, block
+quotes, fenced code, rules, links, images, emphasis and inline code are
+supported; text is HTML-escaped. Parsed documents are cached in .build-cache
+by size and mtime, then by content hash, so unchanged files are never
+re-read.
+"""
+import hashlib
+import html
+import json
+import os
+import re
+from pathlib import Path
+
+MARKDOWN_CACHE_VERSION = 1
+
+HEADING = re.compile(r'^(#{1,6})[ \t]+(.*?)[ \t]*#*[ \t]*$')
+FENCE = re.compile(r'^[ \t]{0,3}(`{3,}|~{3,})[ \t]*([\w+-]*)')
+RULE = re.compile(r'^[ \t]{0,3}([-*_])(?:[ \t]*\1){2,}[ \t]*$')
+LIST_ITEM = re.compile(r'^([ \t]*)([-*+]|\d{1,9}[.)])[ \t]+(.*)$')
+QUOTE = re.compile(r'^[ \t]{0,3}>[ \t]?(.*)$')
+
+CODE_SPAN = re.compile(r'(`+)(.+?)\1', re.DOTALL)
+ESCAPED = re.compile(r'\\([\\`*_{}\[\]()#+\-.!>])')
+IMAGE = re.compile(r'!\[([^\]]*)\]\(([^)\s]+)(?:\s+"(.*?)")?\)')
+LINK = re.compile(r'\[([^\]]+)\]\(([^)\s]+)(?:\s+"(.*?)")?\)')
+STRONG = re.compile(r'\*\*(?=\S)(.+?)(?<=\S)\*\*|(?<!\w)__(?=\S)(.+?)(?<=\S)__(?!\w)')
+EMPHASIS = re.compile(r'\*(?=\S)(.+?)(?<=\S)\*|(?<!\w)_(?=\S)(.+?)(?<=\S)_(?!\w)')
+PLACEHOLDER = re.compile('\x00(\\d+)\x00')
+SAFE_SCHEMES = ("http:", "https:", "mailto:", "tel:")
+
+
+def safe_url(url):
+    """Return url unless it uses a scheme such as javascript:."""
+    if re.match(r'^[a-zA-Z][a-zA-Z0-9+.-]*:', url) and not url.lower().startswith(SAFE_SCHEMES):
+        return "#"
+    return url
+
+
+def render_inline(text):
+    """Render inline Markdown (code, links, images, emphasis) to escaped HTML."""
+    stash = []
+    # NUL delimits stashed markup; in the source it becomes U+FFFD, as in CommonMark
+    text = text.replace("\x00", "\ufffd")
+
+    def keep(markup):
+        stash.append(markup)
+        return f"\x00{len(stash) - 1}\x00"
+
+    text = CODE_SPAN.sub(lambda m: keep(f"<code>{html.escape(m.group(2).strip(), quote=False)}</code>"), text)
+    text = ESCAPED.sub(lambda m: keep(html.escape(m.group(1))), text)
+    # Quotes stay literal in text; attribute values get them escaped below
+    text = html.escape(text, quote=False)
+
+    def attr(value):
+        return html.escape(value.replace("&amp;", "&").replace("&lt;", "<").replace("&gt;", ">"))
+
+    def image(match):
+        title = f' title="{attr(match.group(3))}"' if match.group(3) else ""
+        return keep(f'<img src="{attr(safe_url(match.group(2)))}" alt="{attr(match.group(1))}"{title} loading="lazy">')
+
+    def link(match):
+        title = f' title="{attr(match.group(3))}"' if match.group(3) else ""
+        return keep(f'<a href="{attr(safe_url(match.group(2)))}"{title}>{emphasize(match.group(1))}</a>')
+
+    def emphasize(value):
+        value = STRONG.sub(lambda m: f"<strong>{m.group(1) or m.group(2)}</strong>", value)
+        return EMPHASIS.sub(lambda m: f"<em>{m.group(1) or m.group(2)}</em>", value)
+
+    text = emphasize(LINK.sub(link, IMAGE.sub(image, text)))
+    # Stashed markup can nest (code inside link text), one level per pass;
+    # an entry only holds placeholders stashed before it
+    for _ in range(len(stash)):
+        if "\x00" not in text:
+            break
+        text = PLACEHOLDER.sub(lambda m: stash[int(m.group(1))], text)
+    return text
+
+
+class Section:
+    """One top-level section of a document: its raw text and rendered HTML."""
+
+    def __init__(self):
+        self.lines = []
+        self.blocks = []
+
+    @property
+    def text(self):
+        return '\n'.join(self.lines).strip()
+
+    def to_json(self):
+        return {"text": self.text, "html": ''.join(self.blocks)}
+
+
+class BlockRenderer:
+    """Turns Markdown lines into HTML blocks, one line at a time."""
+
+    def __init__(self):
+        self.sections = {"": Section()}
+        self.section = self.sections[""]
+        self.paragraph = []
+        self.quote = []
+        self.lists = []            # open lists: (indent, tag)
+        self.item = None           # text lines of the open list item
+        self.fence = None          # (marker, language, lines) inside fenced code
+        self.blank = False
+
+    def emit(self, markup):
+        self.section.blocks.append(markup)
+
+    def close_paragraph(self):
+        if self.paragraph:
+            self.emit(f"<p>{render_inline(chr(10).join(self.paragraph))}</p>")
+            self.paragraph = []
+
+    def close_quote(self):
+        if self.quote:
+            renderer = BlockRenderer()
+            for line in self.quote:
+                renderer.feed(line)
+            self.emit(f"<blockquote>{renderer.finish()['']['html']}</blockquote>")
+            self.quote = []
+
+    def close_item(self):
+        if self.item is not None:
+            self.emit(render_inline('\n'.join(self.item)))
+            self.item = None
+
+    def close_lists(self, indent=-1):
+        """Close list items and lists nested deeper than indent."""
+        self.close_item()
+        while self.lists and self.lists[-1][0] > indent:
+            _, tag = self.lists.pop()
+            self.emit(f"</li></{tag}>")
+
+    def open_list(self, indent, tag, marker):
+        start = marker[:-1]
+        attrs = f' start="{start}"' if tag == "ol" and start != "1" else ""
+        self.lists.append((indent, tag))
+        self.emit(f"<{tag}{attrs}>")
+
+    def close_blocks(self):
+        self.close_paragraph()
+        self.close_quote()
+        self.close_lists()
+
+    def feed(self, line):
+        """Render one line of Markdown (with or without its newline)."""
+        line = line.rstrip('\r\n')
+        self.section.lines.append(line)
+
+        if self.fence:
+            marker, language, lines = self.fence
+            if line.strip().startswith(marker) and not line.strip().strip(marker[0]):
+                css = f' class="language-{language}"' if language else ""
+                self.emit(f"<pre><code{css}>{html.escape(chr(10).join(lines), quote=False)}</code></pre>")
+                self.fence = None
+            else:
+                lines.append(line)
+            return
+
+        if not line.strip():
+            self.close_paragraph()
+            self.close_quote()
+            self.blank = True
+            return
+        after_blank, self.blank = self.blank, False
+
+        quote = QUOTE.match(line)
+        if quote:
+            self.close_paragraph()
+            self.close_lists()
+            self.quote.append(quote.group(1))
+            return
+        if self.quote and not after_blank:
+            # Lazy continuation of a quoted paragraph
+            self.quote.append(line)
+            return
+        self.close_quote()
+
+        heading = HEADING.match(line)
+        if heading:
+            self.close_blocks()
+            level = len(heading.group(1))
+            if level == 1:
+                # A new section; its heading line isn't part of its text
+                self.section.lines.pop()
+                self.section = self.sections[heading.group(2)] = Section()
+            else:
+                tag = f"h{min(level + 1, 6)}"
+                self.emit(f"<{tag}>{render_inline(heading.group(2))}</{tag}>")
+            return
+
+        fence = FENCE.match(line)
+        if fence:
+            self.close_blocks()
+            self.fence = (fence.group(1), fence.group(2), [])
+            return
+
+        if RULE.match(line):
+            self.close_blocks()
+            self.emit("<hr>")
+            return
+
+        item = LIST_ITEM.match(line)
+        if item:
+            self.close_paragraph()
+            indent = len(item.group(1).expandtabs(4))
+            tag = "ol" if item.group(2)[0].isdigit() else "ul"
+            if self.lists and indent > self.lists[-1][0]:
+                # A nested list inside the open item
+                self.close_item()
+                self.open_list(indent, tag, item.group(2))
+            else:
+                self.close_lists(indent)
+                top = self.lists[-1] if self.lists else None
+                if top == (indent, tag):
+                    self.emit("</li>")
+                else:
+                    if top and top[0] == indent:
+                        # Same level, other list type: end the old list
+                        self.close_lists(indent - 1)
+                    self.open_list(indent, tag, item.group(2))
+            self.emit("<li>")
+            self.item = [item.group(3).strip()]
+            return
+
+        if self.lists:
+            if not after_blank or line.startswith((" ", "\t")):
+                # Continuation of the open item's text
+                if self.item is None:
+                    self.item = []
+                self.item.append(line.strip())
+                return
+            self.close_lists()
+
+        self.paragraph.append(line.strip())
+
+    def finish(self):
+        """Close open blocks and return {section heading: {"text", "html"}}.
+
+        Text before the first "# " heading is in the "" section.
+        """
+        if self.fence:
+            self.feed(self.fence[0])
+        self.close_blocks()
+        return {heading: section.to_json() for heading, section in self.sections.items()}
+
+
+class MarkdownDocument:
+    """A parsed Markdown file, split into top-level sections."""
+
+    def __init__(self, sections):
+        self.sections = sections
+
+    def text(self, heading, default=""):
+        """Raw Markdown text of a section."""
+        section = self.sections.get(heading)
+        return section["text"] if section else default
+
+    def html(self, heading, default=""):
+        """Rendered block HTML of a section."""
+        section = self.sections.get(heading)
+        return section["html"] if section else default
+
+    def inline(self, heading, default=""):
+        """A short section (e.g. a title) rendered as inline HTML."""
+        section = self.sections.get(heading)
+        return render_inline(' '.join(section["text"].split('\n'))) if section else default
+
+    def document_html(self, exclude=()):
+        """The whole document as HTML, with top-level headings as <h2>.
+
+        Sections named in exclude (e.g. ones used as the page title) are left out.
+        """
+        parts = []
+        for heading, section in self.sections.items():
+            if heading in exclude:
+                continue
+            if heading:
+                parts.append(f"<h2>{render_inline(heading)}</h2>")
+            parts.append(section["html"])
+        return ''.join(parts)
+
+
+class MarkdownCache:
+    """Parses Markdown files once per content change."""
+
+    def __init__(self, cache_dir):
+        self.cache_file = Path(cache_dir) / "markdown.json"
+        self.files = None
+        self.changed = False
+
+    def load(self):
+        if self.files is not None:
+            return
+        try:
+            with open(self.cache_file, 'r') as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            cache = {}
+        self.files = cache.get("files", {}) if cache.get("version") == MARKDOWN_CACHE_VERSION else {}
+
+    def save(self):
+        """Persist parsed documents for the next build, if any changed."""
+        if not self.changed:
+            return
+        self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.cache_file, 'w') as f:
+            json.dump({"version": MARKDOWN_CACHE_VERSION, "files": self.files}, f, ensure_ascii=False)
+        self.changed = False
+
+    def entry(self, path):
+        """Return the cache entry for a file, parsing it if it changed."""
+        self.load()
+        stat = os.stat(path)
+        key = str(path)
+        entry = self.files.get(key)
+        if entry and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime_ns:
+            return entry
+
+        # Hash and render in the same pass over the file
+        digest = hashlib.sha256()
+        renderer = BlockRenderer()
+        with open(path, 'rb') as f:
+            for raw_line in f:
+                digest.update(raw_line)
+                renderer.feed(raw_line.decode('utf-8'))
+        digest = digest.hexdigest()
+        if entry and entry["hash"] == digest:
+            sections = entry["sections"]
+        else:
+            sections = renderer.finish()
+        entry = self.files[key] = {"size": stat.st_size, "mtime": stat.st_mtime_ns,
+                                   "hash": digest, "sections": sections}
+        self.changed = True
+        return entry
+
+    def hash(self, path):
+        """Content hash of a Markdown file."""
+        return self.entry(path)["hash"]
+
+    def document(self, path):
+        """The parsed MarkdownDocument for a file."""
+        return MarkdownDocument(self.entry(path)["sections"])
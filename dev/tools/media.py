@@ -0,0 +1,370 @@
+#!/usr/bin/env python3
+"""
+Build-time media processing for the website builder.
+
+Images referenced by content are decoded once, resized to a few widths and
+re-encoded as WebP/AVIF with a PNG fallback. Outputs are named after the
+source's content hash, so byte-identical sources share one set of variants,
+and a cache in .build-cache means unchanged images are never re-encoded.
+
+Videos are transcoded from dev/src/media/videos to size-capped web renditions
+with a poster frame, using a local ffmpeg when one is installed.
+
+Pillow and ffmpeg are optional. Without Pillow, images are served unresized
+but still get explicit width/height attributes, read from the file header.
+Without ffmpeg, source videos are copied as-is and the card image is used as
+the poster.
+"""
+import hashlib
+import json
+import os
+import shutil
+import struct
+import subprocess
+from pathlib import Path
+
+try:
+    from PIL import Image, features
+except ImportError:
+    Image = None
+    features = None
+
+IMAGE_WIDTHS = (400, 800, 1200)
+IMAGE_FORMATS = ("avif", "webp")
+IMAGE_QUALITY = {"avif": 55, "webp": 80}
+IMAGE_MIME_TYPES = {"avif": "image/avif", "webp": "image/webp"}
+IMAGE_CACHE_VERSION = 1
+
+# Web renditions are capped at this width and bitrate, and have no audio
+VIDEO_MAX_WIDTH = 1280
+VIDEO_MAX_BITRATE = "1500k"
+VIDEO_EXTENSIONS = (".mp4", ".mov", ".m4v", ".webm", ".mkv")
+VIDEO_CACHE_VERSION = 1
+
+
+def read_image_size(path):
+    """Read (width, height) from a PNG, JPEG, GIF or WebP header, or None."""
+    with open(path, 'rb') as f:
+        head = f.read(32)
+        if head[:8] == b'\x89PNG\r\n\x1a\n':
+            return struct.unpack('>II', head[16:24])
+        if head[:6] in (b'GIF87a', b'GIF89a'):
+            return struct.unpack('<HH', head[6:10])
+        if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+            if head[12:16] == b'VP8X':
+                width = int.from_bytes(head[24:27], 'little') + 1
+                height = int.from_bytes(head[27:30], 'little') + 1
+                return width, height
+            if head[12:16] == b'VP8 ':
+                f.seek(26)
+                width, height = struct.unpack('<HH', f.read(4))
+                return width & 0x3fff, height & 0x3fff
+            if head[12:16] == b'VP8L':
+                bits = int.from_bytes(head[21:25], 'little')
+                return (bits & 0x3fff) + 1, ((bits >> 14) & 0x3fff) + 1
+        if head[:2] == b'\xff\xd8':
+            f.seek(2)
+            while True:
+                marker = f.read(2)
+                if len(marker) < 2 or marker[0] != 0xff:
+                    return None
+                length = struct.unpack('>H', f.read(2))[0]
+                if marker[1] in (0xc0, 0xc1, 0xc2, 0xc3, 0xc5, 0xc6, 0xc7, 0xc9, 0xca, 0xcb, 0xcd, 0xce, 0xcf):
+                    height, width = struct.unpack('>xHH', f.read(5))
+                    return width, height
+                f.seek(length - 2, os.SEEK_CUR)
+    return None
+
+
+class SourceHasher:
+    """Hashes source files, reusing digests while size and mtime are unchanged."""
+
+    def __init__(self, entries=None):
+        self.entries = entries or {}
+
+    def hash(self, path):
+        stat = os.stat(path)
+        key = str(path)
+        entry = self.entries.get(key)
+        if entry and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime_ns:
+            return entry["hash"]
+        with open(path, 'rb') as f:
+            digest = hashlib.sha256(f.read()).hexdigest()
+        self.entries[key] = {"size": stat.st_size, "mtime": stat.st_mtime_ns, "hash": digest}
+        return digest
+
+
+class ImagePipeline:
+    """Produces responsive image variants and <picture> markup.
+
+    Paths are site-relative (e.g. "assets/images/drug-delivery.png") and
+    resolved against output_dir, where the variants are written too.
+    """
+
+    def __init__(self, output_dir, cache_dir, widths=IMAGE_WIDTHS, formats=IMAGE_FORMATS):
+        self.output_dir = Path(output_dir)
+        self.cache_file = Path(cache_dir) / "images.json"
+        self.generated_dir = "assets/images/generated"
+        self.widths = widths
+        self.formats = [fmt for fmt in formats if Image is None or features.check(fmt)]
+        self.images = {}
+        self.warned = False
+
+        cache = {}
+        try:
+            with open(self.cache_file, 'r') as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            pass
+        if cache.get("version") != IMAGE_CACHE_VERSION:
+            cache = {}
+        self.hasher = SourceHasher(cache.get("sources"))
+        self.variants = cache.get("variants", {})
+
+    def save(self):
+        """Persist source hashes and encoded variants for the next build."""
+        self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.cache_file, 'w') as f:
+            json.dump({
+                "version": IMAGE_CACHE_VERSION,
+                "sources": self.hasher.entries,
+                "variants": self.variants
+            }, f, indent=2, sort_keys=True)
+
+    def source_hash(self, src):
+        """Return the content hash of a site-relative image."""
+        return self.hasher.hash(self.output_dir / src)
+
+    def variants_exist(self, info):
+        paths = [path for _, path in info["fallback"]]
+        for entries in info["sources"].values():
+            paths.extend(path for _, path in entries)
+        return all((self.output_dir / path).exists() for path in paths)
+
+    def prepare(self, sources):
+        """Process every image in sources, encoding only unseen content."""
+        for src in dict.fromkeys(sources):
+            self.process(src)
+        self.save()
+
+    def process(self, src):
+        """Return the variant info for one site-relative image."""
+        if src in self.images:
+            return self.images[src]
+        source_file = self.output_dir / src
+        if not source_file.exists():
+            self.images[src] = None
+            return None
+
+        digest = self.source_hash(src)
+        info = self.variants.get(digest)
+        if info is None or not self.variants_exist(info):
+            info = self.encode(source_file, digest)
+            if info is not None:
+                self.variants[digest] = info
+        if info is None:
+            size = read_image_size(source_file)
+            info = {"width": size[0] if size else None, "height": size[1] if size else None,
+                    "fallback": [], "sources": {}}
+        self.images[src] = info
+        return info
+
+    def encode(self, source_file, digest):
+        """Decode an image once and write every resized variant."""
+        if Image is None:
+            if not self.warned:
+                print("⚠️  Pillow is not installed; images are served unresized")
+                self.warned = True
+            return None
+
+        with Image.open(source_file) as image:
+            image.load()
+            width, height = image.size
+            widths = sorted({w for w in self.widths if w < width} | {min(width, max(self.widths))})
+            out_dir = self.output_dir / self.generated_dir
+            out_dir.mkdir(parents=True, exist_ok=True)
+            name = digest[:16]
+
+            info = {"width": width, "height": height, "fallback": [], "sources": {}}
+            for w in widths:
+                resized = image if w == width else image.resize((w, round(height * w / width)), Image.LANCZOS)
+                for fmt in self.formats:
+                    path = f"{self.generated_dir}/{name}-{w}.{fmt}"
+                    resized.save(self.output_dir / path, fmt.upper(), quality=IMAGE_QUALITY[fmt])
+                    info["sources"].setdefault(fmt, []).append([w, path])
+                path = f"{self.generated_dir}/{name}-{w}.png"
+                resized.save(self.output_dir / path, "PNG", optimize=True)
+                info["fallback"].append([w, path])
+        return info
+
+    def poster_url(self, src, width=800):
+        """Return the variant of an image best suited as a video poster."""
+        info = self.process(src)
+        if info is None:
+            return None
+        entries = info["sources"].get("webp") or info["fallback"]
+        if not entries:
+            return src
+        return min(entries, key=lambda entry: abs(entry[0] - width))[1]
+
+    def picture_html(self, src, alt, sizes="100vw", base=""):
+        """Return <picture> markup for a site-relative image."""
+        info = self.process(src)
+        if info is None:
+            return f'<img src="{base}{src}" alt="{alt}">'
+
+        dimensions = f' width="{info["width"]}" height="{info["height"]}"' if info["width"] else ""
+        if not info["fallback"]:
+            return f'<img src="{base}{src}" alt="{alt}"{dimensions}>'
+
+        def srcset(entries):
+            return ', '.join(f"{base}{path} {w}w" for w, path in entries)
+
+        parts = ['<picture>']
+        for fmt in self.formats:
+            if fmt in info["sources"]:
+                parts.append(f'<source type="{IMAGE_MIME_TYPES[fmt]}" srcset="{srcset(info["sources"][fmt])}" sizes="{sizes}">')
+        fallback = info["fallback"]
+        parts.append(f'<img src="{base}{fallback[-1][1]}" srcset="{srcset(fallback)}" sizes="{sizes}" alt="{alt}"{dimensions}>')
+        parts.append('</picture>')
+        return ''.join(parts)
+
+
+class VideoPipeline:
+    """Produces web renditions and poster frames for referenced videos.
+
+    A video referenced as "assets/videos/name.mp4" is built from
+    source_dir/name.* when such a source exists; otherwise a file already at
+    that path in output_dir is used as-is. Videos found in neither place are
+    reported as missing.
+    """
+
+    def __init__(self, output_dir, source_dir, cache_dir):
+        self.output_dir = Path(output_dir)
+        self.source_dir = Path(source_dir)
+        self.cache_file = Path(cache_dir) / "videos.json"
+        self.ffmpeg = shutil.which("ffmpeg")
+        self.videos = {}
+        self.missing = []
+        self.warned = False
+
+        cache = {}
+        try:
+            with open(self.cache_file, 'r') as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            pass
+        if cache.get("version") != VIDEO_CACHE_VERSION:
+            cache = {}
+        self.hasher = SourceHasher(cache.get("sources"))
+        self.renditions = cache.get("renditions", {})
+
+    def save(self):
+        """Persist source hashes and renditions for the next build."""
+        self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.cache_file, 'w') as f:
+            json.dump({
+                "version": VIDEO_CACHE_VERSION,
+                "sources": self.hasher.entries,
+                "renditions": self.renditions
+            }, f, indent=2, sort_keys=True)
+
+    def find_source(self, video):
+        """Return the source file for a site-relative video path, or None."""
+        stem = Path(video).stem
+        for ext in VIDEO_EXTENSIONS:
+            candidate = self.source_dir / f"{stem}{ext}"
+            if candidate.exists():
+                return candidate
+        return None
+
+    def prepare(self, videos):
+        """Resolve every referenced video, transcoding only changed sources.
+
+        Videos that are missing or fail to transcode are listed in self.missing.
+        """
+        self.missing = []
+        used = set()
+        for video in dict.fromkeys(videos):
+            info = self.process(video)
+            if info is None:
+                self.missing.append(video)
+            else:
+                used.add(f"{video}:{info['hash']}")
+        # Forget renditions of edited or unreferenced sources
+        self.renditions = {key: value for key, value in self.renditions.items() if key in used}
+        self.save()
+
+    def get(self, video):
+        """Return {"path", "poster", "hash"} for a prepared video, or None."""
+        if video not in self.videos:
+            return self.process(video)
+        return self.videos[video]
+
+    def process(self, video):
+        output_file = self.output_dir / video
+        poster = str(Path(video).with_name(f"{Path(video).stem}-poster.jpg"))
+        source_file = self.find_source(video)
+
+        if source_file is not None:
+            digest = self.hasher.hash(source_file)
+            key = f"{video}:{digest}"
+            cached = self.renditions.get(key)
+            if not (cached and output_file.exists()
+                    and (cached["poster"] is None or (self.output_dir / cached["poster"]).exists())):
+                cached = self.transcode(source_file, output_file, poster)
+                if cached is not None:
+                    self.renditions[key] = cached
+            info = {"path": video, "poster": cached["poster"], "hash": digest} if cached is not None else None
+        elif output_file.exists():
+            # Hand-placed rendition: use it as-is, extracting a poster if we can
+            digest = self.hasher.hash(output_file)
+            key = f"{video}:{digest}"
+            cached = self.renditions.get(key)
+            if not (cached and (cached["poster"] is None or (self.output_dir / cached["poster"]).exists())):
+                cached = {"poster": self.extract_poster(output_file, poster)}
+                self.renditions[key] = cached
+            info = {"path": video, "poster": cached["poster"], "hash": digest}
+        else:
+            info = None
+
+        self.videos[video] = info
+        return info
+
+    def transcode(self, source_file, output_file, poster):
+        """Write a size-capped web rendition.
+
+        Returns {"poster": poster path or None}, or None when ffmpeg fails.
+        """
+        output_file.parent.mkdir(parents=True, exist_ok=True)
+        if self.ffmpeg is None:
+            if not self.warned:
+                print("⚠️  ffmpeg is not installed; source videos are copied without transcoding")
+                self.warned = True
+            shutil.copyfile(source_file, output_file)
+            return {"poster": None}
+
+        print(f"🎞️  Transcoding {source_file} -> {output_file}")
+        result = subprocess.run([
+            self.ffmpeg, "-y", "-loglevel", "error", "-i", str(source_file),
+            "-vf", f"scale='min({VIDEO_MAX_WIDTH},iw)':-2",
+            "-c:v", "libx264", "-preset", "slow", "-crf", "26",
+            "-maxrate", VIDEO_MAX_BITRATE, "-bufsize", "3000k",
+            "-pix_fmt", "yuv420p", "-movflags", "+faststart", "-an",
+            str(output_file)
+        ])
+        if result.returncode != 0:
+            print(f"⚠️  Could not transcode {source_file}; its service falls back to its image")
+            output_file.unlink(missing_ok=True)
+            return None
+        return {"poster": self.extract_poster(output_file, poster)}
+
+    def extract_poster(self, video_file, poster):
+        """Grab an early frame of a video as a JPEG poster, if ffmpeg is available."""
+        if self.ffmpeg is None:
+            return None
+        result = subprocess.run([
+            self.ffmpeg, "-y", "-loglevel", "error", "-ss", "0.5", "-i", str(video_file),
+            "-frames:v", "1", "-q:v", "4", str(self.output_dir / poster)
+        ])
+        return poster if result.returncode == 0 else None
@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""
+Service worker generation for the website builder.
+
+With --service-worker, every page registers sw.js at the site root. sw.js is
+generated from the final output tree after each build:
+- the app shell (the stylesheets, scripts with the modules they import, and
+  fonts the nav pages load) and the nav pages themselves are precached when
+  the worker installs, so moving between them never waits on the network;
+- pages are served stale-while-revalidate: from the cache at once, and
+  refreshed in the background for the next visit;
+- images and videos go in a runtime cache capped at MEDIA_CACHE_BYTES,
+  oldest entries out first. Range requests for a cached video are answered
+  from the cached file.
+Each precached file is listed with a hash of its bytes. A deploy therefore
+changes sw.js exactly when a precached file changed, and the new worker
+fetches only those files; entries no longer listed are dropped once it
+activates.
+"""
+import hashlib
+import json
+import posixpath
+import re
+from pathlib import Path
+
+from assets import CSS_REFERENCE, JS_REFERENCE, is_local_reference, split_url
+from compress import ENCODINGS
+
+SW_FILE = "sw.js"
+# Runtime caches: media by total bytes, other pages by entry count
+MEDIA_CACHE_BYTES = 50 * 1024 * 1024
+MEDIA_ITEM_BYTES = 10 * 1024 * 1024
+PAGE_CACHE_ENTRIES = 50
+MEDIA_SUFFIXES = (".png", ".jpg", ".jpeg", ".gif", ".webp", ".avif", ".svg", ".ico", ".mp4", ".webm", ".ogv",
+                  ".mov")
+REVISION_LENGTH = 12
+
+LINK_TAG = re.compile(r'<link\b[^>]*>')
+SCRIPT_TAG = re.compile(r'<script\b[^>]*\bsrc="([^"]+)"')
+STYLE_BLOCK = re.compile(r'<style\b[^>]*>(.*?)</style>', re.DOTALL)
+ATTR = re.compile(r'([a-z-]+)="([^"]*)"')
+# <link rel> values whose href the page loads up front
+SHELL_RELS = {"stylesheet", "preload", "modulepreload", "icon"}
+REGISTER_SCRIPT = ("<script>if('serviceWorker' in navigator)addEventListener('load',"
+                   "()=>navigator.serviceWorker.register('{url}'))</script>")
+
+WORKER_SOURCE = r'''
+const SCOPE = new URL(self.registration.scope);
+const PRECACHE = `precache:${SCOPE.pathname}`;
+const PAGE_CACHE = `pages:${SCOPE.pathname}`;
+const MEDIA_CACHE = `media:${SCOPE.pathname}`;
+const SIZE_HEADER = 'X-Cached-Bytes';
+const MEDIA_PATTERN = new RegExp(`\\.(${CONFIG.mediaSuffixes.join('|')})$`, 'i');
+
+// Precached files are stored under their URL plus revision, so this worker
+// and the one it replaces each find their own copies
+const precached = new Map([...CONFIG.shell, ...CONFIG.pages].map(([path, revision]) => {
+    const url = new URL(path, SCOPE).href;
+    return [url, `${url}?__revision=${revision}`];
+}));
+
+self.addEventListener('install', event => {
+    event.waitUntil((async () => {
+        const cache = await caches.open(PRECACHE);
+        await Promise.all([...precached].map(async ([url, key]) => {
+            if (await cache.match(key)) return;
+            const response = await fetch(url, { cache: 'no-cache' });
+            if (!response.ok) throw new Error(`Precaching ${url} failed: ${response.status}`);
+            await cache.put(key, response);
+        }));
+    })());
+});
+
+self.addEventListener('activate', event => {
+    event.waitUntil((async () => {
+        const keep = new Set(precached.values());
+        const cache = await caches.open(PRECACHE);
+        for (const request of await cache.keys()) {
+            if (!keep.has(request.url)) await cache.delete(request);
+        }
+        // Cached pages may link files the deploy replaced; nav pages stay precached
+        await caches.delete(PAGE_CACHE);
+        await self.clients.claim();
+    })());
+});
+
+self.addEventListener('fetch', event => {
+    const request = event.request;
+    if (request.method !== 'GET') return;
+    const url = new URL(request.url);
+    if (url.origin !== SCOPE.origin || !url.pathname.startsWith(SCOPE.pathname)) return;
+    url.hash = '';
+    if (request.mode === 'navigate') {
+        event.respondWith(page(event, url));
+    } else if (precached.has(url.href)) {
+        event.respondWith(shell(request, url.href));
+    } else if (MEDIA_PATTERN.test(url.pathname)) {
+        event.respondWith(media(event, url.href));
+    }
+});
+
+async function shell(request, url) {
+    const cache = await caches.open(PRECACHE);
+    return (await cache.match(precached.get(url))) || fetch(request);
+}
+
+async function page(event, url) {
+    if (url.pathname.endsWith('/')) url.pathname += 'index.html';
+    url.search = '';
+    const pages = await caches.open(PAGE_CACHE);
+    let cached = await pages.match(url.href);
+    if (!cached && precached.has(url.href)) {
+        cached = await (await caches.open(PRECACHE)).match(precached.get(url.href));
+    }
+    const network = fetch(event.request).then(async response => {
+        // Navigations can't be answered with a redirected response later
+        if (response.ok && !response.redirected) {
+            await pages.put(url.href, response.clone());
+            await trim(pages, keys => keys.length - CONFIG.pageEntries);
+        }
+        return response;
+    });
+    if (!cached) return network;
+    event.waitUntil(network.catch(() => {}));
+    return cached;
+}
+
+async function media(event, url) {
+    const cache = await caches.open(MEDIA_CACHE);
+    const range = event.request.headers.get('range');
+    const cached = await cache.match(url);
+    if (cached) return range ? partial(cached, range) : cached;
+
+    const response = await fetch(event.request);
+    if (response.status === 200 && !range) {
+        event.waitUntil(store(cache, url, response.clone()));
+    } else if (response.status === 206) {
+        // Videos load by ranges; fetch a small one whole for next time
+        const total = Number((response.headers.get('content-range') || '').split('/')[1]);
+        if (total && total <= CONFIG.mediaItemBytes) {
+            event.waitUntil(fetch(url).then(full => full.status === 200 && store(cache, url, full)).catch(() => {}));
+        }
+    }
+    return response;
+}
+
+async function store(cache, url, response) {
+    const body = await response.blob();
+    if (body.size > CONFIG.mediaItemBytes) return;
+    const headers = new Headers(response.headers);
+    headers.set(SIZE_HEADER, String(body.size));
+    await cache.put(url, new Response(body, { status: 200, statusText: response.statusText, headers }));
+    await trim(cache, async keys => {
+        const sizes = await Promise.all(keys.map(async key =>
+            Number((await cache.match(key)).headers.get(SIZE_HEADER)) || 0));
+        let total = sizes.reduce((sum, size) => sum + size, 0);
+        let count = 0;
+        while (total > CONFIG.mediaCacheBytes && count < keys.length) total -= sizes[count++];
+        return count;
+    });
+}
+
+// Delete the oldest entries; over(keys) says how many
+async function trim(cache, over) {
+    const keys = await cache.keys();
+    const count = await over(keys);
+    for (const key of keys.slice(0, Math.max(count, 0))) await cache.delete(key);
+}
+
+async function partial(response, range) {
+    const body = await response.blob();
+    const match = /^bytes=(\d*)-(\d*)$/.exec(range.trim());
+    let start = match && match[1] !== '' ? Number(match[1]) : NaN;
+    let end = match && match[2] !== '' ? Number(match[2]) : body.size - 1;
+    if (match && match[1] === '' && match[2] !== '') {
+        start = Math.max(body.size - Number(match[2]), 0);
+        end = body.size - 1;
+    }
+    end = Math.min(end, body.size - 1);
+    if (!(start >= 0 && start <= end)) {
+        return new Response(null, { status: 416, headers: { 'Content-Range': `bytes */${body.size}` } });
+    }
+    return new Response(body.slice(start, end + 1), {
+        status: 206,
+        headers: {
+            'Content-Type': response.headers.get('content-type') || '',
+            'Content-Range': `bytes ${start}-${end}/${body.size}`,
+            'Content-Length': String(end - start + 1),
+        },
+    });
+}
+'''
+
+
+def revision(data):
+    return hashlib.sha256(data).hexdigest()[:REVISION_LENGTH]
+
+
+class ServiceWorkerGenerator:
+    """Writes the site's service worker and registers it in pages."""
+
+    def __init__(self, output_dir):
+        self.output_dir = Path(output_dir)
+        self.sw_file = self.output_dir / SW_FILE
+
+    def register_html(self, filename, html):
+        """Add the registration script to the end of a page's body."""
+        body_end = html.rfind("</body>")
+        if body_end < 0:
+            return html
+        url = "../" * filename.count("/") + SW_FILE
+        return html[:body_end] + "    " + REGISTER_SCRIPT.format(url=url) + "\n" + html[body_end:]
+
+    def page_resources(self, filename, html):
+        """Site-relative paths of the local files a page loads up front."""
+        page_dir = posixpath.dirname(filename)
+        urls = []
+        for tag in LINK_TAG.findall(html):
+            attrs = dict(ATTR.findall(tag))
+            if set(attrs.get("rel", "").lower().split()) & SHELL_RELS and attrs.get("href"):
+                urls.append(attrs["href"])
+        urls += SCRIPT_TAG.findall(html)
+        # Inline @font-face and critical CSS
+        for css in STYLE_BLOCK.findall(html):
+            urls += [match.group(2) for match in CSS_REFERENCE.finditer(css)]
+        return [self.resolve(page_dir, url) for url in urls if is_local_reference(url)]
+
+    def resolve(self, base_dir, url):
+        path, _ = split_url(url)
+        return posixpath.normpath(posixpath.join(base_dir, path))
+
+    def shell(self, pages):
+        """The files the pages load and, recursively, what those import; in first-seen order."""
+        found = {}
+        queue = [path for filename in pages if (self.output_dir / filename).exists()
+                 for path in self.page_resources(filename, (self.output_dir / filename).read_text(encoding='utf-8'))]
+        while queue:
+            path = queue.pop(0)
+            if path in found or not (self.output_dir / path).is_file():
+                continue
+            found[path] = data = (self.output_dir / path).read_bytes()
+            if path.endswith(".css") or path.endswith(".js"):
+                pattern = CSS_REFERENCE if path.endswith(".css") else JS_REFERENCE
+                text = data.decode('utf-8')
+                queue += [self.resolve(posixpath.dirname(path), match.group(2)) for match in pattern.finditer(text)
+                          if is_local_reference(match.group(2))]
+        return found
+
+    def generate(self, pages):
+        """Write sw.js precaching pages (site-relative filenames) and their shell.
+
+        Returns (precached file count, their total bytes).
+        """
+        shell = self.shell(pages)
+        page_data = {filename: (self.output_dir / filename).read_bytes()
+                     for filename in pages if (self.output_dir / filename).exists()}
+        config = {
+            "shell": [[path, revision(data)] for path, data in shell.items()],
+            "pages": [[filename, revision(data)] for filename, data in page_data.items()],
+            "pageEntries": PAGE_CACHE_ENTRIES,
+            "mediaCacheBytes": MEDIA_CACHE_BYTES,
+            "mediaItemBytes": MEDIA_ITEM_BYTES,
+            "mediaSuffixes": [suffix[1:] for suffix in MEDIA_SUFFIXES],
+        }
+        entries = ",\n".join(f"    {json.dumps(key)}: {json.dumps(value)}" for key, value in config.items())
+        text = (f"// Generated by dev/tools/offline.py from the built site; do not edit.\n"
+                f"const CONFIG = {{\n{entries}\n}};\n" + WORKER_SOURCE)
+        try:
+            unchanged = self.sw_file.read_text(encoding='utf-8') == text
+        except OSError:
+            unchanged = False
+        if not unchanged:
+            self.sw_file.write_text(text, encoding='utf-8')
+        files = [*shell.values(), *page_data.values()]
+        return len(files), sum(len(data) for data in files)
+
+    def remove(self):
+        """Delete a service worker, and its compressed copies, written by an earlier build."""
+        for suffix in ("", *ENCODINGS):
+            self.sw_file.with_name(SW_FILE + suffix).unlink(missing_ok=True)
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Per-stage build timing for the website builder.
+
+Stages are named by the call site; a "/" nests a stage under another one
+("render/generate_about_html:about.html" sits under "render"), and anything
+after a ":" labels the item the stage worked on. Repeated
+stages are aggregated into one row with a call count. When profiling is off,
+stage() costs one attribute check.
+"""
+import json
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+
+def parent_stage(name):
+    """Return the name of the stage a stage is nested under, or ""."""
+    path = name.split(":", 1)[0]
+    return path.rsplit("/", 1)[0] if "/" in path else ""
+
+
+class Stage:
+    """Byte count reported by one stage invocation."""
+
+    __slots__ = ("bytes",)
+
+    def __init__(self):
+        self.bytes = 0
+
+
+class BuildProfiler:
+    """Collects stage timings and formats them as JSON or a table."""
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.records = []          # (name, start, seconds, bytes)
+        self.started = time.perf_counter()
+        self.extra = {}
+
+    def begin(self):
+        """Start timing a new build."""
+        self.records = []
+        self.started = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name):
+        """Time a block; set .bytes on the yielded Stage to record its size."""
+        stage = Stage()
+        if not self.enabled:
+            yield stage
+            return
+        start = time.perf_counter()
+        try:
+            yield stage
+        finally:
+            self.records.append((name, start, time.perf_counter() - start, stage.bytes))
+
+    def drain(self):
+        """Return and forget the records so far, e.g. to ship them from a worker."""
+        records, self.records = self.records, []
+        return records
+
+    def merge(self, records):
+        self.records.extend(records)
+
+    def report(self):
+        """Aggregate the records into a JSON-serialisable report."""
+        rows = {}
+        for name, start, seconds, nbytes in self.records:
+            row = rows.setdefault(name, {"name": name, "calls": 0, "seconds": 0.0,
+                                         "max_seconds": 0.0, "bytes": 0, "start": start})
+            row["calls"] += 1
+            row["seconds"] += seconds
+            row["max_seconds"] = max(row["max_seconds"], seconds)
+            row["bytes"] += nbytes
+            row["start"] = min(row["start"], start)
+
+        # Order rows depth-first, each level by first start
+        ordered = []
+
+        def add_children(parent):
+            children = [row for name, row in rows.items() if parent_stage(name) == parent]
+            for row in sorted(children, key=lambda r: r["start"]):
+                ordered.append(row)
+                add_children(row["name"])
+
+        add_children("")
+        # Stages whose parent never ran still belong in the report
+        seen = {row["name"] for row in ordered}
+        ordered.extend(row for name, row in rows.items() if name not in seen)
+
+        total = time.perf_counter() - self.started
+        stages = []
+        for row in ordered:
+            stages.append({
+                "name": row["name"],
+                "calls": row["calls"],
+                "seconds": round(row["seconds"], 6),
+                "max_seconds": round(row["max_seconds"], 6),
+                "bytes": row["bytes"],
+            })
+        return {"total_seconds": round(total, 6), "stages": stages, **self.extra}
+
+    def save(self, path, report=None):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(report or self.report(), f, indent=2)
+
+
+def memory_report(limit=10):
+    """Summarise tracemalloc's peak and largest allocation sites."""
+    _, peak = tracemalloc.get_traced_memory()
+    top = tracemalloc.take_snapshot().statistics('lineno')[:limit]
+    return {
+        "peak_bytes": peak,
+        "top": [{"location": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                 "size_bytes": stat.size} for stat in top],
+    }
+
+
+def format_table(report):
+    """Render a profile report as a fixed-width table."""
+    total = report["total_seconds"] or 1e-9
+    lines = [f"{'Stage':<58} {'Calls':>5} {'Time ms':>9} {'%':>6} {'KB':>9}",
+             "-" * 91]
+    for stage in report["stages"]:
+        path, _, item = stage["name"].partition(":")
+        label = "  " * path.count("/") + path.rsplit("/", 1)[-1] + (f" {item}" if item else "")
+        if len(label) > 58:
+            label = label[:55] + "..."
+        kb = f"{stage['bytes'] / 1024:.1f}" if stage["bytes"] else ""
+        lines.append(f"{label:<58} {stage['calls']:>5} {stage['seconds'] * 1000:>9.2f} "
+                     f"{stage['seconds'] / total * 100:>5.1f}% {kb:>9}")
+    lines.append("-" * 91)
+    lines.append(f"{'Total build':<58} {'':>5} {report['total_seconds'] * 1000:>9.2f}")
+    if report.get("jobs", 1) > 1:
+        lines.append(f"Rendering ran in {report['jobs']} workers; per-page rows are summed across them.")
+    if "memory" in report:
+        memory = report["memory"]
+        lines.append(f"Peak traced memory: {memory['peak_bytes'] / 1024:.1f} KB")
+        for site in memory["top"]:
+            lines.append(f"  {site['size_bytes'] / 1024:>8.1f} KB  {site['location']}")
+    return '\n'.join(lines)
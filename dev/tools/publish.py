@@ -0,0 +1,482 @@
+#!/usr/bin/env python3
+"""
+Incremental deploy engine for the generated site.
+
+docs/ is hashed (through a stat cache, so only files whose size or mtime
+changed are re-read) and diffed against the manifest of content hashes the
+target last received. Only new and changed files are uploaded, by a bounded
+pool of workers with retries; assets go before the pages that link them and
+the manifest is written last. Finished uploads are journaled in .build-cache,
+so a deploy that fails part way resumes where it stopped. Targets:
+
+  git                   commit and push only the changed files under docs/
+  DIR                   a local directory, e.g. a test mirror or rsync source
+  s3://BUCKET/PREFIX    an S3-compatible bucket (SigV4; any endpoint)
+"""
+import hashlib
+import hmac
+import json
+import mimetypes
+import os
+import shutil
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
+from pathlib import Path
+from urllib.error import HTTPError
+from urllib.parse import quote, urlsplit
+from urllib.request import Request, urlopen
+
+MANIFEST_NAME = ".deploy-manifest.json"
+DEPLOY_MANIFEST_VERSION = 1
+DEFAULT_JOBS = 8
+DEFAULT_RETRIES = 3
+RETRY_BACKOFF = 0.5
+REQUEST_TIMEOUT = 60
+# Pages go up after the assets they link, so no page points at a missing file;
+# so does the service worker, which precaches them
+PAGE_SUFFIXES = (".html", "sw.js")
+# Content-hashed outputs never change, so they can be cached forever
+IMMUTABLE_DIRS = ("dist/", "styles/bundles/", "scripts/bundles/", "assets/images/generated/", "assets/fonts/")
+COMMIT_MESSAGE = "Update website content and rebuild"
+
+
+class DeployError(Exception):
+    """A deploy step failed in a way that retrying won't fix."""
+
+
+def hash_file(path, algorithm="sha256"):
+    """Hash a file's bytes, or its git blob id when algorithm is "git-blob"."""
+    if algorithm == "git-blob":
+        digest = hashlib.sha1(f"blob {os.path.getsize(path)}\0".encode('ascii'))
+    else:
+        digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def walk_files(root):
+    """List every file under root as POSIX paths relative to it."""
+    files = []
+    for dirpath, _, filenames in os.walk(root):
+        for filename in filenames:
+            if filename != MANIFEST_NAME and not filename.endswith(".tmp"):
+                files.append(Path(dirpath, filename).relative_to(root).as_posix())
+    return files
+
+
+class FileScanner:
+    """Hashes the files of a tree, re-reading only those whose stat changed."""
+
+    def __init__(self, cache_dir, algorithm):
+        self.algorithm = algorithm
+        self.cache_file = Path(cache_dir) / f"deploy-scan-{algorithm}.json"
+
+    def scan(self, root, files):
+        """Return {relative path: hash} for files under root."""
+        try:
+            with open(self.cache_file, 'r') as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            cache = {}
+        entries = {}
+        for rel in files:
+            stat = os.stat(Path(root, rel))
+            entry = cache.get(rel)
+            if not (entry and entry[0] == stat.st_size and entry[1] == stat.st_mtime_ns):
+                entry = [stat.st_size, stat.st_mtime_ns, hash_file(Path(root, rel), self.algorithm)]
+            entries[rel] = entry
+        if entries != cache:
+            self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.cache_file, 'w') as f:
+                json.dump(entries, f)
+        return {rel: entry[2] for rel, entry in entries.items()}
+
+
+class Backend:
+    """A deploy target: stores files and the manifest of what it holds."""
+
+    algorithm = "sha256"
+    # Whether uploads may run concurrently, and be resumed from the journal
+    parallel = True
+    resumable = True
+
+    def describe(self):
+        raise NotImplementedError
+
+    def list_files(self, root):
+        """The files under root to deploy."""
+        return walk_files(root)
+
+    def read_manifest(self):
+        """Return {relative path: hash} of what the target holds."""
+        raise NotImplementedError
+
+    def upload(self, root, rel, digest):
+        raise NotImplementedError
+
+    def delete(self, rel):
+        raise NotImplementedError
+
+    def finish(self, manifest):
+        """Record the new manifest once every upload and delete succeeded."""
+        raise NotImplementedError
+
+    def manifest_json(self, manifest):
+        return json.dumps({
+            "version": DEPLOY_MANIFEST_VERSION,
+            "algorithm": self.algorithm,
+            "files": manifest,
+        }, separators=(',', ':'), sort_keys=True).encode('utf-8')
+
+    def parse_manifest(self, data):
+        try:
+            manifest = json.loads(data)
+        except ValueError:
+            return {}
+        if manifest.get("version") != DEPLOY_MANIFEST_VERSION or manifest.get("algorithm") != self.algorithm:
+            return {}
+        return manifest.get("files", {})
+
+
+class LocalBackend(Backend):
+    """Mirrors the site into a local directory."""
+
+    def __init__(self, target_dir):
+        self.target_dir = Path(target_dir)
+
+    def describe(self):
+        return str(self.target_dir)
+
+    def read_manifest(self):
+        try:
+            return self.parse_manifest((self.target_dir / MANIFEST_NAME).read_bytes())
+        except OSError:
+            return {}
+
+    def write_atomic(self, dest, copy):
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        tmp = dest.with_name(dest.name + ".tmp")
+        copy(tmp)
+        os.replace(tmp, dest)
+
+    def upload(self, root, rel, digest):
+        self.write_atomic(self.target_dir / rel, lambda tmp: shutil.copyfile(Path(root, rel), tmp))
+
+    def delete(self, rel):
+        path = self.target_dir / rel
+        path.unlink(missing_ok=True)
+        # Drop directories the deleted file leaves empty
+        for parent in path.parents:
+            if parent == self.target_dir or any(parent.iterdir()):
+                break
+            parent.rmdir()
+
+    def finish(self, manifest):
+        data = self.manifest_json(manifest)
+        self.write_atomic(self.target_dir / MANIFEST_NAME, lambda tmp: tmp.write_bytes(data))
+
+
+class S3Backend(Backend):
+    """Uploads to an S3-compatible bucket with path-style, SigV4-signed requests.
+
+    Credentials come from AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY and
+    (optionally) AWS_SESSION_TOKEN.
+    """
+
+    def __init__(self, bucket, prefix="", endpoint=None, region=None):
+        self.bucket = bucket
+        self.prefix = prefix.strip("/") + "/" if prefix.strip("/") else ""
+        self.region = region or os.environ.get("AWS_REGION") or os.environ.get("AWS_DEFAULT_REGION") or "us-east-1"
+        self.endpoint = (endpoint or os.environ.get("AWS_ENDPOINT_URL")
+                         or f"https://s3.{self.region}.amazonaws.com").rstrip("/")
+        self.access_key = os.environ.get("AWS_ACCESS_KEY_ID")
+        self.secret_key = os.environ.get("AWS_SECRET_ACCESS_KEY")
+        self.session_token = os.environ.get("AWS_SESSION_TOKEN")
+        if not self.access_key or not self.secret_key:
+            raise DeployError("S3 targets need AWS_ACCESS_KEY_ID and AWS_SECRET_ACCESS_KEY")
+
+    def describe(self):
+        return f"s3://{self.bucket}/{self.prefix} ({self.endpoint})"
+
+    def sign(self, method, url, headers, payload_hash):
+        """Return headers with an AWS Signature Version 4 Authorization."""
+        amz_date = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+        parts = urlsplit(url)
+        headers = {key.lower(): str(value).strip() for key, value in headers.items()}
+        headers.update({"host": parts.netloc, "x-amz-date": amz_date, "x-amz-content-sha256": payload_hash})
+        if self.session_token:
+            headers["x-amz-security-token"] = self.session_token
+        names = sorted(headers)
+        canonical = '\n'.join([
+            method, parts.path, parts.query,
+            ''.join(f"{name}:{headers[name]}\n" for name in names),
+            ';'.join(names), payload_hash,
+        ])
+        scope = f"{amz_date[:8]}/{self.region}/s3/aws4_request"
+        string_to_sign = '\n'.join([
+            "AWS4-HMAC-SHA256", amz_date, scope, hashlib.sha256(canonical.encode('utf-8')).hexdigest()])
+        key = f"AWS4{self.secret_key}".encode('utf-8')
+        for part in (amz_date[:8], self.region, "s3", "aws4_request"):
+            key = hmac.new(key, part.encode('utf-8'), hashlib.sha256).digest()
+        signature = hmac.new(key, string_to_sign.encode('utf-8'), hashlib.sha256).hexdigest()
+        headers["authorization"] = (f"AWS4-HMAC-SHA256 Credential={self.access_key}/{scope}, "
+                                    f"SignedHeaders={';'.join(names)}, Signature={signature}")
+        return headers
+
+    def request(self, method, rel, body=None, payload_hash=None, headers=None, length=None):
+        """Send one signed request for an object; return its body, or None on 404."""
+        url = f"{self.endpoint}/{quote(f'{self.bucket}/{self.prefix}{rel}', safe='/-_.~')}"
+        payload_hash = payload_hash or hashlib.sha256(body or b'').hexdigest()
+        signed = self.sign(method, url, headers or {}, payload_hash)
+        if body is not None:
+            signed["content-length"] = str(len(body) if length is None else length)
+        try:
+            with urlopen(Request(url, data=body, method=method, headers=signed), timeout=REQUEST_TIMEOUT) as response:
+                return response.read()
+        except HTTPError as e:
+            if e.code == 404 and method in ("GET", "DELETE"):
+                return None
+            if e.code in (408, 429) or e.code >= 500:
+                raise  # an OSError, so it's retried
+            raise DeployError(f"{method} {rel}: HTTP {e.code} {e.read()[:200].decode('utf-8', 'replace')}") from None
+
+    def read_manifest(self):
+        data = self.request("GET", MANIFEST_NAME)
+        return self.parse_manifest(data) if data else {}
+
+    def upload(self, root, rel, digest):
+        path = Path(root, rel)
+        headers = {"content-type": mimetypes.guess_type(rel)[0] or "application/octet-stream"}
+        if rel.startswith(IMMUTABLE_DIRS):
+            headers["cache-control"] = "public, max-age=31536000, immutable"
+        # The scan already hashed the file with SHA-256, which is the payload hash
+        with open(path, 'rb') as f:
+            self.request("PUT", rel, f, digest, headers, length=os.fstat(f.fileno()).st_size)
+
+    def delete(self, rel):
+        self.request("DELETE", rel)
+
+    def finish(self, manifest):
+        self.request("PUT", MANIFEST_NAME, self.manifest_json(manifest),
+                     headers={"content-type": "application/json", "cache-control": "no-cache"})
+
+
+class GitBackend(Backend):
+    """Commits and pushes the changed files under docs/ (for GitHub Pages).
+
+    The pushed tree is the manifest: the blob ids on the upstream branch (or
+    HEAD, without one) are compared with the git blob ids of the local files,
+    so nothing else is stored. A commit whose push failed still differs from
+    upstream, so the next deploy pushes it.
+    """
+
+    algorithm = "git-blob"
+    parallel = False
+    resumable = False
+
+    def __init__(self, repo_dir, docs_dir):
+        self.repo_dir = Path(repo_dir)
+        self.docs_path = Path(docs_dir).resolve().relative_to(self.repo_dir.resolve()).as_posix()
+        self.changed = []
+        self.removed = []
+
+    def describe(self):
+        return f"git ({self.docs_path}/)"
+
+    def git(self, *args, stdin=None):
+        result = subprocess.run(["git", *args], cwd=self.repo_dir, input=stdin, capture_output=True)
+        if result.returncode != 0:
+            raise DeployError(f"git {args[0]} failed: {result.stderr.decode('utf-8', 'replace').strip()}")
+        return result.stdout
+
+    def list_files(self, root):
+        # Tracked and untracked files, minus ignored ones such as .gz siblings
+        out = self.git("ls-files", "-z", "--cached", "--others", "--exclude-standard", "--", self.docs_path)
+        prefix = self.docs_path + "/"
+        return sorted({path[len(prefix):] for path in out.decode('utf-8').split('\0')
+                       if path.startswith(prefix) and os.path.isfile(self.repo_dir / path)})
+
+    def has_ref(self, ref):
+        return subprocess.run(["git", "rev-parse", "--verify", "--quiet", ref], cwd=self.repo_dir,
+                              capture_output=True).returncode == 0
+
+    def read_manifest(self):
+        ref = "@{u}" if self.has_ref("@{u}") else "HEAD"
+        if not self.has_ref(ref):
+            return {}
+        manifest = {}
+        prefix = self.docs_path + "/"
+        for line in self.git("ls-tree", "-r", "-z", ref, "--", self.docs_path).decode('utf-8').split('\0'):
+            if line:
+                info, path = line.split('\t', 1)
+                manifest[path[len(prefix):]] = info.split()[2]
+        return manifest
+
+    def upload(self, root, rel, digest):
+        self.changed.append(f"{self.docs_path}/{rel}")
+
+    def delete(self, rel):
+        self.removed.append(f"{self.docs_path}/{rel}")
+
+    def finish(self, manifest):
+        # Stage just the changed paths, never the rest of the tree
+        if self.changed:
+            self.git("add", "--pathspec-from-file=-", "--pathspec-file-nul",
+                     stdin='\0'.join(self.changed).encode('utf-8'))
+        if self.removed:
+            self.git("rm", "--cached", "--quiet", "--ignore-unmatch", "--pathspec-from-file=-", "--pathspec-file-nul",
+                     stdin='\0'.join(self.removed).encode('utf-8'))
+        # Finishing again after a failed push has nothing new to commit
+        staged = subprocess.run(["git", "diff", "--cached", "--quiet", "--", self.docs_path], cwd=self.repo_dir,
+                                capture_output=True).returncode != 0
+        if staged:
+            self.git("commit", "--quiet", "-m", COMMIT_MESSAGE, "--", self.docs_path)
+        if self.has_ref("@{u}") and not int(self.git("rev-list", "--count", "@{u}..HEAD")):
+            return
+        result = subprocess.run(["git", "push", "--quiet"], cwd=self.repo_dir, capture_output=True)
+        if result.returncode != 0:
+            # An OSError, so the deployer retries it like a failed upload
+            raise ConnectionError(f"git push failed: {result.stderr.decode('utf-8', 'replace').strip()}")
+
+
+def make_backend(target, repo_dir, docs_dir, endpoint=None, region=None):
+    """Create the backend for a --target value: git, s3://BUCKET/PREFIX or a directory."""
+    if target == "git":
+        return GitBackend(repo_dir, docs_dir)
+    if target.startswith("s3://"):
+        bucket, _, prefix = target[len("s3://"):].partition("/")
+        if not bucket:
+            raise DeployError(f"no bucket in {target}")
+        return S3Backend(bucket, prefix, endpoint, region)
+    return LocalBackend(target)
+
+
+class Deployer:
+    """Uploads what changed in a tree since the target's last deploy."""
+
+    def __init__(self, docs_dir, backend, cache_dir, jobs=DEFAULT_JOBS, retries=DEFAULT_RETRIES):
+        self.docs_dir = Path(docs_dir)
+        self.backend = backend
+        self.scanner = FileScanner(cache_dir, backend.algorithm)
+        self.journal_file = Path(cache_dir) / "deploy-journal.jsonl"
+        self.jobs = max(1, jobs) if backend.parallel else 1
+        self.retries = retries
+        self.lock = threading.Lock()
+
+    def load_journal(self, key):
+        """Return {path: hash} of the uploads an interrupted deploy finished."""
+        if not self.backend.resumable:
+            return {}
+        try:
+            with open(self.journal_file, 'r') as f:
+                lines = [json.loads(line) for line in f if line.strip()]
+        except (OSError, ValueError):
+            return {}
+        if not lines or lines[0] != key:
+            return {}
+        return {entry["path"]: entry["hash"] for entry in lines[1:]}
+
+    def attempt(self, action, rel):
+        """Run one upload or delete, retrying transient (network and I/O) errors."""
+        for attempt in range(self.retries + 1):
+            try:
+                return action(rel)
+            except DeployError:
+                raise
+            except OSError as e:
+                if attempt == self.retries:
+                    raise
+                print(f"⚠️  Retrying {rel} ({e})")
+                time.sleep(RETRY_BACKOFF * 2 ** attempt)
+
+    def run_all(self, action, paths):
+        """Run action on every path through the worker pool; return the failures."""
+        failed = []
+        if self.jobs == 1:
+            for rel in paths:
+                try:
+                    self.attempt(action, rel)
+                except (DeployError, OSError) as e:
+                    failed.append((rel, e))
+            return failed
+        with ThreadPoolExecutor(max_workers=self.jobs) as pool:
+            futures = {pool.submit(self.attempt, action, rel): rel for rel in paths}
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                except (DeployError, OSError) as e:
+                    failed.append((futures[future], e))
+        return failed
+
+    def deploy(self, dry_run=False):
+        """Deploy the changes; return True when the target matches the tree."""
+        start = time.perf_counter()
+        local = self.scanner.scan(self.docs_dir, self.backend.list_files(self.docs_dir))
+        remote = self.backend.read_manifest()
+        key = {"target": self.backend.describe(),
+               "remote": hashlib.sha256(json.dumps(remote, sort_keys=True).encode('utf-8')).hexdigest()}
+        done = self.load_journal(key)
+
+        changed = sorted(rel for rel, digest in local.items() if remote.get(rel) != digest)
+        removed = sorted(rel for rel in remote if rel not in local)
+        uploads = [rel for rel in changed if done.get(rel) != local[rel]]
+        size = sum(os.path.getsize(self.docs_dir / rel) for rel in uploads)
+        print(f"📦 {len(changed)} changed, {len(removed)} removed, {len(local) - len(changed)} unchanged files "
+              f"→ {self.backend.describe()}")
+        if len(uploads) < len(changed):
+            print(f"⏯️  Resuming: {len(changed) - len(uploads)} upload(s) already done")
+        if not changed and not removed:
+            print("✅ Target is already up to date")
+            return True
+        if dry_run:
+            for rel in changed:
+                print(f"   + {rel}")
+            for rel in removed:
+                print(f"   - {rel}")
+            return True
+
+        journal = None
+        if self.backend.resumable:
+            if not done:
+                with open(self.journal_file, 'w') as f:
+                    f.write(json.dumps(key) + "\n")
+            journal = open(self.journal_file, 'a')
+
+        def upload(rel):
+            self.backend.upload(self.docs_dir, rel, local[rel])
+            if journal:
+                with self.lock:
+                    journal.write(json.dumps({"path": rel, "hash": local[rel]}) + "\n")
+                    journal.flush()
+
+        try:
+            assets = [rel for rel in uploads if not rel.endswith(PAGE_SUFFIXES)]
+            pages = [rel for rel in uploads if rel.endswith(PAGE_SUFFIXES)]
+            failed = self.run_all(upload, assets)
+            if not failed:
+                failed = self.run_all(upload, pages)
+            if not failed:
+                failed = self.run_all(self.backend.delete, removed)
+        finally:
+            if journal:
+                journal.close()
+
+        if failed:
+            for rel, error in failed[:10]:
+                print(f"❌ {rel}: {error}")
+            print(f"❌ {len(failed)} file(s) failed; run the deploy again to resume")
+            return False
+        try:
+            self.attempt(lambda _: self.backend.finish(local), MANIFEST_NAME)
+        except OSError as e:
+            print(f"❌ {MANIFEST_NAME}: {e}; run the deploy again to finish")
+            return False
+        self.journal_file.unlink(missing_ok=True)
+        print(f"✅ Uploaded {len(uploads)} file(s) ({size / 1024:.1f} KB) and removed {len(removed)} "
+              f"in {time.perf_counter() - start:.2f}s")
+        return True
@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+Declarative content schema for the website builder.
+
+src/data/schema.json lists the site's pages, the collections in content.json
+(services, papers, stats) and how each Markdown file binds onto them, e.g.
+"# Service 3: ..." headings onto services.items[2]. The schema is validated
+once and compiled into per-file binding plans: flat lists of (section,
+target) operations cached in .build-cache/schema.json by schema and Markdown
+hash, so an unchanged file is bound without matching a single heading.
+"""
+import hashlib
+import json
+import re
+from collections.abc import Sequence
+from pathlib import Path
+
+SCHEMA_CACHE_VERSION = 1
+SECTION_FORMATS = ("inline", "text", "html")
+# Markdown pages without a generator of their own use this builder method
+DEFAULT_GENERATOR = "generate_markdown_page_html"
+
+
+class SchemaError(ValueError):
+    """The schema, or content it describes, is invalid."""
+
+    def __init__(self, problems):
+        super().__init__('\n'.join(problems))
+        self.problems = problems
+
+
+def resolve(content, path, create=False):
+    """Return the value at a dotted path such as "research.papers"."""
+    value = content
+    for key in path.split("."):
+        if create and isinstance(value, dict):
+            value = value.setdefault(key, {})
+        else:
+            value = value[key]
+    return value
+
+
+class ContentSchema:
+    """A validated schema and its compiled Markdown binding plans."""
+
+    def __init__(self, schema_file, cache_dir, generators=()):
+        self.schema_file = Path(schema_file)
+        self.cache_file = Path(cache_dir) / "schema.json"
+        data = self.schema_file.read_bytes()
+        self.hash = hashlib.sha256(data).hexdigest()
+        try:
+            self.schema = json.loads(data)
+        except ValueError as e:
+            raise SchemaError([f"{self.schema_file} is not valid JSON: {e}"])
+        self.plans = self.load_plans()
+        self.changed = self.plans is None
+        if self.plans is None:
+            # Only a schema that changed since the last build is re-validated
+            self.validate(generators)
+            self.plans = {}
+        self.pages = self.schema["pages"]
+        self.collections = self.schema.get("collections", {})
+        self.sources = self.schema.get("sources", {})
+        self.nav_links = {page: spec["nav"] for page, spec in self.pages.items() if spec.get("nav")}
+        self.headings = {
+            name: re.compile(source["items"]["heading"])
+            for name, source in self.sources.items() if "items" in source
+        }
+
+    def load_plans(self):
+        """Return cached binding plans for this schema, or None."""
+        try:
+            with open(self.cache_file, 'r') as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if cache.get("version") != SCHEMA_CACHE_VERSION or cache.get("schema") != self.hash:
+            return None
+        return cache.get("plans", {})
+
+    def save(self):
+        """Persist the binding plans for the next build, if any changed."""
+        if not self.changed:
+            return
+        self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.cache_file, 'w') as f:
+            json.dump({"version": SCHEMA_CACHE_VERSION, "schema": self.hash, "plans": self.plans}, f)
+        self.changed = False
+
+    def validate(self, generators):
+        """Check the schema's structure; raise SchemaError listing every problem.
+
+        generators is the set of page generator methods the builder offers.
+        """
+        problems = []
+        schema = self.schema
+        for key in schema:
+            if key not in ("pages", "collections", "sources"):
+                problems.append(f"unknown top-level key \"{key}\"")
+        pages = schema.get("pages")
+        if not isinstance(pages, dict) or not pages:
+            problems.append("\"pages\" must map page names to page definitions")
+            pages = {}
+        collections = schema.get("collections", {})
+        sources = schema.get("sources", {})
+
+        for page, spec in pages.items():
+            generator = spec.get("generator", DEFAULT_GENERATOR)
+            if generators and generator not in generators:
+                problems.append(f"page \"{page}\": unknown generator \"{generator}\"")
+            for md_name in spec.get("md", []):
+                if md_name not in sources:
+                    problems.append(f"page \"{page}\": Markdown file \"{md_name}\" has no entry in \"sources\"")
+            if "generator" not in spec:
+                md = spec.get("md", [])
+                if len(md) != 1:
+                    problems.append(f"page \"{page}\": a Markdown page needs exactly one \"md\" file")
+                elif sources.get(md[0], {}).get("key", page) != page:
+                    problems.append(f"page \"{page}\": its Markdown file must fill the \"{page}\" key")
+            if spec.get("paginate", "papers") != "papers":
+                problems.append(f"page \"{page}\": only the \"papers\" collection can be paginated")
+            if not all(isinstance(key, str) for key in spec.get("keys", [])):
+                problems.append(f"page \"{page}\": \"keys\" must be a list of content.json keys")
+
+        for name, spec in collections.items():
+            if not isinstance(spec.get("path"), str):
+                problems.append(f"collection \"{name}\": \"path\" must be a dotted content.json path")
+            if not isinstance(spec.get("required", []), list):
+                problems.append(f"collection \"{name}\": \"required\" must be a list of field names")
+            for facet, facet_spec in spec.get("facets", {}).items():
+                if not re.fullmatch(r'[a-z0-9-]+', facet):
+                    problems.append(f"collection \"{name}\": facet name \"{facet}\" must be a lowercase URL slug")
+                if not isinstance(facet_spec.get("field"), str) or not isinstance(facet_spec.get("label"), str):
+                    problems.append(f"collection \"{name}\": facet \"{facet}\" needs a \"field\" and a \"label\"")
+            if spec.get("facets") and name != "papers":
+                problems.append(f"collection \"{name}\": only the \"papers\" collection can have facets")
+
+        for md_name, source in sources.items():
+            where = f"source \"{md_name}\""
+            if not isinstance(source.get("key"), str):
+                problems.append(f"{where}: \"key\" must name the content.json key it fills")
+            for field, section in source.get("fields", {}).items():
+                if not isinstance(section, str):
+                    problems.append(f"{where}: field \"{field}\" must name a \"# \" section")
+            items = source.get("items")
+            if items is None:
+                continue
+            collection = collections.get(items.get("collection"))
+            if collection is None:
+                problems.append(f"{where}: unknown collection \"{items.get('collection')}\"")
+                continue
+            try:
+                heading = re.compile(items.get("heading", ""))
+            except re.error as e:
+                problems.append(f"{where}: invalid heading pattern: {e}")
+                continue
+            if "index" not in heading.groupindex:
+                problems.append(f"{where}: heading pattern needs an (?P<index>...) group")
+            for field, section_format in items.get("fields", {}).items():
+                if section_format not in SECTION_FORMATS:
+                    problems.append(f"{where}: field \"{field}\" format must be one of {', '.join(SECTION_FORMATS)}")
+            # Items created from Markdown alone must still be complete
+            provided = set(collection.get("defaults", {})) | set(items.get("fields", {}))
+            if "title" in heading.groupindex:
+                provided.add("title")
+            missing = [field for field in collection.get("required", []) if field not in provided]
+            if missing:
+                problems.append(f"{where}: items added from Markdown would lack {', '.join(missing)}; "
+                                f"add them to the \"{items['collection']}\" collection's \"defaults\"")
+        if problems:
+            raise SchemaError(problems)
+
+    def validate_content(self, content):
+        """Check every collection in content.json; raise SchemaError listing every problem."""
+        problems = []
+        for name, spec in self.collections.items():
+            try:
+                items = resolve(content, spec["path"])
+            except (KeyError, TypeError):
+                problems.append(f"collection \"{name}\": content.json has no \"{spec['path']}\"")
+                continue
+            # Streaming builds hold papers as a read-only sequence backed by a spool file
+            if not isinstance(items, Sequence) or isinstance(items, str):
+                problems.append(f"collection \"{name}\": \"{spec['path']}\" must be a list")
+                continue
+            required = spec.get("required", [])
+            for index, item in enumerate(items):
+                missing = [field for field in required if field not in item]
+                if missing:
+                    label = item.get("title", f"#{index + 1}") if isinstance(item, dict) else f"#{index + 1}"
+                    problems.append(f"{name} item {label}: missing {', '.join(missing)}")
+        if problems:
+            raise SchemaError(problems)
+
+    def page_inputs(self, page):
+        """Return (content.json keys, Markdown files) a page reads."""
+        spec = self.pages[page]
+        return spec.get("keys", []), spec.get("md", [])
+
+    def page_task(self, page):
+        """Return the (generator method name, args) that renders a page."""
+        spec = self.pages[page]
+        if "generator" in spec:
+            return spec["generator"], ()
+        return DEFAULT_GENERATOR, (page,)
+
+    def plan(self, md_name, document, md_hash):
+        """Compile the operations binding one Markdown file onto content."""
+        cached = self.plans.get(md_name)
+        if cached and cached["hash"] == md_hash:
+            return cached["operations"]
+
+        source = self.sources[md_name]
+        key = source["key"]
+        bound = set()
+        operations = []
+        for field, section in source.get("fields", {}).items():
+            if section in document.sections:
+                operations.append({"path": key, "field": field, "section": section, "format": "inline"})
+                bound.add(section)
+
+        items = source.get("items")
+        if items:
+            heading = self.headings[md_name]
+            collection = self.collections[items["collection"]]
+            for section in document.sections:
+                match = heading.match(section) if section else None
+                if not match:
+                    continue
+                bound.add(section)
+                operations.append({
+                    "path": collection["path"],
+                    "index": int(match.group("index")) - 1,
+                    "title": match.groupdict().get("title"),
+                    "section": section,
+                    "fields": items.get("fields", {}),
+                })
+
+        if "document" in source:
+            operations.append({"path": key, "field": source["document"], "exclude": sorted(bound)})
+
+        self.plans[md_name] = {"hash": md_hash, "operations": operations}
+        self.changed = True
+        return operations
+
+    def bind(self, md_name, document, md_hash, content):
+        """Merge one parsed Markdown file into content, as the schema describes.
+
+        Collection items past the end of the content.json list are created
+        from the collection's defaults, in heading order.
+        """
+        operations = self.plan(md_name, document, md_hash)
+        problems = []
+        for operation in sorted(operations, key=lambda op: op.get("index", -1)):
+            if "index" not in operation:
+                target = resolve(content, operation["path"], create=True)
+                if "exclude" in operation:
+                    target[operation["field"]] = document.document_html(exclude=operation["exclude"])
+                else:
+                    target[operation["field"]] = document.inline(operation["section"])
+                continue
+
+            items = resolve(content, operation["path"])
+            index = operation["index"]
+            if index == len(items):
+                name = self.sources[md_name]["items"]["collection"]
+                item = dict(self.collections[name].get("defaults", {}))
+                if operation["title"]:
+                    item["title"] = operation["title"]
+                items.append(item)
+            elif not 0 <= index < len(items):
+                problems.append(f"{md_name}: \"# {operation['section']}\" is item {index + 1}, "
+                                f"but there are only {len(items)}")
+                continue
+            for field, section_format in operation["fields"].items():
+                items[index][field] = getattr(document, section_format)(operation["section"])
+        if problems:
+            raise SchemaError(problems)
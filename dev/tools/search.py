@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+Prebuilt client-side search index for the research papers.
+
+Paper fields are tokenised, lightly stemmed and written as an inverted index
+to docs/search/: a small index.json listing the shards, compact JSON shards
+each holding a sorted range of terms, the result cards in chunks of papers,
+and the facet indexes (the papers of each category and year) that the
+research page filters intersect.
+Shards and chunks are named by content hash, so browsers cache them forever
+and the search widget (docs/scripts/modules/search.js) fetches only the ones
+a query needs. The stemmer in search.js must stay in step with stem() here.
+"""
+import base64
+import hashlib
+import json
+import os
+import re
+import unicodedata
+from collections import Counter
+from functools import lru_cache
+from pathlib import Path
+
+SEARCH_DIR = "search"
+INDEX_NAME = "index.json"
+SEARCH_INDEX_VERSION = 1
+# Score of one occurrence of a term in each field
+FIELD_WEIGHTS = {"title": 5, "categories": 4, "authors": 3, "journal": 2, "year": 2, "abstract": 1}
+# Approximate size of one shard of terms; a query fetches one per word,
+# or a few when the word being typed is a prefix spanning shards
+SHARD_BYTES = 16 * 1024
+DOCS_PER_CHUNK = 100
+STOPWORDS = sorted({
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "in", "into", "is", "it",
+    "its", "of", "on", "or", "that", "the", "their", "this", "to", "was", "were", "which", "with",
+})
+
+STOPWORD_SET = frozenset(STOPWORDS)
+
+TOKEN = re.compile(r'[^\W_]+')
+COMBINING = re.compile('[\u0300-\u036f]')
+INFLECTIONS = ("ing", "ed")
+# Longest suffixes first; the stem must keep at least three characters
+SUFFIXES = (("ational", "at"), ("ization", "iz"), ("ation", "at"), ("ition", "it"),
+            ("ness", ""), ("ment", ""), ("ing", ""), ("ed", ""), ("ly", ""))
+
+
+def normalize(text):
+    """Lowercase text and strip accents, as search.js does."""
+    return COMBINING.sub('', unicodedata.normalize('NFKD', text.lower()))
+
+
+@lru_cache(maxsize=65536)
+def stem(word):
+    """Reduce a word to a crude stem, so "modelling" and "models" both match "model"."""
+    if len(word) <= 3 or word.isdigit():
+        return word
+    if word.endswith("sses"):
+        word = word[:-2]
+    elif word.endswith("ies"):
+        word = word[:-3] + "y"
+    elif word.endswith("s") and not word.endswith(("ss", "us", "is")):
+        word = word[:-1]
+    for suffix, replacement in SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            word = word[:-len(suffix)] + replacement
+            # "modell(ing)" -> "model", but keep "-ss" and "-zz"
+            if suffix in INFLECTIONS and word[-1] == word[-2] and word[-1] not in "aeiousz":
+                word = word[:-1]
+            break
+    if len(word) > 4 and word.endswith("e"):
+        word = word[:-1]
+    return word
+
+
+def encode_ids(ids, count):
+    """Encode ascending doc ids as deltas, or as a base64 bitset when that's smaller.
+
+    Bit i of the bitset is bit (i % 8) of byte (i // 8).
+    """
+    size = (count + 7) // 8
+    # A delta costs about three bytes of JSON; the bitset costs 4/3 of its bytes
+    if len(ids) * 3 < size * 4 // 3:
+        return [doc_id - previous for previous, doc_id in zip([0] + ids, ids)]
+    bits = bytearray(size)
+    for doc_id in ids:
+        bits[doc_id >> 3] |= 1 << (doc_id & 7)
+    return base64.b64encode(bytes(bits)).decode('ascii')
+
+
+def tokenize(text):
+    """Split text into the stemmed terms the index stores."""
+    return [stem(token) for token in TOKEN.findall(normalize(text)) if token not in STOPWORD_SET]
+
+
+class SearchIndexer:
+    """Writes the sharded search index of a list of papers."""
+
+    def __init__(self, output_dir, cache_dir):
+        self.output_dir = Path(output_dir)
+        self.search_dir = self.output_dir / SEARCH_DIR
+        self.index_file = self.search_dir / INDEX_NAME
+        self.cache_file = Path(cache_dir) / "search.json"
+
+    def field_text(self, paper, field):
+        value = paper.get(field, "")
+        return ' '.join(value) if isinstance(value, list) else str(value)
+
+    def source_hash(self, papers, url_for, facets):
+        """Hash everything the index is built from, one paper at a time."""
+        digest = hashlib.sha256(json.dumps(
+            [SEARCH_INDEX_VERSION, FIELD_WEIGHTS, SHARD_BYTES, DOCS_PER_CHUNK, facets], sort_keys=True).encode('utf-8'))
+        for paper in papers:
+            digest.update(json.dumps([paper, url_for(paper)], sort_keys=True).encode('utf-8'))
+        return digest.hexdigest()
+
+    def index(self, papers):
+        """Return {term: [(doc id, score), ...]} over the weighted fields."""
+        postings = {}
+        for doc_id, paper in enumerate(papers):
+            scores = Counter()
+            for field, weight in FIELD_WEIGHTS.items():
+                for term, count in Counter(tokenize(self.field_text(paper, field))).items():
+                    scores[term] += count * weight
+            for term, score in scores.items():
+                postings.setdefault(term, []).append((doc_id, score))
+        return postings
+
+    def write_json(self, name, value, hashed=True):
+        """Write a compact JSON file under search/, named by hash unless hashed is False."""
+        data = json.dumps(value, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+        if hashed:
+            base, ext = os.path.splitext(name)
+            name = f"{base}.{hashlib.sha256(data).hexdigest()[:12]}{ext}"
+        path = self.search_dir / name
+        try:
+            if path.read_bytes() == data:
+                return name
+        except OSError:
+            pass
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+        return name
+
+    def build(self, papers, url_for, facets=None):
+        """Write the index of papers unless it's unchanged.
+
+        papers is any sequence, such as a stream.SpooledList; url_for maps a
+        paper to its page URL. facets maps facet names to {value: ascending
+        paper ids}. Returns the number of files under search/ or None when
+        skipped.
+        """
+        facets = facets or {}
+        source_hash = self.source_hash(papers, url_for, facets)
+        try:
+            with open(self.cache_file, 'r') as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            cache = {}
+        if cache.get("hash") == source_hash and all((self.search_dir / name).exists() for name in cache["files"]):
+            return None
+
+        self.search_dir.mkdir(parents=True, exist_ok=True)
+        # Split the sorted terms into ranges of about SHARD_BYTES each
+        shards = []
+        size = SHARD_BYTES
+        for term, postings in sorted(self.index(papers).items()):
+            # Doc ids ascend, so store them as deltas: [delta, score, delta, score, ...]
+            flat = []
+            previous = 0
+            for doc_id, score in postings:
+                flat += [doc_id - previous, score]
+                previous = doc_id
+            if size >= SHARD_BYTES:
+                shards.append((term, {}))
+                size = 0
+            shards[-1][1][term] = flat
+            size += len(term) + 4 * len(flat)
+
+        # Each shard is listed by its first term, in order
+        files = [[first, self.write_json(f"terms-{i}.json", terms)] for i, (first, terms) in enumerate(shards)]
+        chunks = []
+        for start in range(0, len(papers), DOCS_PER_CHUNK):
+            chunk = [
+                [paper["title"], url_for(paper), paper.get("authors", ""), paper.get("journal", ""),
+                 str(paper.get("year", ""))]
+                for paper in papers[start:start + DOCS_PER_CHUNK]
+            ]
+            chunks.append(self.write_json(f"docs-{start // DOCS_PER_CHUNK}.json", chunk))
+        facet_file = self.write_json("facets.json", {
+            facet: {value: encode_ids(ids, len(papers)) for value, ids in values.items()}
+            for facet, values in facets.items()
+        })
+        index = self.write_json(INDEX_NAME, {
+            "version": SEARCH_INDEX_VERSION,
+            "count": len(papers),
+            "chunk": DOCS_PER_CHUNK,
+            "stopwords": STOPWORDS,
+            "shards": files,
+            "docs": chunks,
+            "facets": facet_file,
+        }, hashed=False)
+
+        # Drop shards and chunks from previous indexes
+        keep = {index, facet_file, *(name for _, name in files), *chunks}
+        for path in self.search_dir.iterdir():
+            if path.name not in keep and path.suffix in (".json", ".tmp"):
+                path.unlink()
+
+        self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.cache_file, 'w') as f:
+            json.dump({"hash": source_hash, "files": sorted(keep)}, f)
+        return len(keep)
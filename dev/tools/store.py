@@ -0,0 +1,400 @@
+#!/usr/bin/env python3
+"""
+SQLite content store for the website builder (--store builds).
+
+content.json and the parsed sections of each Markdown file are imported into
+.build-cache/content.db. Papers get one row each, keyed by slug, with
+indexes on DOI, year and position, plus a row per facet value (category,
+year) so facet listings are a single indexed query. Imports only run when
+content.json, a Markdown file or the facet schema changed, and then only
+rewrite the rows that differ. Every import that changes anything opens a
+new revision; each row records the revision that last changed it and
+removals are logged, so changes_since(N) answers what changed since build
+N without comparing content. content.json stays the source of truth and
+can be exported back from the store:
+
+    cd dev && python tools/store.py export content.json
+    cd dev && python tools/store.py changes --since 3
+    cd dev && python tools/store.py papers --category CFD --year 2021
+"""
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import time
+from collections.abc import Sequence
+from pathlib import Path
+
+STORE_VERSION = 1
+DEFAULT_DB = Path(".build-cache/content.db")
+
+TABLES = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS revisions (id INTEGER PRIMARY KEY, created REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS documents (
+    key TEXT PRIMARY KEY, position INTEGER NOT NULL, value TEXT NOT NULL,
+    hash TEXT NOT NULL, revision INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS papers (
+    slug TEXT PRIMARY KEY, position INTEGER NOT NULL UNIQUE, doi TEXT, year TEXT, value TEXT NOT NULL,
+    hash TEXT NOT NULL, revision INTEGER NOT NULL);
+CREATE INDEX IF NOT EXISTS papers_doi ON papers (doi);
+CREATE INDEX IF NOT EXISTS papers_year ON papers (year);
+CREATE TABLE IF NOT EXISTS paper_facets (
+    facet TEXT NOT NULL, value TEXT NOT NULL, slug TEXT NOT NULL, rank INTEGER NOT NULL,
+    PRIMARY KEY (facet, value, slug)) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS paper_facets_slug ON paper_facets (slug);
+CREATE TABLE IF NOT EXISTS markdown (file TEXT PRIMARY KEY, hash TEXT NOT NULL, revision INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS sections (
+    file TEXT NOT NULL, position INTEGER NOT NULL, heading TEXT NOT NULL, text TEXT NOT NULL, html TEXT NOT NULL,
+    PRIMARY KEY (file, position)) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS removals (kind TEXT NOT NULL, key TEXT NOT NULL, revision INTEGER NOT NULL);
+CREATE INDEX IF NOT EXISTS removals_revision ON removals (revision);
+"""
+
+
+def hash_text(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def dump(value):
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+
+
+class ContentStore:
+    """A SQLite database of the site's content, with per-row change tracking.
+
+    Imports stay in one transaction until commit(). Pickles as its path;
+    each process opens its own connection.
+    """
+
+    def __init__(self, db_file, papers_path="research.papers"):
+        self.db_file = Path(db_file)
+        self.papers_path = papers_path
+        self._db = None
+        self._pid = None
+        self.revision_open = None
+
+    def __getstate__(self):
+        return {"db_file": self.db_file, "papers_path": self.papers_path}
+
+    def __setstate__(self, state):
+        self.__init__(state["db_file"], state["papers_path"])
+
+    @property
+    def db(self):
+        """The connection of this process, creating the tables on first use."""
+        if self._pid != os.getpid():
+            self.db_file.parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(self.db_file)
+            self._pid = os.getpid()
+            try:
+                row = self._db.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+            except sqlite3.OperationalError:
+                row = None
+            if not row or row[0] != str(STORE_VERSION):
+                self.reset()
+        return self._db
+
+    def reset(self):
+        """Drop every table and start from an empty store."""
+        db = self._db
+        tables = [row[0] for row in db.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+        for table in tables:
+            db.execute(f"DROP TABLE {table}")
+        db.executescript(TABLES)
+        db.execute("INSERT INTO meta VALUES ('version', ?)", (str(STORE_VERSION),))
+        db.commit()
+
+    def meta(self, key, default=None):
+        row = self.db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def set_meta(self, key, value):
+        self.db.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, value))
+
+    @property
+    def revision(self):
+        """The latest revision, 0 for an empty store."""
+        return self.db.execute("SELECT COALESCE(MAX(id), 0) FROM revisions").fetchone()[0]
+
+    def begin_revision(self):
+        """Return the id for rows changed by the current import, opening a revision on first use."""
+        if self.revision_open is None:
+            cursor = self.db.execute("INSERT INTO revisions (created) VALUES (?)", (time.time(),))
+            self.revision_open = cursor.lastrowid
+        return self.revision_open
+
+    def commit(self):
+        """Commit the current import, as one revision if it changed anything."""
+        self.db.commit()
+        self.revision_open = None
+
+    # Importing
+
+    def import_content(self, content_file, facets, slug_for):
+        """Import content.json unless it, or the facet fields, are unchanged since the last import.
+
+        facets maps facet names to the paper field they index, e.g. {"year":
+        "year"}. slug_for(paper) returns the slug of each paper in order, and
+        may add it to the paper. Returns the number of rows that changed.
+        """
+        data = Path(content_file).read_bytes()
+        source = hashlib.sha256(data + dump(facets).encode('utf-8')).hexdigest()
+        if self.meta("content") == source:
+            return 0
+        content = json.loads(data)
+        changed = self.import_documents(content) + self.import_papers(content, facets, slug_for)
+        self.set_meta("content", source)
+        return changed
+
+    def import_documents(self, content):
+        """Store each top-level key of content; the papers list is left as null in its parent."""
+        parent, _, field = self.papers_path.rpartition(".")
+        keys = list(content)
+        existing = dict(self.db.execute("SELECT key, hash FROM documents"))
+        changed = 0
+        for position, key in enumerate(keys):
+            value = content[key]
+            if key == parent and isinstance(value, dict) and field in value:
+                value = {**value, field: None}
+            text = dump(value)
+            digest = hash_text(f"{position}:{text}")
+            if existing.get(key) != digest:
+                self.db.execute("INSERT OR REPLACE INTO documents VALUES (?, ?, ?, ?, ?)",
+                                (key, position, text, digest, self.begin_revision()))
+                changed += 1
+        for key in set(existing) - set(keys):
+            self.remove("documents", "key", key)
+            changed += 1
+        return changed
+
+    def import_papers(self, content, facets, slug_for):
+        """Upsert the papers whose JSON, position or facet values changed; delete the rest."""
+        try:
+            parent, _, field = self.papers_path.rpartition(".")
+            papers = content[parent][field]
+        except (KeyError, TypeError):
+            papers = []
+        facets_changed = self.meta("facets") != dump(facets)
+        if facets_changed:
+            self.db.execute("DELETE FROM paper_facets")
+            self.set_meta("facets", dump(facets))
+        existing = {slug: (position, digest)
+                    for slug, position, digest in self.db.execute("SELECT slug, position, hash FROM papers")}
+        # Positions are unique; park moved rows out of the way before renumbering
+        self.db.execute("UPDATE papers SET position = -1 - position")
+
+        changed = 0
+        slugs = set()
+        for position, paper in enumerate(papers):
+            text = dump(paper)
+            slug = slug_for(paper)
+            slugs.add(slug)
+            digest = hash_text(text)
+            previous = existing.get(slug)
+            if previous == (position, digest) and not facets_changed:
+                self.db.execute("UPDATE papers SET position = ? WHERE slug = ?", (position, slug))
+                continue
+            self.db.execute("INSERT OR REPLACE INTO papers VALUES (?, ?, ?, ?, ?, ?, ?)", (
+                slug, position, paper.get("doi"), str(paper.get("year", "")), text, digest, self.begin_revision()))
+            self.db.execute("DELETE FROM paper_facets WHERE slug = ?", (slug,))
+            for facet, facet_field in facets.items():
+                values = paper.get(facet_field, [])
+                values = values if isinstance(values, list) else [values]
+                self.db.executemany("INSERT OR IGNORE INTO paper_facets VALUES (?, ?, ?, ?)", [
+                    (facet, str(value), slug, rank) for rank, value in enumerate(dict.fromkeys(values))])
+            changed += 1
+        for slug in set(existing) - slugs:
+            self.db.execute("DELETE FROM paper_facets WHERE slug = ?", (slug,))
+            self.remove("papers", "slug", slug)
+            changed += 1
+        return changed
+
+    def import_markdown(self, name, digest, sections):
+        """Store the parsed sections of a Markdown file unless its hash is unchanged."""
+        row = self.db.execute("SELECT hash FROM markdown WHERE file = ?", (name,)).fetchone()
+        if row and row[0] == digest:
+            return False
+        self.db.execute("DELETE FROM sections WHERE file = ?", (name,))
+        self.db.executemany("INSERT INTO sections VALUES (?, ?, ?, ?, ?)", [
+            (name, position, heading, section["text"], section["html"])
+            for position, (heading, section) in enumerate(sections.items())])
+        self.db.execute("INSERT OR REPLACE INTO markdown VALUES (?, ?, ?)", (name, digest, self.begin_revision()))
+        return True
+
+    def forget_markdown(self, name):
+        """Drop a Markdown file that no longer exists."""
+        if self.markdown_hash(name) is not None:
+            self.db.execute("DELETE FROM sections WHERE file = ?", (name,))
+            self.remove("markdown", "file", name)
+
+    def remove(self, table, column, key):
+        self.db.execute(f"DELETE FROM {table} WHERE {column} = ?", (key,))
+        self.db.execute("INSERT INTO removals VALUES (?, ?, ?)", (table, key, self.begin_revision()))
+
+    # Reading
+
+    def content(self):
+        """The stored content.json, with the papers as a StoredPapers sequence."""
+        content = {key: json.loads(value)
+                   for key, value in self.db.execute("SELECT key, value FROM documents ORDER BY position")}
+        parent, _, field = self.papers_path.rpartition(".")
+        if isinstance(content.get(parent), dict) and field in content[parent]:
+            content[parent][field] = StoredPapers(self)
+        return content
+
+    def markdown_hash(self, name):
+        row = self.db.execute("SELECT hash FROM markdown WHERE file = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def sections(self, name):
+        """The parsed sections of a Markdown file, as MarkdownDocument takes them."""
+        return {heading: {"text": text, "html": html} for heading, text, html in self.db.execute(
+            "SELECT heading, text, html FROM sections WHERE file = ? ORDER BY position", (name,))}
+
+    def facet_ids(self, facet):
+        """Return {value: ascending paper positions}, values in order of first appearance."""
+        ids = {}
+        for value, position in self.db.execute(
+                "SELECT f.value, p.position FROM paper_facets f JOIN papers p ON p.slug = f.slug "
+                "WHERE f.facet = ? ORDER BY p.position, f.rank", (facet,)):
+            ids.setdefault(value, []).append(position)
+        return ids
+
+    def find_papers(self, doi=None, year=None, facets=()):
+        """Papers matching every given condition, in content order; facets are (facet, value) pairs."""
+        query = ["SELECT p.slug, p.value FROM papers p"]
+        conditions = []
+        params = []
+        for i, (facet, value) in enumerate(facets):
+            query.append(f"JOIN paper_facets f{i} ON f{i}.slug = p.slug AND f{i}.facet = ? AND f{i}.value = ?")
+            params += [facet, str(value)]
+        if doi is not None:
+            conditions.append("p.doi = ?")
+            params.append(doi)
+        if year is not None:
+            conditions.append("p.year = ?")
+            params.append(str(year))
+        if conditions:
+            query.append("WHERE " + " AND ".join(conditions))
+        query.append("ORDER BY p.position")
+        return [{**json.loads(value), "slug": slug} for slug, value in self.db.execute(' '.join(query), params)]
+
+    def changes_since(self, revision):
+        """What changed after a revision: {"documents", "papers", "markdown", "removed"}."""
+        changes = {}
+        for kind, table, column in (("documents", "documents", "key"), ("papers", "papers", "slug"),
+                                    ("markdown", "markdown", "file")):
+            changes[kind] = [row[0] for row in self.db.execute(
+                f"SELECT {column} FROM {table} WHERE revision > ? ORDER BY {column}", (revision,))]
+        changes["removed"] = [f"{kind}:{key}" for kind, key in self.db.execute(
+            "SELECT kind, key FROM removals WHERE revision > ? ORDER BY revision, key", (revision,))]
+        return changes
+
+    def export(self):
+        """The stored content as a plain dict, in content.json's shape (computed slugs left out)."""
+        content = self.content()
+        parent, _, field = self.papers_path.rpartition(".")
+        if isinstance(content.get(parent), dict) and isinstance(content[parent].get(field), StoredPapers):
+            content[parent][field] = [json.loads(value) for value, in self.db.execute(
+                "SELECT value FROM papers ORDER BY position")]
+        return content
+
+
+class StoredPapers(Sequence):
+    """The papers of a ContentStore as a read-only list, queried on access.
+
+    Decoded papers are kept per process, as pages, listings and facets read
+    the same papers many times in a build. Pickles as its store alone.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.count = None
+        self.rows = {}
+
+    def __len__(self):
+        if self.count is None:
+            self.count = self.store.db.execute("SELECT COUNT(*) FROM papers").fetchone()[0]
+        return self.count
+
+    def row(self, position, slug, value):
+        paper = self.rows.get(position)
+        if paper is None:
+            paper = self.rows[position] = json.loads(value)
+            paper["slug"] = slug
+        return paper
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                return [self[i] for i in range(start, stop, step)]
+            if all(i in self.rows for i in range(start, stop)):
+                return [self.rows[i] for i in range(start, stop)]
+            return [self.row(*row) for row in self.store.db.execute(
+                "SELECT position, slug, value FROM papers WHERE position >= ? AND position < ? ORDER BY position",
+                (start, stop))]
+        if index < 0:
+            index += len(self)
+        if index in self.rows:
+            return self.rows[index]
+        row = self.store.db.execute(
+            "SELECT position, slug, value FROM papers WHERE position = ?", (index,)).fetchone()
+        if row is None:
+            raise IndexError("stored paper index out of range")
+        return self.row(*row)
+
+    def __iter__(self):
+        if len(self.rows) == len(self):
+            yield from (self.rows[i] for i in range(len(self)))
+            return
+        for row in self.store.db.execute("SELECT position, slug, value FROM papers ORDER BY position"):
+            yield self.row(*row)
+
+    def __getstate__(self):
+        return {"store": self.store, "count": self.count}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.rows = {}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query or export the content store of --store builds.")
+    parser.add_argument("--db", type=Path, default=DEFAULT_DB, help=f"store file (default: {DEFAULT_DB})")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export = commands.add_parser("export", help="write the stored content as content.json")
+    export.add_argument("output", nargs="?", help="output file (default: standard output)")
+    changes = commands.add_parser("changes", help="list what changed after a revision")
+    changes.add_argument("--since", type=int, default=0, help="revision to compare with (default: 0, everything)")
+    papers = commands.add_parser("papers", help="list papers by DOI, year or category")
+    papers.add_argument("--doi")
+    papers.add_argument("--year")
+    papers.add_argument("--category", action="append", default=[], help="repeatable; papers must have every one")
+    args = parser.parse_args()
+
+    if not args.db.exists():
+        print(f"Error: no content store at {args.db}; build with --store first")
+        exit(1)
+    store = ContentStore(args.db)
+    if args.command == "export":
+        text = json.dumps(store.export(), indent=2, ensure_ascii=False) + "\n"
+        if args.output:
+            Path(args.output).write_text(text, encoding='utf-8')
+            print(f"📤 Exported revision {store.revision} to {args.output}")
+        else:
+            sys.stdout.write(text)
+    elif args.command == "changes":
+        print(f"🗄️  Revision {store.revision}; changed since revision {args.since}:")
+        for kind, keys in store.changes_since(args.since).items():
+            print(f"   {kind}: {', '.join(keys) if keys else 'none'}")
+    else:
+        for paper in store.find_papers(args.doi, args.year, [("category", c) for c in args.category]):
+            print(f"{paper['year']}  {paper['slug']}  {paper['title']}")
+
+
+if __name__ == "__main__":
+    main()
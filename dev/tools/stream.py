@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Streaming reads of a large collection in content.json, for --stream builds.
+
+load_streaming() reads content.json in chunks and never holds the array at
+one dotted path (research.papers) in memory: each item is decoded on its
+own, handed to a callback (which assigns its slug) and appended to a spool
+file as one JSON line. The rest of the document is loaded as usual. The
+array's place in the returned content is taken by a SpooledList, a
+read-only sequence that decodes items from the spool on access, so code
+that indexes, slices or iterates the papers works unchanged, in any
+process. Only one byte offset per item stays in memory.
+"""
+import json
+import os
+import re
+from array import array
+from collections.abc import Sequence
+
+CHUNK_SIZE = 64 * 1024
+WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+
+class JSONStream:
+    """Incremental reader of one JSON document from a text file."""
+
+    def __init__(self, f, name):
+        self.f = f
+        self.name = name
+        self.buffer = ""
+        self.pos = 0
+        self.consumed = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def fill(self, size=CHUNK_SIZE):
+        """Drop the consumed part of the buffer and read more; return False at the end of the file."""
+        self.consumed += self.pos
+        self.buffer = self.buffer[self.pos:]
+        self.pos = 0
+        data = self.f.read(max(size, CHUNK_SIZE))
+        if not data:
+            self.eof = True
+        self.buffer += data
+        return bool(data)
+
+    def error(self, message, pos=None):
+        return ValueError(f"{self.name}: {message} at character {self.consumed + (self.pos if pos is None else pos)}")
+
+    def peek(self):
+        """Return the next non-whitespace character, or "" at the end of the file."""
+        while True:
+            self.pos = WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.fill():
+                return ""
+
+    def expect(self, chars):
+        """Consume one of chars as the next token and return it."""
+        char = self.peek()
+        if not char or char not in chars:
+            raise self.error(f"expected {' or '.join(repr(c) for c in chars)}")
+        self.pos += 1
+        return char
+
+    def value(self):
+        """Decode the next complete value."""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+                # A number ending with the buffer may go on in the next chunk
+                if end < len(self.buffer) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError as e:
+                if self.eof:
+                    raise self.error(e.msg, e.pos) from None
+            # Grow the buffer geometrically, so a large value is decoded a few times at most
+            self.fill(len(self.buffer))
+
+
+class SpoolWriter:
+    """Appends items to a JSON Lines spool file, recording where each starts."""
+
+    def __init__(self, path):
+        self.path = path
+        self.offsets = array('q')
+        self.size = 0
+        self.file = None
+
+    def __enter__(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self.file = open(self.path, 'wb')
+        return self
+
+    def __exit__(self, *exc):
+        self.file.close()
+
+    def append(self, item):
+        data = json.dumps(item, ensure_ascii=False, separators=(',', ':')).encode('utf-8') + b'\n'
+        self.offsets.append(self.size)
+        self.file.write(data)
+        self.size += len(data)
+
+    def result(self):
+        return SpooledList(self.path, self.offsets)
+
+
+class SpooledList(Sequence):
+    """A read-only list of the items in a spool file, decoded on access.
+
+    Pickles as its path and offsets. Each process opens the file itself, as
+    forked render workers would otherwise share one file position.
+    """
+
+    def __init__(self, path, offsets):
+        self.path = str(path)
+        self.offsets = offsets
+        self.file = None
+        self.pid = None
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("spooled list index out of range")
+        if self.pid != os.getpid():
+            self.file = open(self.path, 'rb')
+            self.pid = os.getpid()
+        self.file.seek(self.offsets[index])
+        return json.loads(self.file.readline())
+
+    def __iter__(self):
+        # One sequential pass through the file, without seeking
+        with open(self.path, 'rb') as f:
+            for line in f:
+                yield json.loads(line)
+
+    def __getstate__(self):
+        return {"path": self.path, "offsets": self.offsets}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.file = None
+        self.pid = None
+
+
+def read_object(stream, keys, spool, on_item):
+    """Read an object; the value at keys (a path below it) is streamed into spool."""
+    stream.expect("{")
+    obj = {}
+    if stream.peek() == "}":
+        stream.pos += 1
+        return obj
+    while True:
+        key = stream.value()
+        if not isinstance(key, str):
+            raise stream.error("expected an object key")
+        stream.expect(":")
+        if keys and key == keys[0] and len(keys) > 1 and stream.peek() == "{":
+            obj[key] = read_object(stream, keys[1:], spool, on_item)
+        elif keys and key == keys[0] and len(keys) == 1 and stream.peek() == "[":
+            obj[key] = read_items(stream, spool, on_item)
+        else:
+            obj[key] = stream.value()
+        if stream.expect(",}") == "}":
+            return obj
+
+
+def read_items(stream, spool, on_item):
+    """Read an array item by item into spool; return the SpooledList of it."""
+    stream.expect("[")
+    if stream.peek() == "]":
+        stream.pos += 1
+        return spool.result()
+    while True:
+        item = stream.value()
+        if on_item:
+            on_item(item)
+        spool.append(item)
+        if stream.expect(",]") == "]":
+            return spool.result()
+
+
+def load_streaming(path, items_path, spool_file, on_item=None):
+    """Load a JSON document, spooling the array at items_path (e.g. "research.papers").
+
+    on_item is called with each item, which it may modify, before it's
+    spooled. Raises ValueError if the document isn't valid JSON.
+    """
+    with open(path, 'r', encoding='utf-8') as f, SpoolWriter(str(spool_file)) as spool:
+        stream = JSONStream(f, str(path))
+        if stream.peek() != "{":
+            raise stream.error("expected an object")
+        content = read_object(stream, items_path.split("."), spool, on_item)
+        if stream.peek():
+            raise stream.error("extra data")
+    return content
@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+"""
+Minimal compiled templates for the website builder.
+
+Templates use str.format field syntax ({name}, with {{ and }} for literal
+braces). Each template is parsed once into literal chunks and field names, so
+rendering is a single list join with no re-parsing or string re-growth.
+"""
+from string import Formatter
+
+
+class Template:
+    """A template parsed once into a render function."""
+
+    def __init__(self, source):
+        self.source = source
+        self.literals = []
+        self.fields = []
+        for literal, field, format_spec, conversion in Formatter().parse(source):
+            if format_spec or conversion:
+                raise ValueError(f"Unsupported template field {{{field}!{conversion}:{format_spec}}}")
+            self.literals.append(literal)
+            self.fields.append(field)
+
+    def render(self, **context):
+        """Render the template with values for its fields."""
+        out = []
+        append = out.append
+        for literal, field in zip(self.literals, self.fields):
+            append(literal)
+            if field is not None:
+                value = context[field]
+                append(value if isinstance(value, str) else str(value))
+        return ''.join(out)
+
+    def render_each(self, items):
+        """Render the template once per context dict and join the results."""
+        return ''.join([self.render(**item) for item in items])
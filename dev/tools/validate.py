@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+Post-build validation of the generated pages.
+
+Every HTML file in the output tree is parsed (streamed through html.parser,
+in a process pool for large sites) for the files it references: links,
+stylesheets, scripts, images and their srcset candidates, video sources and
+posters. Local references must resolve to a file in the output tree, and
+references into dist/ to a current entry of asset-manifest.json. Each page
+is also held to budgets for its HTML size, the requests it makes and its
+total weight. Parsed references are cached by file size and mtime, so an
+incremental build only re-parses the pages it wrote.
+"""
+import json
+import os
+import posixpath
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from html.parser import HTMLParser
+from pathlib import Path
+from urllib.parse import unquote
+
+VALIDATE_CACHE_VERSION = 1
+# Budgets per page: bytes of HTML, subresource requests (local or not),
+# and HTML plus the local files it loads
+DEFAULT_BUDGETS = {"html_bytes": 150 * 1024, "requests": 40, "page_bytes": 5 * 1024 * 1024}
+# Below this many pages a process pool costs more than it saves
+PARALLEL_MIN_PAGES = 64
+CHUNK_SIZE = 64 * 1024
+DIST_DIR = "dist"
+ASSET_MANIFEST = "asset-manifest.json"
+BUDGET_LABELS = {"html_bytes": "of HTML", "requests": "requests", "page_bytes": "page weight"}
+
+EXTERNAL_URL = re.compile(r'^([a-z][a-z0-9+.-]*:|//)', re.IGNORECASE)
+# <link rel> values that make the browser fetch the href
+LOADED_RELS = {"stylesheet", "preload", "modulepreload", "icon", "manifest"}
+# <link rel> values whose href is a host, not a file
+HOST_RELS = {"preconnect", "dns-prefetch"}
+
+
+class ReferenceParser(HTMLParser):
+    """Collects the URLs a page links to and the subresources it loads."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.links = []
+        self.requests = []
+        self.media = 0
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        rels = set((attrs.get("rel") or "").lower().split())
+        if tag == "link" and rels & HOST_RELS:
+            return
+        for name in ("href", "src", "poster"):
+            if attrs.get(name):
+                self.links.append(attrs[name])
+        for name in ("srcset", "imagesrcset"):
+            if attrs.get(name):
+                self.links += [candidate.split()[0] for candidate in attrs[name].split(",") if candidate.strip()]
+
+        if tag == "link" and rels & LOADED_RELS and attrs.get("href"):
+            self.requests.append(attrs["href"])
+        elif tag in ("script", "img", "iframe", "embed") and attrs.get("src"):
+            self.requests.append(attrs["src"])
+        elif tag in ("video", "audio"):
+            self.media += 1
+            if attrs.get("poster"):
+                self.requests.append(attrs["poster"])
+            if attrs.get("src"):
+                self.requests.append(attrs["src"])
+        elif tag == "source" and self.media and attrs.get("src"):
+            self.requests.append(attrs["src"])
+
+    def handle_endtag(self, tag):
+        if tag in ("video", "audio"):
+            self.media = max(0, self.media - 1)
+
+
+@lru_cache(maxsize=65536)
+def resolve(page_dir, url):
+    """Return the site-relative file a reference from a page in page_dir points to, or None if external."""
+    if not url or url.startswith(("#", "?")) or EXTERNAL_URL.match(url):
+        return None
+    path = unquote(re.split(r'[?#]', url, 1)[0])
+    if path.startswith("/"):
+        target = path.lstrip("/")
+    else:
+        target = posixpath.join(page_dir, path)
+    if not target or target.endswith("/"):
+        target += "index.html"
+    return posixpath.normpath(target)
+
+
+def parse_page(output_dir, page):
+    """Parse one page; return its byte size, local links and requests."""
+    parser = ReferenceParser()
+    with open(Path(output_dir, page), 'r', encoding='utf-8') as f:
+        size = os.fstat(f.fileno()).st_size
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), ''):
+            parser.feed(chunk)
+    parser.close()
+    page_dir = posixpath.dirname(page)
+    links = sorted({target for target in (resolve(page_dir, url) for url in parser.links) if target})
+    # External requests are kept as URLs; they count against the request budget only
+    requests = [resolve(page_dir, url) or url for url in dict.fromkeys(parser.requests)]
+    return {"html_bytes": size, "links": links, "requests": requests}
+
+
+def _parse_in_worker(args):
+    return parse_page(*args)
+
+
+class OutputValidator:
+    """Checks the references and budgets of every page in an output tree."""
+
+    def __init__(self, output_dir, cache_dir, budgets=None, jobs=None):
+        self.output_dir = Path(output_dir)
+        self.cache_file = Path(cache_dir) / "validate.json"
+        self.budgets = {**DEFAULT_BUDGETS, **(budgets or {})}
+        self.jobs = jobs or os.cpu_count() or 1
+        self.pages = 0
+        self.parsed = 0
+
+    def load_cache(self):
+        try:
+            with open(self.cache_file, 'r') as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return cache.get("pages", {}) if cache.get("version") == VALIDATE_CACHE_VERSION else {}
+
+    def save_cache(self, pages):
+        self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.cache_file, 'w') as f:
+            json.dump({"version": VALIDATE_CACHE_VERSION, "pages": pages}, f)
+
+    def collect(self):
+        """Every HTML page in the output tree, as site-relative POSIX paths."""
+        pages = []
+        for dirpath, _, filenames in os.walk(self.output_dir):
+            for filename in filenames:
+                if filename.endswith(".html"):
+                    pages.append(Path(dirpath, filename).relative_to(self.output_dir).as_posix())
+        return sorted(pages)
+
+    def scan(self):
+        """Return {page: parsed references}, parsing only pages whose stat changed."""
+        cache = self.load_cache()
+        pages = {}
+        todo = []
+        for page in self.collect():
+            stat = os.stat(self.output_dir / page)
+            entry = cache.get(page)
+            if entry and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime_ns:
+                pages[page] = entry
+            else:
+                pages[page] = {"size": stat.st_size, "mtime": stat.st_mtime_ns}
+                todo.append(page)
+
+        if self.jobs > 1 and len(todo) >= PARALLEL_MIN_PAGES:
+            with ProcessPoolExecutor(max_workers=self.jobs) as pool:
+                chunksize = max(1, len(todo) // (self.jobs * 4))
+                results = pool.map(_parse_in_worker, [(self.output_dir, page) for page in todo], chunksize=chunksize)
+                for page, result in zip(todo, results):
+                    pages[page].update(result)
+        else:
+            for page in todo:
+                pages[page].update(parse_page(self.output_dir, page))
+        self.parsed = len(todo)
+        if todo or len(pages) != len(cache):
+            self.save_cache(pages)
+        return pages
+
+    def run(self):
+        """Validate the output tree; return a list of problems (empty when it's valid)."""
+        pages = self.scan()
+        try:
+            with open(self.output_dir / ASSET_MANIFEST, 'r') as f:
+                fingerprinted = set(json.load(f).values())
+        except (OSError, ValueError):
+            fingerprinted = None
+        sizes = {}
+
+        def size_of(target):
+            # Stat each referenced file once, however many pages link it
+            if target not in sizes:
+                path = self.output_dir / target
+                sizes[target] = path.stat().st_size if path.is_file() else None
+            return sizes[target]
+
+        broken = {}
+        problems = []
+        for page, entry in pages.items():
+            for target in entry["links"]:
+                if size_of(target) is None:
+                    broken.setdefault(f"{target} is missing", []).append(page)
+                elif fingerprinted is not None and target.startswith(DIST_DIR + "/") and target not in fingerprinted:
+                    broken.setdefault(f"{target} is not in {ASSET_MANIFEST}", []).append(page)
+
+            weight = entry["html_bytes"] + sum(size_of(target) or 0 for target in entry["requests"]
+                                               if not EXTERNAL_URL.match(target))
+            measured = {"html_bytes": entry["html_bytes"], "requests": len(entry["requests"]), "page_bytes": weight}
+            for name, value in measured.items():
+                if value > self.budgets[name]:
+                    problems.append(f"{page}: {format_budget(name, value)} {BUDGET_LABELS[name]}, "
+                                    f"budget {format_budget(name, self.budgets[name])}")
+
+        missing = []
+        for problem, linked_from in sorted(broken.items()):
+            more = f" and {len(linked_from) - 1} more" if len(linked_from) > 1 else ""
+            missing.append(f"{problem} (linked from {linked_from[0]}{more})")
+        self.pages = len(pages)
+        return missing + problems
+
+
+def format_budget(name, value):
+    """Format a measured value or budget, e.g. "153.2 KB"."""
+    return str(value) if name == "requests" else f"{value / 1024:.1f} KB"
+
+
+def validate(output_dir, cache_dir, budgets=None, jobs=None):
+    """Validate an output tree and print the outcome; return True when it passes."""
+    start = time.perf_counter()
+    validator = OutputValidator(output_dir, cache_dir, budgets, jobs)
+    problems = validator.run()
+    elapsed = (time.perf_counter() - start) * 1000
+    for problem in problems[:50]:
+        print(f"❌ {problem}")
+    if len(problems) > 50:
+        print(f"   ... and {len(problems) - 50} more")
+    print(f"🔍 Validated {validator.pages} pages ({validator.parsed} parsed) in {elapsed:.0f} ms: "
+          f"{len(problems) or 'no'} problem(s)")
+    return not problems
@@ -3,6 +3,9 @@ import { Navigation } from './modules/navigation.js';
 import { SmoothScroll } from './modules/smooth-scroll.js';
 import { HeaderScroll } from './modules/header-scroll.js';
 import { Animations } from './modules/animations.js';
+import { StatCounters } from './modules/stat-counters.js';
+import { LazyVideo } from './modules/lazy-video.js';
+import { PaperSearch } from './modules/search.js';
 
 class App {
     constructor() {
@@ -16,6 +19,9 @@ class App {
             new SmoothScroll();
             new HeaderScroll();
             new Animations();
+            new StatCounters();
+            new LazyVideo();
+            new PaperSearch();
 
             console.log('CFD Website loaded successfully');
         });
@@ -5,7 +5,6 @@ export class Animations {
 
     init() {
         this.setupScrollAnimations();
-        this.setupStatCounters();
     }
 
     setupScrollAnimations() {
@@ -32,50 +31,4 @@ export class Animations {
 
         animatedElements.forEach(el => observer.observe(el));
     }
-
-    setupStatCounters() {
-        const statNumbers = document.querySelectorAll('.stat-number');
-        if (!statNumbers.length) return;
-
-        if (window.matchMedia('(prefers-reduced-motion: reduce)').matches) return;
-
-        const observer = new IntersectionObserver((entries) => {
-            entries.forEach(entry => {
-                if (entry.isIntersecting) {
-                    this.animateCounter(entry.target);
-                    observer.unobserve(entry.target);
-                }
-            });
-        }, { threshold: 0.5 });
-
-        statNumbers.forEach(el => observer.observe(el));
-    }
-
-    animateCounter(element) {
-        const text = element.textContent;
-        const match = text.match(/(\d+)/);
-        if (!match) return;
-
-        const target = parseInt(match[1]);
-        const suffix = text.replace(match[1], '').trim();
-        const prefix = text.substring(0, text.indexOf(match[1]));
-        const duration = 1500;
-        const startTime = performance.now();
-
-        const step = (currentTime) => {
-            const elapsed = currentTime - startTime;
-            const progress = Math.min(elapsed / duration, 1);
-            // Ease out cubic
-            const eased = 1 - Math.pow(1 - progress, 3);
-            const current = Math.round(target * eased);
-
-            element.textContent = prefix + current + suffix;
-
-            if (progress < 1) {
-                requestAnimationFrame(step);
-            }
-        };
-
-        requestAnimationFrame(step);
-    }
 }
\ No newline at end of file
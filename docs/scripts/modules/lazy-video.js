@@ -0,0 +1,27 @@
+export class LazyVideo {
+    constructor() {
+        this.videos = document.querySelectorAll('video[data-lazy-video]');
+        this.init();
+    }
+
+    init() {
+        if (!this.videos.length) return;
+
+        // Videos are emitted with preload="none"; leave them as posters for
+        // visitors who prefer reduced motion
+        if (window.matchMedia('(prefers-reduced-motion: reduce)').matches) return;
+
+        const observer = new IntersectionObserver((entries) => {
+            entries.forEach(entry => {
+                const video = entry.target;
+                if (entry.isIntersecting) {
+                    video.play().catch(() => {});
+                } else if (!video.paused) {
+                    video.pause();
+                }
+            });
+        }, { threshold: 0.25 });
+
+        this.videos.forEach(video => observer.observe(video));
+    }
+}
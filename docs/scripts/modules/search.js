@@ -0,0 +1,297 @@
+// Searches research papers in the browser, using the index the builder
+// writes to search/ (dev/tools/search.py). Only the index shards and result
+// chunks a query needs are fetched, once each. The category and year filters
+// intersect precomputed facet bitsets, with or without a query.
+const SEARCH_MAX_RESULTS = 20;
+// Prefix matches of the word being typed count for less than whole words
+const SEARCH_PREFIX_WEIGHT = 0.5;
+const SEARCH_MIN_PREFIX = 2;
+const SEARCH_SUFFIXES = [['ational', 'at'], ['ization', 'iz'], ['ation', 'at'], ['ition', 'it'],
+    ['ness', ''], ['ment', ''], ['ing', ''], ['ed', ''], ['ly', '']];
+
+export class PaperSearch {
+    constructor() {
+        this.init();
+    }
+
+    init() {
+        this.form = document.querySelector('.paper-search');
+        if (!this.form) return;
+
+        this.input = this.form.querySelector('.paper-search-input');
+        this.status = this.form.querySelector('.search-status');
+        this.results = document.querySelector('.search-results');
+        this.more = document.querySelector('.search-more');
+        this.filters = this.form.querySelectorAll('.paper-filter');
+        this.listing = document.querySelectorAll('.research-grid, .pagination');
+        this.indexUrl = new URL(this.form.dataset.index, document.baseURI);
+        this.siteRoot = new URL('../', this.indexUrl);
+        this.index = null;
+        this.shards = new Map();
+        this.chunks = new Map();
+        this.lookups = new Map();
+        this.masks = new Map();
+        this.facets = null;
+        this.ranked = [];
+        this.shown = 0;
+        this.query = 0;
+
+        // Without scripts the form does nothing, so it starts hidden
+        this.form.hidden = false;
+        this.form.addEventListener('submit', (e) => e.preventDefault());
+        this.input.addEventListener('focus', () => this.loadIndex().catch(() => {}), { once: true });
+        this.input.addEventListener('input', () => this.search(this.input.value));
+        this.filters.forEach(select => select.addEventListener('change', () => this.search(this.input.value)));
+        this.more.addEventListener('click', () => this.showMore());
+    }
+
+    fetchJSON(name) {
+        return fetch(new URL(name, this.indexUrl)).then((response) => {
+            if (!response.ok) throw new Error(`${response.status} ${response.url}`);
+            return response.json();
+        });
+    }
+
+    loadIndex() {
+        if (!this.index) {
+            this.index = this.fetchJSON(this.indexUrl.href).then((index) => {
+                this.stopwords = new Set(index.stopwords);
+                return index;
+            });
+        }
+        return this.index;
+    }
+
+    cached(cache, key, name) {
+        if (!cache.has(key)) cache.set(key, this.fetchJSON(name));
+        return cache.get(key);
+    }
+
+    normalize(text) {
+        return text.toLowerCase().normalize('NFKD').replace(/[\u0300-\u036f]/g, '');
+    }
+
+    // Must match stem() in dev/tools/search.py
+    stem(word) {
+        if (word.length <= 3 || /^\d+$/.test(word)) return word;
+        if (word.endsWith('sses')) {
+            word = word.slice(0, -2);
+        } else if (word.endsWith('ies')) {
+            word = word.slice(0, -3) + 'y';
+        } else if (word.endsWith('s') && !/(ss|us|is)$/.test(word)) {
+            word = word.slice(0, -1);
+        }
+        for (const [suffix, replacement] of SEARCH_SUFFIXES) {
+            if (word.endsWith(suffix) && word.length - suffix.length >= 3) {
+                word = word.slice(0, -suffix.length) + replacement;
+                const last = word[word.length - 1];
+                if ((suffix === 'ing' || suffix === 'ed') && last === word[word.length - 2] && !'aeiousz'.includes(last)) {
+                    word = word.slice(0, -1);
+                }
+                break;
+            }
+        }
+        if (word.length > 4 && word.endsWith('e')) word = word.slice(0, -1);
+        return word;
+    }
+
+    // Shards whose term ranges overlap [from, to]; each is listed by its first term
+    shardsFor(index, from, to) {
+        let low = 0;
+        let high = index.shards.length - 1;
+        while (low < high) {
+            const mid = (low + high + 1) >> 1;
+            if (index.shards[mid][0] <= from) low = mid; else high = mid - 1;
+        }
+        const found = [];
+        for (let i = low; i < index.shards.length && index.shards[i][0] <= to; i++) found.push(i);
+        return found;
+    }
+
+    // Score of every paper for one query word, indexed by doc id; 0 is no match
+    lookup(index, word, isPrefix) {
+        const key = `${isPrefix ? '*' : ''}${word}`;
+        if (!this.lookups.has(key)) this.lookups.set(key, this.score(index, word, isPrefix));
+        return this.lookups.get(key);
+    }
+
+    async score(index, word, isPrefix) {
+        const term = this.stem(word);
+        const shards = new Set(this.shardsFor(index, term, term));
+        if (isPrefix) {
+            this.shardsFor(index, word, word + '\uffff').forEach(i => shards.add(i));
+            // A half-typed word can be longer than the stem of the word it
+            // becomes ("modelin" for "model"), so look up its prefixes too
+            for (let end = SEARCH_MIN_PREFIX; end < word.length; end++) {
+                const prefix = word.slice(0, end);
+                this.shardsFor(index, prefix, prefix).forEach(i => shards.add(i));
+            }
+        }
+
+        const scores = new Float64Array(index.count);
+        for (const i of shards) {
+            const shard = await this.cached(this.shards, i, index.shards[i][1]);
+            for (const [candidate, postings] of Object.entries(shard)) {
+                const exact = candidate === term;
+                if (!exact && !(isPrefix && (candidate.startsWith(word) ||
+                    (word.startsWith(candidate) && candidate.length >= SEARCH_MIN_PREFIX)))) continue;
+                const idf = Math.log(1 + index.count / (postings.length / 2));
+                const weight = exact ? idf : idf * SEARCH_PREFIX_WEIGHT;
+                let doc = 0;
+                for (let i = 0; i < postings.length; i += 2) {
+                    doc += postings[i];
+                    const score = postings[i + 1] * weight;
+                    if (score > scores[doc]) scores[doc] = score;
+                }
+            }
+        }
+        return scores;
+    }
+
+    // The value a filter had when the page loaded; facet pages preselect theirs
+    initialValue(select) {
+        const option = [...select.options].find(o => o.defaultSelected);
+        return option ? option.value : '';
+    }
+
+    filtersChanged() {
+        return [...this.filters].some(select => select.value !== this.initialValue(select));
+    }
+
+    // Bitset of the papers with a facet value: bit i of byte i >> 3 is paper i
+    async facetMask(index, facet, value) {
+        const key = `${facet}\u0000${value}`;
+        if (!this.masks.has(key)) {
+            if (!this.facets) this.facets = this.fetchJSON(index.facets);
+            const encoded = ((await this.facets)[facet] || {})[value];
+            const mask = new Uint8Array((index.count + 7) >> 3);
+            if (Array.isArray(encoded)) {
+                // Ascending paper ids stored as deltas
+                let doc = 0;
+                for (const delta of encoded) {
+                    doc += delta;
+                    mask[doc >> 3] |= 1 << (doc & 7);
+                }
+            } else if (encoded) {
+                const bytes = atob(encoded);
+                for (let i = 0; i < bytes.length; i++) mask[i] = bytes.charCodeAt(i);
+            }
+            this.masks.set(key, mask);
+        }
+        return this.masks.get(key);
+    }
+
+    // Intersection of the selected filters, or null when none applies
+    async filterMask(index) {
+        const selected = [...this.filters].filter(select => select.value).map(select => [select.dataset.facet, select.value]);
+        if (!selected.length) return null;
+        const masks = await Promise.all(selected.map(([facet, value]) => this.facetMask(index, facet, value)));
+        const mask = Uint8Array.from(masks[0]);
+        for (let m = 1; m < masks.length; m++) {
+            for (let i = 0; i < mask.length; i++) mask[i] &= masks[m][i];
+        }
+        return mask;
+    }
+
+    async paper(index, doc) {
+        const chunk = Math.floor(doc / index.chunk);
+        const papers = await this.cached(this.chunks, chunk, index.docs[chunk]);
+        return papers[doc % index.chunk];
+    }
+
+    async search(text) {
+        const query = ++this.query;
+        const words = this.normalize(text).match(/[\p{L}\p{N}]+/gu) || [];
+        // The page's own listing already shows its unfiltered papers
+        if (!words.length && !this.filtersChanged()) {
+            this.show(null);
+            return;
+        }
+
+        try {
+            const index = await this.loadIndex();
+            const terms = words.filter((word) => !this.stopwords.has(word));
+            // The last word may still be being typed; a single letter matches too much
+            const typing = !/\s$/.test(text);
+            if (typing && terms.length && terms[terms.length - 1].length < SEARCH_MIN_PREFIX) terms.pop();
+            // Only stopwords (or one letter): list the filtered papers, or the page's own
+            if (words.length && !terms.length && !this.filtersChanged()) {
+                this.show(null);
+                return;
+            }
+            const [mask, ...matches] = await Promise.all([this.filterMask(index), ...terms.map((word, i) =>
+                this.lookup(index, word, typing && i === terms.length - 1 && word.length >= SEARCH_MIN_PREFIX))]);
+            if (query !== this.query) return;
+
+            // Papers must pass the filters and match every word; filters alone list papers in order
+            const ranked = [];
+            for (let doc = 0; doc < index.count; doc++) {
+                if (mask && !(mask[doc >> 3] & (1 << (doc & 7)))) continue;
+                let total = matches.length ? 0 : 1;
+                for (let i = 0; i < matches.length && total >= 0; i++) {
+                    total = matches[i][doc] ? total + matches[i][doc] : -1;
+                }
+                if (total > 0) ranked.push([doc, total]);
+            }
+            ranked.sort((a, b) => b[1] - a[1] || a[0] - b[0]);
+
+            const papers = await Promise.all(ranked.slice(0, SEARCH_MAX_RESULTS).map(([doc]) => this.paper(index, doc)));
+            if (query !== this.query) return;
+            this.ranked = ranked;
+            this.shown = papers.length;
+            this.show(papers, ranked.length);
+        } catch (error) {
+            console.error('Search failed:', error);
+            this.status.textContent = 'Search is unavailable right now.';
+        }
+    }
+
+    show(papers, total) {
+        this.results.hidden = papers === null;
+        this.listing.forEach(el => { el.hidden = papers !== null; });
+        if (papers === null) {
+            this.status.textContent = '';
+            this.results.replaceChildren();
+            this.more.hidden = true;
+            return;
+        }
+        this.results.replaceChildren(...papers.map(paper => this.renderResult(paper)));
+        this.updateStatus(total);
+    }
+
+    updateStatus(total) {
+        this.status.textContent = total
+            ? `${total} paper${total === 1 ? '' : 's'} found${total > this.shown ? `, showing ${this.shown}` : ''}`
+            : 'No papers match your search.';
+        this.more.hidden = this.shown >= total;
+    }
+
+    // Appends the next page of results, leaving those shown in place
+    async showMore() {
+        const query = this.query;
+        const index = await this.loadIndex();
+        const next = this.ranked.slice(this.shown, this.shown + SEARCH_MAX_RESULTS);
+        const papers = await Promise.all(next.map(([doc]) => this.paper(index, doc)));
+        if (query !== this.query) return;
+        this.shown += papers.length;
+        this.results.append(...papers.map(paper => this.renderResult(paper)));
+        this.updateStatus(this.ranked.length);
+    }
+
+    renderResult([title, url, authors, journal, year]) {
+        const item = document.createElement('li');
+        item.classList.add('search-result');
+
+        const link = document.createElement('a');
+        link.classList.add('search-result-title');
+        link.href = new URL(url, this.siteRoot).href;
+        link.textContent = title;
+
+        const meta = document.createElement('div');
+        meta.classList.add('search-result-meta');
+        meta.textContent = [authors, [journal, year].filter(Boolean).join(', ')].filter(Boolean).join(' · ');
+
+        item.append(link, meta);
+        return item;
+    }
+}
@@ -3,71 +3,477 @@
 Local test script for the modular CFD website.
 Builds and serves the website locally for testing before deployment.
 """
+import argparse
+import asyncio
+import mimetypes
 import os
-import subprocess
+import sys
+import threading
 import time
 import webbrowser
+from email.utils import formatdate, parsedate_to_datetime
 from pathlib import Path
+from urllib.parse import quote, unquote, urlsplit
 
-def run_command(cmd, cwd=None):
-    """Run a shell command and return the result."""
+ROOT_DIR = Path(__file__).resolve().parent
+DEV_DIR = ROOT_DIR / "dev"
+DOCS_DIR = ROOT_DIR / "docs"
+
+# Trees watched in --watch mode; content changes rebuild, CSS/JS only reload
+CONTENT_DIRS = [DEV_DIR / "src" / "data"]
+STATIC_DIRS = [DOCS_DIR / "styles", DOCS_DIR / "scripts"]
+POLL_INTERVAL = 0.05
+DEBOUNCE_DELAY = 0.05
+LIVE_RELOAD_PATH = "/__livereload"
+LIVE_RELOAD_SCRIPT = (
+    "<script>new EventSource('" + LIVE_RELOAD_PATH + "')"
+    ".onmessage = () => location.reload();</script>"
+)
+
+# Static server behaviour
+KEEP_ALIVE_TIMEOUT = 15
+MAX_HEADERS = 100
+PRECOMPRESSED = [("br", ".br"), ("gzip", ".gz")]
+COMPRESSIBLE_SUFFIXES = {".html", ".css", ".js", ".json", ".map", ".svg", ".xml", ".txt"}
+# Content-hashed outputs never change, like on a production CDN
+IMMUTABLE_DIRS = ("dist/", "styles/bundles/", "scripts/bundles/", "assets/images/generated/", "assets/fonts/")
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+mimetypes.add_type("application/javascript", ".js")
+mimetypes.add_type("application/json", ".map")
+mimetypes.add_type("image/avif", ".avif")
+mimetypes.add_type("image/webp", ".webp")
+
+sys.path.insert(0, str(DEV_DIR / "tools"))
+from daemon import build_site
+
+def run_build(args):
+    """Build dev/ with build.py arguments and return whether it succeeded."""
     try:
-        result = subprocess.run(cmd, shell=True, cwd=cwd, capture_output=True, text=True)
-        if result.returncode != 0:
-            print(f"Error running command: {cmd}")
-            print(f"Error output: {result.stderr}")
-            return False
-        return True
-    except Exception as e:
-        print(f"Exception running command {cmd}: {e}")
+        success, output = build_site(args, DEV_DIR)
+    except OSError as e:
+        print(f"Exception running the build: {e}")
         return False
+    if not success:
+        print(f"Error running build.py {' '.join(args)}")
+        print(f"Build output: {output}")
+    return success
 
 def build_website():
     """Build the website from JSON content."""
     print("🔨 Building website for local testing...")
-    dev_dir = Path("dev")
-    if not dev_dir.exists():
+    if not DEV_DIR.exists():
         print("Error: dev/ directory not found")
         return False
     
-    build_script = dev_dir / "tools" / "build.py"
+    build_script = DEV_DIR / "tools" / "build.py"
     if not build_script.exists():
         print("Error: build script not found at dev/tools/build.py")
         return False
     
-    # Run build from dev directory
-    if not run_command("python tools/build.py", cwd=dev_dir):
+    # With .gz/.br siblings for the server; through the build daemon, if
+    # one is running, so repeated runs skip start-up and cold caches
+    if not run_build(["--precompress"]):
         return False
     
     print("✅ Website built successfully")
     return True
 
-def serve_locally():
-    """Start local HTTP server from docs directory."""
+def serve_locally(port=8000):
+    """Serve the docs directory with the local static server."""
     print("🌐 Starting local server...")
-    print("📍 Website will be available at: http://localhost:8000")
+    print(f"📍 Website will be available at: http://localhost:{port}")
     print("🔄 Press Ctrl+C to stop the server")
     print("=" * 50)
 
     # Try to open browser automatically
     try:
-        webbrowser.open('http://localhost:8000')
+        webbrowser.open(f'http://localhost:{port}')
         print("🌍 Opening browser automatically...")
     except:
-        print("💡 Manually open: http://localhost:8000")
+        print(f"💡 Manually open: http://localhost:{port}")
 
     # Start server from docs directory
     try:
-        subprocess.run(["python", "-m", "http.server", "8000"],
-                      cwd="docs",
-                      check=True)
+        asyncio.run(StaticServer(DOCS_DIR).serve(port))
     except KeyboardInterrupt:
         print("\n🛑 Server stopped")
     except Exception as e:
         print(f"Error starting server: {e}")
 
+class LiveReload:
+    """Tracks rebuild generations and wakes event-stream clients."""
+
+    def __init__(self):
+        self.generation = 0
+        self.loop = None
+        self.changed = None
+
+    def bind(self, loop):
+        """Attach to the server's event loop; call from inside it."""
+        self.loop = loop
+        self.changed = asyncio.Event()
+
+    def notify(self):
+        """Start a new generation; safe to call from the watcher thread."""
+        self.loop.call_soon_threadsafe(self.advance)
+
+    def advance(self):
+        self.generation += 1
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+    async def wait(self, generation, timeout):
+        """Wait until the generation moves past the given one."""
+        if self.generation == generation:
+            changed = self.changed
+            try:
+                await asyncio.wait_for(changed.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self.generation
+
+
+class StaticServer:
+    """Asyncio static file server that behaves like a production CDN.
+
+    Sends precompressed .br/.gz siblings to browsers that accept them,
+    answers conditional requests with 304 and single byte ranges with 206
+    (so videos can seek), and keeps HTTP/1.1 connections alive. With a
+    LiveReload, HTML pages get the reload script and the event stream is
+    served at LIVE_RELOAD_PATH.
+    """
+
+    def __init__(self, root, live_reload=None):
+        self.root = Path(root).resolve()
+        self.live_reload = live_reload
+
+    async def serve(self, port):
+        server = await asyncio.start_server(self.handle, port=port)
+        async with server:
+            await server.serve_forever()
+
+    async def handle(self, reader, writer):
+        """Serve requests on one connection until it closes."""
+        try:
+            while True:
+                request = await self.read_request(reader, writer)
+                if request is None:
+                    break
+                method, target, version, headers = request
+                connection = headers.get("connection", "").lower()
+                keep_alive = connection != "close" if version == "HTTP/1.1" else connection == "keep-alive"
+
+                path = unquote(urlsplit(target).path)
+                if path == LIVE_RELOAD_PATH and self.live_reload:
+                    await self.serve_events(writer)
+                    break
+                await self.respond(writer, method, path, headers, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, ValueError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+            pass
+        finally:
+            writer.close()
+
+    async def read_request(self, reader, writer):
+        """Read a request line and headers; return None when the client is done."""
+        line = await asyncio.wait_for(reader.readline(), KEEP_ALIVE_TIMEOUT)
+        if not line:
+            return None
+        parts = line.decode('latin-1').split()
+        if len(parts) != 3 or not parts[2].startswith("HTTP/"):
+            await self.send_error(writer, 400, "Bad Request", False)
+            return None
+
+        headers = {}
+        while True:
+            line = await asyncio.wait_for(reader.readline(), KEEP_ALIVE_TIMEOUT)
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode('latin-1').partition(":")
+            headers[name.strip().lower()] = value.strip()
+            if len(headers) > MAX_HEADERS:
+                await self.send_error(writer, 431, "Request Header Fields Too Large", False)
+                return None
+
+        # Discard any request body so the next request parses cleanly
+        length = int(headers.get("content-length", "0") or 0)
+        if length:
+            await reader.readexactly(length)
+        return parts[0], parts[1], parts[2], headers
+
+    def resolve(self, path):
+        """Map a URL path to a file under the root, or None."""
+        candidate = (self.root / path.lstrip("/")).resolve()
+        if candidate != self.root and self.root not in candidate.parents:
+            return None
+        if candidate.is_dir():
+            candidate = candidate / "index.html"
+        return candidate if candidate.is_file() else None
+
+    def select_encoding(self, file, headers):
+        """Pick the best precompressed sibling the client accepts."""
+        accepted = {}
+        for item in headers.get("accept-encoding", "").split(","):
+            name, _, params = item.strip().partition(";")
+            quality = 1.0
+            if params.strip().startswith("q="):
+                try:
+                    quality = float(params.strip()[2:])
+                except ValueError:
+                    quality = 0.0
+            accepted[name.strip().lower()] = quality
+
+        mtime = file.stat().st_mtime_ns
+        for encoding, suffix in PRECOMPRESSED:
+            if accepted.get(encoding, accepted.get("*", 0)) <= 0:
+                continue
+            variant = file.with_name(file.name + suffix)
+            # A variant older than its source (e.g. a hand-edited stylesheet) is stale
+            try:
+                if variant.stat().st_mtime_ns >= mtime:
+                    return encoding, variant
+            except OSError:
+                continue
+        return None, file
+
+    def is_fresh(self, headers, etag, mtime):
+        """Whether the client's cached copy is still current."""
+        if "if-none-match" in headers:
+            tags = [tag.strip().removeprefix("W/") for tag in headers["if-none-match"].split(",")]
+            return "*" in tags or etag in tags
+        if "if-modified-since" in headers:
+            try:
+                return int(mtime) <= parsedate_to_datetime(headers["if-modified-since"]).timestamp()
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    def parse_range(self, headers, etag, size):
+        """Return (start, end) for a satisfiable single range, "invalid" or None."""
+        header = headers.get("range", "")
+        if not header.startswith("bytes=") or "," in header:
+            return None
+        if_range = headers.get("if-range")
+        if if_range and if_range != etag:
+            return None
+        first, _, last = header[6:].strip().partition("-")
+        try:
+            if first:
+                start = int(first)
+                end = min(int(last), size - 1) if last else size - 1
+            else:
+                start = max(size - int(last), 0)
+                end = size - 1
+        except ValueError:
+            return None
+        if start > end or start >= size:
+            return "invalid"
+        return start, end
+
+    async def respond(self, writer, method, path, headers, keep_alive):
+        if method not in ("GET", "HEAD"):
+            await self.send_error(writer, 405, "Method Not Allowed", keep_alive, {"Allow": "GET, HEAD"})
+            return
+        if (self.root / path.lstrip("/")).is_dir() and not path.endswith("/"):
+            await self.send_headers(writer, 301, "Moved Permanently", keep_alive,
+                                    {"Location": quote(path) + "/", "Content-Length": "0"})
+            return
+        file = self.resolve(path)
+        if file is None:
+            await self.send_error(writer, 404, "Not Found", keep_alive)
+            return
+
+        content_type = mimetypes.guess_type(file.name)[0] or "application/octet-stream"
+        if content_type.startswith("text/") or content_type in ("application/javascript", "application/json"):
+            content_type += "; charset=utf-8"
+        stat = file.stat()
+        etag = f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+        response = {
+            "Content-Type": content_type,
+            "Last-Modified": formatdate(stat.st_mtime, usegmt=True),
+            "Cache-Control": IMMUTABLE_CACHE if path.lstrip("/").startswith(IMMUTABLE_DIRS) else "no-cache",
+        }
+
+        if self.live_reload and file.suffix == ".html":
+            # Injected pages are built per request; skip encodings and ranges
+            body = file.read_bytes()
+            script = LIVE_RELOAD_SCRIPT.encode('utf-8')
+            if b"</body>" in body:
+                body = body.replace(b"</body>", script + b"</body>", 1)
+            else:
+                body += script
+            response["ETag"] = etag[:-1] + '-live"'
+            if self.is_fresh(headers, response["ETag"], stat.st_mtime):
+                await self.send_headers(writer, 304, "Not Modified", keep_alive, response)
+                return
+            response["Content-Length"] = str(len(body))
+            await self.send_headers(writer, 200, "OK", keep_alive, response)
+            if method == "GET":
+                writer.write(body)
+                await writer.drain()
+            return
+
+        encoding, variant = None, file
+        if file.suffix in COMPRESSIBLE_SUFFIXES:
+            response["Vary"] = "Accept-Encoding"
+            if "range" not in headers:
+                encoding, variant = self.select_encoding(file, headers)
+        if encoding:
+            response["Content-Encoding"] = encoding
+            etag = etag[:-1] + f'-{encoding}"'
+        response["ETag"] = etag
+        response["Accept-Ranges"] = "bytes"
+
+        if self.is_fresh(headers, etag, stat.st_mtime):
+            await self.send_headers(writer, 304, "Not Modified", keep_alive, response)
+            return
+
+        size = variant.stat().st_size
+        status, reason, offset, count = 200, "OK", 0, size
+        byte_range = self.parse_range(headers, etag, size) if encoding is None else None
+        if byte_range == "invalid":
+            await self.send_error(writer, 416, "Range Not Satisfiable", keep_alive,
+                                  {"Content-Range": f"bytes */{size}"})
+            return
+        if byte_range:
+            start, end = byte_range
+            status, reason, offset, count = 206, "Partial Content", start, end - start + 1
+            response["Content-Range"] = f"bytes {start}-{end}/{size}"
+        response["Content-Length"] = str(count)
+
+        await self.send_headers(writer, status, reason, keep_alive, response)
+        if method == "GET" and count:
+            with open(variant, 'rb') as f:
+                await asyncio.get_running_loop().sendfile(writer.transport, f, offset, count)
+
+    async def send_headers(self, writer, status, reason, keep_alive, headers):
+        lines = [f"HTTP/1.1 {status} {reason}",
+                 f"Date: {formatdate(usegmt=True)}",
+                 f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+        if keep_alive:
+            lines.append(f"Keep-Alive: timeout={KEEP_ALIVE_TIMEOUT}")
+        lines.extend(f"{name}: {value}" for name, value in headers.items())
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode('latin-1'))
+        await writer.drain()
+
+    async def send_error(self, writer, status, reason, keep_alive, headers=None):
+        body = f"{status} {reason}\n".encode('utf-8')
+        headers = dict(headers or {})
+        headers.update({"Content-Type": "text/plain; charset=utf-8", "Content-Length": str(len(body))})
+        await self.send_headers(writer, status, reason, keep_alive, headers)
+        writer.write(body)
+        await writer.drain()
+
+    async def serve_events(self, writer):
+        """Stream a server-sent event to the browser after each rebuild."""
+        await self.send_headers(writer, 200, "OK", False, {
+            "Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+        generation = self.live_reload.generation
+        while True:
+            current = await self.live_reload.wait(generation, timeout=15)
+            if current != generation:
+                generation = current
+                writer.write(b"data: reload\n\n")
+            else:
+                writer.write(b": keep-alive\n\n")
+            await writer.drain()
+
+
+def snapshot(dirs):
+    """Return the mtime and size of every file under the given directories."""
+    state = {}
+    for directory in dirs:
+        for dirpath, _, filenames in os.walk(directory):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                state[path] = (stat.st_mtime_ns, stat.st_size)
+    return state
+
+
+def watch(live_reload):
+    """Poll the content and static trees, rebuilding and reloading on change."""
+    from build import WebsiteBuilder
+
+    # One warm builder for every rebuild; it uses the same relative paths,
+    # and so the same caches, as build.py run from dev/
+    os.chdir(DEV_DIR)
+    builder = WebsiteBuilder(incremental=True, precompress=True, keep_warm=True)
+    content_state = snapshot(CONTENT_DIRS)
+    static_state = snapshot(STATIC_DIRS)
+
+    while True:
+        time.sleep(POLL_INTERVAL)
+        new_content = snapshot(CONTENT_DIRS)
+        new_static = snapshot(STATIC_DIRS)
+        if new_content == content_state and new_static == static_state:
+            continue
+
+        # Debounce bursts of saves: wait until the trees stop changing
+        while True:
+            time.sleep(DEBOUNCE_DELAY)
+            settled_content = snapshot(CONTENT_DIRS)
+            settled_static = snapshot(STATIC_DIRS)
+            if settled_content == new_content and settled_static == new_static:
+                break
+            new_content, new_static = settled_content, settled_static
+
+        started = time.perf_counter()
+        if new_content != content_state:
+            error = None
+            try:
+                built = builder.build()
+            except Exception as e:
+                built, error = False, e
+            # A False return means the build has printed why; the browsers keep the last good pages
+            if not built:
+                print(f"❌ Rebuild failed: {error}; browsers not reloaded" if error
+                      else "❌ Rebuild failed; browsers not reloaded")
+                content_state, static_state = new_content, new_static
+                continue
+        content_state, static_state = new_content, new_static
+        live_reload.notify()
+        print(f"🔄 Reloaded browsers in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+
+def serve_with_watch(port=8000):
+    """Serve docs/ in-process and live-reload browsers when sources change."""
+    live_reload = LiveReload()
+    server = StaticServer(DOCS_DIR, live_reload)
+
+    async def run():
+        live_reload.bind(asyncio.get_running_loop())
+        threading.Thread(target=watch, args=(live_reload,), daemon=True).start()
+        await server.serve(port)
+
+    print("🌐 Starting local server with live reload...")
+    print(f"📍 Website will be available at: http://localhost:{port}")
+    print("👀 Watching dev/src/data, docs/styles and docs/scripts for changes")
+    print("🔄 Press Ctrl+C to stop the server")
+    print("=" * 50)
+
+    try:
+        webbrowser.open(f'http://localhost:{port}')
+    except:
+        print(f"💡 Manually open: http://localhost:{port}")
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        print("\n🛑 Server stopped")
+
 def main():
     """Main local test workflow."""
+    parser = argparse.ArgumentParser(description="Build and serve the website locally.")
+    parser.add_argument("--watch", action="store_true",
+                        help="rebuild on content changes and live-reload open browsers")
+    parser.add_argument("--port", type=int, default=8000, help="port to serve on (default: 8000)")
+    args = parser.parse_args()
+
     print("🧪 CFD Website Local Testing")
     print("=" * 30)
     
@@ -76,6 +482,10 @@ def main():
         print("❌ Build failed")
         return False
 
+    if args.watch:
+        serve_with_watch(args.port)
+        return True
+
     print("\n🎯 Local testing workflow:")
     print("1. Website built from dev/src/data/content.json and MD files")
     print("2. Generated files are in the docs/ directory")
@@ -84,7 +494,7 @@ def main():
     print()
 
     # Start local server from docs directory
-    serve_locally()
+    serve_locally(args.port)
     
     return True
 